@@ -42,9 +42,50 @@ from app.rooms import (
 from app.users import (
     router as users_router,
 )
+from app.utils.cache import (
+    close_cache_app,
+    init_cache_app,
+)
+from app.utils.chatgpt_relay import (
+    close_chatgpt_relay_app,
+    init_chatgpt_relay_app,
+)
+from app.utils.crypt_util import (
+    close_password_hasher_app,
+)
 from app.utils.engine import (
     init_engine_app,
 )
+from app.utils.media_cache import (
+    close_media_cache_app,
+    init_media_cache_app,
+)
+from app.utils.message_archive import (
+    close_message_archive_app,
+    init_message_archive_app,
+)
+from app.utils.message_writer import (
+    close_message_writer_app,
+    init_message_writer_app,
+)
+from app.utils.pub_sub_broker import (
+    close_pub_sub_app,
+    init_pub_sub_app,
+)
+from app.utils.replica import (
+    close_replica_app,
+    init_replica_app,
+)
+from app.utils.revocation import (
+    close_revocation_app,
+    init_revocation_app,
+)
+from app.utils.storage import (
+    close_storage_app,
+)
+from app.utils.thumbnails import (
+    close_thumbnails_app,
+)
 from app.web_sockets import (
     router as web_sockets_router,
 )
@@ -186,11 +227,30 @@ async def add_process_time_header(request: Request, call_next):
 @chat_app.on_event("startup")
 async def startup():
     await init_engine_app(chat_app)
+    await init_message_writer_app(chat_app)
+    await init_pub_sub_app(chat_app)
+    await init_cache_app(chat_app)
+    await init_media_cache_app(chat_app)
+    await init_replica_app(chat_app)
+    await init_revocation_app(chat_app)
+    await init_chatgpt_relay_app(chat_app)
+    await init_message_archive_app(chat_app)
     setup_prometheus(chat_app)
 
 
 @chat_app.on_event("shutdown")
 async def shutdown():
+    await close_message_archive_app(chat_app)
+    await close_chatgpt_relay_app(chat_app)
+    await close_revocation_app(chat_app)
+    await close_replica_app(chat_app)
+    await close_media_cache_app(chat_app)
+    await close_cache_app(chat_app)
+    await close_pub_sub_app(chat_app)
+    await close_message_writer_app(chat_app)
+    await close_password_hasher_app(chat_app)
+    await close_thumbnails_app(chat_app)
+    await close_storage_app(chat_app)
     await chat_app.state.db_engine.dispose()
 
 
@@ -18,11 +18,14 @@ from sqlalchemy.engine import (
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
-from sqlalchemy.sql import (
-    text,
+from sqlalchemy.types import (
+    DateTime,
+    Integer,
+    String,
 )
 from typing import (
     Any,
+    Optional,
 )
 
 from app.auth.schemas import (
@@ -32,31 +35,32 @@ from app.auth.schemas import (
 from app.users.schemas import (
     UserObjectSchema,
 )
+from app.utils.cache import (
+    user_emails_cache,
+    users_cache,
+)
 from app.utils.constants import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 from app.utils.crypt_util import (
-    get_password_hash,
-    verify_password,
+    BUSY_RESPONSE,
+    PasswordHasherBusy,
+    password_hasher,
 )
 from app.utils.jwt_util import (
     create_access_token,
     timedelta,
 )
+from app.utils.replica import (
+    from_replica,
+)
+from app.utils.statements import (
+    statement,
+)
 
-
-async def create_user(user: UserCreate, session: AsyncSession) -> Result:
-    """
-    A method to insert a user into the users table.
-
-    Args:
-        user (UserCreate) : A user schema object that contains all info about a user.
-        session (AsyncSession) : SqlAlchemy session object.
-
-    Returns:
-        Result: Database result.
+CREATE_USER = statement(
+    "auth.create_user",
     """
-    query = """
         INSERT INTO users (
           first_name,
           last_name,
@@ -73,6 +77,27 @@ async def create_user(user: UserCreate, session: AsyncSession) -> Result:
           1,
           :creation_date
         )
+    """,
+    params={
+        "first_name": String,
+        "last_name": String,
+        "email": String,
+        "password": String,
+        "creation_date": DateTime,
+    },
+)
+
+
+async def create_user(user: UserCreate, session: AsyncSession) -> Result:
+    """
+    A method to insert a user into the users table.
+
+    Args:
+        user (UserCreate) : A user schema object that contains all info about a user.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
     """
     values = {
         "first_name": user.first_name,
@@ -81,14 +106,28 @@ async def create_user(user: UserCreate, session: AsyncSession) -> Result:
         "password": user.password,
         "creation_date": datetime.datetime.utcnow(),
     }
-    return await session.execute(text(query), values)
+    return await session.execute(CREATE_USER, values)
+
+
+# every column but the password hash, which is never cached.
+USER_COLUMNS = """
+    id, first_name, last_name, email, phone_number, bio, profile_picture,
+    chat_status, user_status, user_role, creation_date, modified_date
+"""
+
+FIND_USER = statement(
+    "auth.find_existed_user",
+    f"SELECT {USER_COLUMNS} FROM users WHERE email=:email AND user_status=1",
+    params={"email": String},
+)
 
 
 async def find_existed_user(
     email: EmailStr, session: AsyncSession
 ) -> dict[str, Any]:
     """
-    A method to fetch a user info given an email.
+    A method to fetch a user info given an email, from the users cache
+    when possible.
 
     Args:
         email (EmailStr) : A given user email.
@@ -97,18 +136,59 @@ async def find_existed_user(
     Returns:
         dict[str, Any]: a dict object that contains info about a user.
     """
-    query = "SELECT * FROM users WHERE email=:email AND user_status=1"
+    user = users_cache.get(email.lower())
+    if user is not None:
+        return user
+    epoch = users_cache.epoch
     values = {"email": email}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_USER, values)
     user = result.fetchone()
+    # a replica may not have the last bans and changes yet.
+    if not from_replica(session):
+        users_cache.set(email.lower(), user, epoch)
     return user
 
 
+FIND_USER_PASSWORD = statement(
+    "auth.find_user_password",
+    "SELECT password FROM users WHERE email=:email AND user_status=1",
+    params={"email": String},
+    columns={"password": String},
+)
+
+
+async def find_user_password(
+    email: EmailStr, session: AsyncSession
+) -> Optional[str]:
+    """
+    A method to fetch the password hash of a user, always from the
+    database.
+
+    Args:
+        email (EmailStr) : A given user email.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Optional[str]: The password hash, or None if the user is not found.
+    """
+    values = {"email": email}
+    result = await session.execute(FIND_USER_PASSWORD, values)
+    return result.scalar()
+
+
+FIND_USER_ID = statement(
+    "auth.find_existed_user_id",
+    f"SELECT {USER_COLUMNS} FROM users WHERE id=:id AND user_status=1",
+    params={"id": Integer},
+)
+
+
 async def find_existed_user_id(
     id_: int, session: AsyncSession
 ) -> dict[str, Any]:
     """
-    A method to fetch a user info given an id.
+    A method to fetch a user info given an id, from the users cache
+    when possible.
 
     Args:
         id_ (int) : A given user email.
@@ -117,15 +197,39 @@ async def find_existed_user_id(
     Returns:
         dict[str, Any]: a dict object that contains info about a user.
     """
-    query = "SELECT * FROM users WHERE id=:id AND user_status=1"
-    values = {"id": id_}
-    result = await session.execute(text(query), values)
-    user = result.fetchone()
+    email = user_emails_cache.get(id_)
+    if email is not None:
+        user = await find_existed_user(email, session)
+    else:
+        epoch = users_cache.epoch
+        values = {"id": id_}
+        result = await session.execute(FIND_USER_ID, values)
+        user = result.fetchone()
+        if user:
+            user_emails_cache.set(id_, user.email)
+            if not from_replica(session):
+                users_cache.set(user.email.lower(), user, epoch)
     if user:
         return UserObjectSchema(**user)
     return user
 
 
+GET_BLACK_LISTED_TOKEN = statement(
+    "auth.get_users_with_black_listed_token",
+    """
+        SELECT
+          *
+        FROM
+          access_tokens
+        WHERE
+          token = :token
+        AND
+          token_status = 0
+    """,
+    params={"token": String},
+)
+
+
 async def get_users_with_black_listed_token(
     token: str, session: AsyncSession
 ) -> dict[str, Any]:
@@ -139,20 +243,67 @@ async def get_users_with_black_listed_token(
     Returns:
         dict[str, Any]: a dict object that contains info about a token.
     """
-    query = """
+    values = {"token": token}
+    result = await session.execute(GET_BLACK_LISTED_TOKEN, values)
+    token = result.fetchone()
+    return token
+
+
+GET_BLACK_LISTED_TOKENS = statement(
+    "auth.get_black_listed_tokens",
+    """
         SELECT
-          *
+          token
         FROM
           access_tokens
         WHERE
-          token = :token
-        AND
           token_status = 0
+        AND
+          creation_date >= :since
+    """,
+    params={"since": DateTime},
+    columns={"token": String},
+)
+
+
+async def get_black_listed_tokens(
+    since: datetime.datetime, session: AsyncSession
+) -> list[str]:
     """
-    values = {"token": token}
-    result = await session.execute(text(query), values)
-    token = result.fetchone()
-    return token
+    A method to fetch the disabled access tokens created after a given date.
+
+    Args:
+        since (datetime) : The creation date of the oldest token that is not expired.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        list[str]: a list of token values.
+    """
+    values = {"since": since}
+    result = await session.execute(GET_BLACK_LISTED_TOKENS, values)
+    return [row.token for row in result.fetchall()]
+
+
+CREATE_ACCESS_TOKEN = statement(
+    "auth.create_access_token",
+    """
+        INSERT INTO
+            access_tokens (
+                user,
+                token,
+                creation_date,
+                token_status
+            )
+        VALUES
+            (
+                :user,
+                :token,
+                :creation_date,
+                1
+            )
+    """,
+    params={"user": Integer, "token": String, "creation_date": DateTime},
+)
 
 
 async def login_user(
@@ -171,8 +322,16 @@ async def login_user(
     user_obj = await find_existed_user(form_data.username, session)
     if not user_obj:
         return {"status_code": 400, "message": "User not found!"}
-    user = UserLoginSchema(email=user_obj.email, password=user_obj.password)
-    is_valid = verify_password(form_data.password, user.password)
+    password = await find_user_password(user_obj.email, session)
+    if password is None:
+        return {"status_code": 400, "message": "User not found!"}
+    user = UserLoginSchema(email=user_obj.email, password=password)
+    try:
+        is_valid = await password_hasher.verify(
+            form_data.password, user.password
+        )
+    except PasswordHasherBusy:
+        return dict(BUSY_RESPONSE)
     if not is_valid:
         return {"status_code": 401, "message": "Invalid Credentials!"}
 
@@ -182,28 +341,12 @@ async def login_user(
         expires_delta=access_token_expires,
     )
     # save access_token
-    query = """
-        INSERT INTO
-            access_tokens (
-                user,
-                token,
-                creation_date,
-                token_status
-            )
-        VALUES
-            (
-                :user,
-                :token,
-                :creation_date,
-                1
-            )
-    """
     values = {
         "user": user_obj.id,
         "token": access_token["access_token"],
         "creation_date": datetime.datetime.utcnow(),
     }
-    await session.execute(text(query), values)
+    await session.execute(CREATE_ACCESS_TOKEN, values)
 
     return access_token
 
@@ -226,7 +369,10 @@ async def register_user(
         return {"status_code": 400, "message": "User already signed up!"}
 
     # Create new user
-    user.password = get_password_hash(user.password)
+    try:
+        user.password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        return dict(BUSY_RESPONSE)
     await create_user(user, session)
     user = await find_existed_user(user.email, session)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
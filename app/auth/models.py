@@ -8,12 +8,12 @@ from enum import Enum
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
 from typing import (
     Optional,
-    Union,
 )
 
 from app.utils.mixins import (
@@ -41,17 +41,27 @@ class AccessTokens(Base, CommonMixin, TimestampMixin):  # pylint: disable=R0903
     The `access_tokens` model.
 
     Args:
-        __table_args__ (dict) : SqlAlchemy configs to convert from COLUMNAR to ROWSTORE.
+        __table_args__ (tuple) : The composite indexes, and configs to convert from COLUMNAR to ROWSTORE.
         user (int) : A user id foreign key value.
         token (str) : A token value.
         token_status (TokenStatus) : A token status.
     """
 
-    __table_args__: dict[str, Union[str, list[str]]] = {
-        "mysql_engine": "InnoDB",
-        "prefixes": ["ROWSTORE", "REFERENCE"],
-    }
+    __table_args__ = (
+        # revocation checks of a token.
+        Index("ix_access_tokens_token_status", "token", "token_status"),
+        # the revoked tokens loaded at startup.
+        Index(
+            "ix_access_tokens_status_creation_date",
+            "token_status",
+            "creation_date",
+        ),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
+    )
 
     user: int = Column(ForeignKey("users.id"), index=True)
-    token: str = Column(String(220), index=True)
+    token: str = Column(String(220))
     token_status: Optional[TokenStatus] = Column(Integer, nullable=True)
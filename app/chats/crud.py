@@ -3,21 +3,25 @@
 # conflict between isort and pylint
 # pylint: disable=C0411,E0401
 import datetime
-from deta import Deta
 import logging
 from pydantic import (
     EmailStr,
 )
+import re
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
-from sqlalchemy.sql import (
-    text,
+from sqlalchemy.types import (
+    DateTime,
+    Float,
+    Integer,
+    String,
+    Text,
 )
 from typing import (
     Any,
+    Optional,
 )
-import uuid
 
 from app.auth.crud import (
     find_existed_user,
@@ -34,44 +38,540 @@ from app.rooms import (
 from app.users.schemas import (
     UserObjectSchema,
 )
+from app.utils.media_upload import (
+    MediaBlob,
+    MediaTooLarge,
+    MediaUploader,
+    media_url,
+)
+from app.utils.message_archive import (
+    read_full_history,
+    read_history,
+)
+from app.utils.pagination import (
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
+from app.utils.statements import (
+    STATEMENTS,
+    Statement,
+    archive_statement,
+    like_prefix,
+    statement,
+)
+from app.utils.storage import (
+    SENT_IMAGES_BUCKET,
+    get_storage,
+)
+from app.utils.thumbnails import (
+    thumbnail_generator,
+)
 
 logger = logging.getLogger(__name__)
 
-deta = Deta(settings.DETA_PROJECT_KEY)
+media_uploader = MediaUploader(
+    get_storage(SENT_IMAGES_BUCKET),
+    settings.MEDIA_MAX_SIZE,
+    settings.MEDIA_UPLOAD_CONCURRENCY,
+    settings.MEDIA_DECODE_CHUNK_SIZE,
+)
 
-images = deta.Drive("sent-images")
+# upper bound of a BIGINT id, used when no cursor is given.
+MAX_MESSAGE_ID = 2**63 - 1
 
 
-async def find_existed_user_messages(
-    user_id: int,
+UPDATE_CHAT_SUMMARY = statement(
+    "chats.update_chat_summary",
+    """
+        INSERT INTO chat_summaries (
+          owner,
+          peer,
+          last_message_id,
+          last_content,
+          last_message_time,
+          nb_unread,
+          creation_date
+        )
+        VALUES (
+          :receiver_id,
+          :sender_id,
+          :message_id,
+          :content,
+          :creation_date,
+          1,
+          :creation_date
+        )
+        ON DUPLICATE KEY UPDATE
+          last_message_id = VALUES(last_message_id),
+          last_content = VALUES(last_content),
+          last_message_time = VALUES(last_message_time),
+          nb_unread = nb_unread + 1,
+          modified_date = VALUES(creation_date)
+    """,
+    params={
+        "receiver_id": Integer,
+        "sender_id": Integer,
+        "message_id": Integer,
+        "content": Text,
+        "creation_date": DateTime,
+    },
+)
+
+
+async def update_chat_summary(  # pylint: disable=R0913
+    sender_id: int,
+    receiver_id: int,
+    message_id: int,
+    content: str,
+    creation_date: datetime.datetime,
+    session: AsyncSession,
+):
+    """
+    A method to record a new direct message in the chat list of its receiver.
+
+    Args:
+        sender_id (int) : A user id for the sender of the message.
+        receiver_id (int) : A user id for the recipient of the message.
+        message_id (int) : The id of the new message.
+        content (str) : The content of the new message.
+        creation_date (datetime) : The creation date of the new message.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    values = {
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "message_id": message_id,
+        "content": content,
+        "creation_date": creation_date,
+    }
+    return await session.execute(UPDATE_CHAT_SUMMARY, values)
+
+
+def insert_messages_statement(size: int) -> Statement:
+    """
+    Get the multi-row INSERT of a batch of messages, registered once per
+    batch size.
+
+    Args:
+        size (int) : The number of messages of the batch.
+
+    Returns:
+        Statement: The statement.
+    """
+    name = f"chats.insert_messages_{size}"
+    if name in STATEMENTS:
+        return STATEMENTS[name]
+    rows = []
+    params = {}
+    for index in range(size):
+        rows.append(
+            f"(:sender_{index}, :receiver_{index}, :room_{index},"
+            f" :content_{index}, :message_type_{index}, :media_{index}, 1,"
+            f" :creation_date_{index})"
+        )
+        params.update(
+            {
+                f"sender_{index}": Integer,
+                f"receiver_{index}": Integer,
+                f"room_{index}": Integer,
+                f"content_{index}": Text,
+                f"message_type_{index}": String,
+                f"media_{index}": String,
+                f"creation_date_{index}": DateTime,
+            }
+        )
+    query = f"""
+        INSERT INTO messages (
+          sender,
+          receiver,
+          room,
+          content,
+          message_type,
+          media,
+          status,
+          creation_date
+        )
+        VALUES
+          {", ".join(rows)}
+    """
+    return statement(name, query, params=params)
+
+
+async def insert_messages(
+    messages: list[dict[str, Any]],
     session: AsyncSession,
 ):
     """
-    A method to fetch messages for a given user id.
+    A method to insert a batch of messages with a single multi-row INSERT.
 
     Args:
-        user_id (int) : A user id.
+        messages (list[dict[str, Any]]) : The messages to insert, with the columns of `messages`.
         session (AsyncSession) : SqlAlchemy session object.
 
     Returns:
         Result: Database result.
     """
-    query = """
+    values = {}
+    for index, message in enumerate(messages):
+        values.update(
+            {f"{key}_{index}": value for key, value in message.items()}
+        )
+    return await session.execute(
+        insert_messages_statement(len(messages)), values
+    )
+
+
+INDEX_MESSAGES = statement(
+    "chats.index_messages",
+    """
+        INSERT IGNORE INTO message_search (
+          id,
+          sender,
+          receiver,
+          room,
+          content,
+          creation_date
+        )
         SELECT
-          *
+          id,
+          sender,
+          receiver,
+          room,
+          content,
+          creation_date
         FROM
           messages
         WHERE
-          sender = :sender_id
-        OR
-          receiver = :sender_id
+          id >= :first_id
+        AND
+          content != "<em>Deleted Message!</em>"
+    """,
+    params={"first_id": Integer},
+)
+
+
+async def index_messages(first_id: int, session: AsyncSession):
+    """
+    A method to add the messages just inserted by a session to the search
+    index, in the same transaction if the session has one.
+
+    Every message from the first inserted id is copied, so the messages
+    committed meanwhile by other sessions may be copied again, which is
+    ignored.
+
+    Args:
+        first_id (int) : The id of the first inserted message.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    return await session.execute(INDEX_MESSAGES, {"first_id": first_id})
+
+
+def update_chat_summaries_statement(size: int) -> Statement:
+    """
+    Get the multi-row upsert of the chat summaries of a batch, registered
+    once per number of summaries.
+
+    Args:
+        size (int) : The number of chat summaries.
+
+    Returns:
+        Statement: The statement.
+    """
+    name = f"chats.update_chat_summaries_{size}"
+    if name in STATEMENTS:
+        return STATEMENTS[name]
+    rows = []
+    params = {}
+    for index in range(size):
+        # the ids of a multi-row INSERT are not returned, so the last id of
+        # each pair is looked up on the (sender, receiver, id) index.
+        rows.append(
+            f"""(
+              :owner_{index},
+              :peer_{index},
+              (
+                SELECT
+                  MAX(id)
+                FROM
+                  messages
+                WHERE
+                  sender = :peer_{index}
+                AND
+                  receiver = :owner_{index}
+              ),
+              :last_content_{index},
+              :last_message_time_{index},
+              :nb_unread_{index},
+              :last_message_time_{index}
+            )"""
+        )
+        params.update(
+            {
+                f"owner_{index}": Integer,
+                f"peer_{index}": Integer,
+                f"last_content_{index}": Text,
+                f"last_message_time_{index}": DateTime,
+                f"nb_unread_{index}": Integer,
+            }
+        )
+    query = f"""
+        INSERT INTO chat_summaries (
+          owner,
+          peer,
+          last_message_id,
+          last_content,
+          last_message_time,
+          nb_unread,
+          creation_date
+        )
+        VALUES
+          {", ".join(rows)}
+        ON DUPLICATE KEY UPDATE
+          last_message_id = VALUES(last_message_id),
+          last_content = VALUES(last_content),
+          last_message_time = VALUES(last_message_time),
+          nb_unread = nb_unread + VALUES(nb_unread),
+          modified_date = VALUES(creation_date)
+    """
+    return statement(name, query, params=params)
+
+
+async def update_chat_summaries(
+    messages: list[dict[str, Any]],
+    session: AsyncSession,
+):
+    """
+    A method to record a batch of inserted messages in the chat lists of
+    their receivers with a single multi-row upsert.
+
+    Room messages are ignored, and the direct messages are folded into one
+    row per (receiver, sender) pair.
+
+    Args:
+        messages (list[dict[str, Any]]) : The inserted messages, in order.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    summaries: dict[tuple[int, int], dict[str, Any]] = {}
+    for message in messages:
+        if not message["receiver"]:
+            continue
+        summary = summaries.setdefault(
+            (message["receiver"], message["sender"]), {"nb_unread": 0}
+        )
+        summary["last_content"] = message["content"]
+        summary["last_message_time"] = message["creation_date"]
+        summary["nb_unread"] += 1
+    if not summaries:
+        return None
+    values = {}
+    for index, ((owner, peer), summary) in enumerate(summaries.items()):
+        values.update(
+            {
+                f"owner_{index}": owner,
+                f"peer_{index}": peer,
+                **{f"{key}_{index}": value for key, value in summary.items()},
+            }
+        )
+    return await session.execute(
+        update_chat_summaries_statement(len(summaries)), values
+    )
+
+
+REFERENCE_MEDIA_BLOB = statement(
+    "chats.reference_media_blob",
+    """
+        INSERT INTO media_blobs (
+          digest,
+          size,
+          ref_count,
+          stored,
+          creation_date
+        )
+        VALUES (
+          :digest,
+          :size,
+          1,
+          0,
+          :creation_date
+        )
+        ON DUPLICATE KEY UPDATE
+          ref_count = ref_count + 1,
+          modified_date = VALUES(creation_date)
+    """,
+    params={"digest": String, "size": Integer, "creation_date": DateTime},
+)
+
+
+GET_MEDIA_BLOB_STORED = statement(
+    "chats.get_media_blob_stored",
+    """
+        SELECT
+          stored
+        FROM
+          media_blobs
+        WHERE
+          digest = :digest
+    """,
+    params={"digest": String},
+    columns={
+        "stored": Integer,
+    },
+)
+
+
+async def reference_media_blob(digest: str, size: int, session: AsyncSession):
+    """
+    A method to take a reference on a chat image for a new message.
+
+    Args:
+        digest (str) : The hex SHA-256 digest of the image.
+        size (int) : The size in bytes of the image.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        bool: True if the image is already in the media storage.
     """
     values = {
-        "sender_id": user_id,
+        "digest": digest,
+        "size": size,
+        "creation_date": datetime.datetime.utcnow(),
     }
-    result = await session.execute(text(query), values)
-    messages = result.fetchall()
-    return messages
+    await session.execute(REFERENCE_MEDIA_BLOB, values)
+    result = await session.execute(GET_MEDIA_BLOB_STORED, {"digest": digest})
+    return bool(result.scalar())
+
+
+MARK_MEDIA_BLOB_STORED = statement(
+    "chats.mark_media_blob_stored",
+    """
+        UPDATE
+          media_blobs
+        SET
+          stored = 1
+        WHERE
+          digest = :digest
+    """,
+    params={"digest": String},
+)
+
+
+async def mark_media_blob_stored(digest: str, session: AsyncSession):
+    """
+    A method to record that a chat image has been uploaded.
+
+    Args:
+        digest (str) : The hex SHA-256 digest of the image.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    return await session.execute(MARK_MEDIA_BLOB_STORED, {"digest": digest})
+
+
+async def upload_media(blob: MediaBlob, session: AsyncSession) -> str:
+    """
+    A method to store a chat image once per content.
+
+    The upload is skipped when the same bytes have already been stored,
+    and the resized variants of a new image are rendered in the background.
+    Concurrent first uploads of an image may both reach the storage, which
+    is harmless since they write the same bytes under the same name.
+
+    Args:
+        blob (MediaBlob) : The decoded image, closed once stored.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        str: The hex SHA-256 digest of the image.
+    """
+    try:
+        if not await reference_media_blob(blob.digest, blob.size, session):
+            await media_uploader.upload(blob)
+            await mark_media_blob_stored(blob.digest, session)
+            thumbnail_generator.submit(
+                media_uploader.storage, blob.name, await blob.read()
+            )
+    finally:
+        blob.close()
+    return blob.digest
+
+
+INSERT_DIRECT_MESSAGE = statement(
+    "chats.insert_direct_message",
+    """
+        INSERT INTO messages (
+          sender,
+          receiver,
+          content,
+          message_type,
+          media,
+          status,
+          creation_date
+        )
+        VALUES (
+          :sender,
+          :receiver,
+          :content,
+          :message_type,
+          :media,
+          1,
+          :creation_date
+        )
+    """,
+    params={
+        "sender": Integer,
+        "receiver": Integer,
+        "content": Text,
+        "message_type": String,
+        "media": String,
+        "creation_date": DateTime,
+    },
+)
+
+
+INSERT_ROOM_MESSAGE = statement(
+    "chats.insert_room_message",
+    """
+        INSERT INTO messages (
+          sender,
+          room,
+          content,
+          message_type,
+          media,
+          status,
+          creation_date
+        )
+        VALUES (
+          :sender,
+          :room,
+          :content,
+          :message_type,
+          :media,
+          1,
+          :creation_date
+        )
+    """,
+    params={
+        "sender": Integer,
+        "room": Integer,
+        "content": Text,
+        "message_type": String,
+        "media": String,
+        "creation_date": DateTime,
+    },
+)
 
 
 async def send_new_message(  # pylint: disable=R0911
@@ -87,7 +587,7 @@ async def send_new_message(  # pylint: disable=R0911
     Args:
         sender_id (int) : A user id that represents the sender of the message.
         request (MessageCreate) : A schema for the message.
-        file (Any) : An image to upload to Deta drive.
+        file (Any) : An image to upload to the media storage.
         room_id (int) : the id of the room.
         session (AsyncSession) : SqlAlchemy session object.
 
@@ -104,29 +604,16 @@ async def send_new_message(  # pylint: disable=R0911
             receiver = await find_existed_user(
                 email=request.receiver, session=session
             )
-            file_name = f"/chat/images/user/{str(sender_id)}/image_{str(uuid.uuid4())}.png"
-            images.put(file_name, file)
+            try:
+                blob = await media_uploader.decode_bytes(file)
+            except MediaTooLarge:
+                return {
+                    "status_code": 400,
+                    "message": "The image is too large!",
+                }
+            digest = await upload_media(blob, session)
+            file_name = media_url("user", sender_id, digest)
             # create a new message
-            query = """
-                INSERT INTO messages (
-                  sender,
-                  receiver,
-                  content,
-                  message_type,
-                  media,
-                  status,
-                  creation_date
-                )
-                VALUES (
-                  :sender,
-                  :receiver,
-                  :content,
-                  :message_type,
-                  :media,
-                  1,
-                  :creation_date
-                )
-            """
             values = {
                 "sender": sender_id,
                 "receiver": receiver.id,
@@ -135,6 +622,16 @@ async def send_new_message(  # pylint: disable=R0911
                 "media": file_name,
                 "creation_date": datetime.datetime.utcnow(),
             }
+            result = await session.execute(INSERT_DIRECT_MESSAGE, values)
+            await index_messages(result.lastrowid, session)
+            await update_chat_summary(
+                sender_id,
+                receiver.id,
+                result.lastrowid,
+                request.content,
+                values["creation_date"],
+                session,
+            )
         else:
             if not request.media["preview"]:
                 return {
@@ -144,29 +641,16 @@ async def send_new_message(  # pylint: disable=R0911
             room = await rooms_crud.find_existed_room(
                 room_name=request.room, session=session
             )
-            file_name = f"/chat/images/room/{str(sender_id)}/image_{str(uuid.uuid4())}.png"
-            images.put(file_name, file)
+            try:
+                blob = await media_uploader.decode_bytes(file)
+            except MediaTooLarge:
+                return {
+                    "status_code": 400,
+                    "message": "The image is too large!",
+                }
+            digest = await upload_media(blob, session)
+            file_name = media_url("room", sender_id, digest)
             # create a new message
-            query = """
-                INSERT INTO messages (
-                  sender,
-                  room,
-                  content,
-                  message_type,
-                  media,
-                  status,
-                  creation_date
-                )
-                VALUES (
-                  :sender,
-                  :room,
-                  :content,
-                  :message_type,
-                  :media,
-                  1,
-                  :creation_date
-                )
-            """
             values = {
                 "sender": sender_id,
                 "room": room.id,
@@ -175,7 +659,8 @@ async def send_new_message(  # pylint: disable=R0911
                 "media": file_name,
                 "creation_date": datetime.datetime.utcnow(),
             }
-        await session.execute(text(query), values)
+            result = await session.execute(INSERT_ROOM_MESSAGE, values)
+            await index_messages(result.lastrowid, session)
         return file_name
     else:
         if not room_id:
@@ -198,26 +683,6 @@ async def send_new_message(  # pylint: disable=R0911
                     "status_code": 400,
                     "message": "You can't send a message to yourself!",
                 }
-            query = """
-                INSERT INTO messages (
-                  sender,
-                  receiver,
-                  content,
-                  message_type,
-                  media,
-                  status,
-                  creation_date
-                )
-                VALUES (
-                  :sender,
-                  :receiver,
-                  :content,
-                  :message_type,
-                  :media,
-                  1,
-                  :creation_date
-                )
-            """
             values = {
                 "sender": sender_id,
                 "receiver": receiver.id,
@@ -226,27 +691,17 @@ async def send_new_message(  # pylint: disable=R0911
                 "media": request.media,
                 "creation_date": datetime.datetime.utcnow(),
             }
+            result = await session.execute(INSERT_DIRECT_MESSAGE, values)
+            await index_messages(result.lastrowid, session)
+            await update_chat_summary(
+                sender_id,
+                receiver.id,
+                result.lastrowid,
+                request.content,
+                values["creation_date"],
+                session,
+            )
         else:
-            query = """
-                INSERT INTO messages (
-                  sender,
-                  room,
-                  content,
-                  message_type,
-                  media,
-                  status,
-                  creation_date
-                )
-                VALUES (
-                  :sender,
-                  :room,
-                  :content,
-                  :message_type,
-                  :media,
-                  1,
-                  :creation_date
-                )
-            """
             values = {
                 "sender": sender_id,
                 "room": room_id,
@@ -255,7 +710,8 @@ async def send_new_message(  # pylint: disable=R0911
                 "media": request.media,
                 "creation_date": datetime.datetime.utcnow(),
             }
-        await session.execute(text(query), values)
+            result = await session.execute(INSERT_ROOM_MESSAGE, values)
+            await index_messages(result.lastrowid, session)
     results = {
         "status_code": 201,
         "message": "A new message has been delivered successfully!",
@@ -263,6 +719,59 @@ async def send_new_message(  # pylint: disable=R0911
     return results
 
 
+FIND_ROOM_MESSAGES = statement(
+    "chats.find_room_messages",
+    """
+        SELECT
+            *
+        FROM
+            messages
+        WHERE
+          sender = :sender_id
+        AND
+          room = :room_id
+    """,
+    params={"sender_id": Integer, "room_id": Integer},
+)
+FIND_ROOM_MESSAGES_ARCHIVE = archive_statement("chats.find_room_messages")
+
+
+DELETE_ROOM_MESSAGES = statement(
+    "chats.delete_room_messages",
+    """
+        UPDATE
+          messages
+        SET
+          content = "<em>Deleted Message!</em>",
+          modified_date = :modified_date
+        WHERE
+          sender = :sender_id
+        AND
+          room = :room_id
+    """,
+    params={
+        "modified_date": DateTime,
+        "sender_id": Integer,
+        "room_id": Integer,
+    },
+)
+DELETE_ROOM_MESSAGES_ARCHIVE = archive_statement("chats.delete_room_messages")
+
+
+UNINDEX_ROOM_MESSAGES = statement(
+    "chats.unindex_room_messages",
+    """
+        DELETE FROM
+          message_search
+        WHERE
+          sender = :sender_id
+        AND
+          room = :room_id
+    """,
+    params={"sender_id": Integer, "room_id": Integer},
+)
+
+
 async def delete_room_messages(
     sender_id: int,
     room_id: int,
@@ -280,43 +789,27 @@ async def delete_room_messages(
         Result: Database result.
     """
 
-    query = """
-        SELECT
-            *
-        FROM
-            messages
-        WHERE
-          sender = :sender_id
-        AND
-          room = :room_id
-    """
     values = {"sender_id": sender_id, "room_id": room_id}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_ROOM_MESSAGES, values)
     messages = result.fetchall()
+    if not messages:
+        result = await session.execute(FIND_ROOM_MESSAGES_ARCHIVE, values)
+        messages = result.fetchall()
     if not messages:  # pylint: disable=R1705
         return {
             "status_code": 400,
             "message": "There are no messages to delete!",
         }
     else:
-        query = """
-            UPDATE
-              messages
-            SET
-              content = "<em>Deleted Message!</em>",
-              modified_date = :modified_date
-            WHERE
-              sender = :sender_id
-            AND
-              room = :room_id
-        """
         values = {
             "sender_id": sender_id,
             "room_id": room_id,
             "modified_date": datetime.datetime.utcnow(),
         }
 
-        await session.execute(text(query), values)
+        await session.execute(DELETE_ROOM_MESSAGES, values)
+        await session.execute(DELETE_ROOM_MESSAGES_ARCHIVE, values)
+        await session.execute(UNINDEX_ROOM_MESSAGES, values)
 
         results = {
             "status_code": 200,
@@ -326,6 +819,80 @@ async def delete_room_messages(
     return results
 
 
+FIND_CHAT_MESSAGES = statement(
+    "chats.find_chat_messages",
+    """
+        SELECT
+            *
+        FROM
+            messages
+        WHERE
+          sender = :sender_id
+        AND
+          receiver = :receiver_id
+    """,
+    params={"sender_id": Integer, "receiver_id": Integer},
+)
+FIND_CHAT_MESSAGES_ARCHIVE = archive_statement("chats.find_chat_messages")
+
+
+DELETE_CHAT_MESSAGES = statement(
+    "chats.delete_chat_messages",
+    """
+        UPDATE
+          messages
+        SET
+          content = "<em>Deleted Message!</em>",
+          modified_date = :modified_date
+        WHERE
+          sender = :sender_id
+        AND
+          receiver = :receiver_id
+    """,
+    params={
+        "modified_date": DateTime,
+        "sender_id": Integer,
+        "receiver_id": Integer,
+    },
+)
+DELETE_CHAT_MESSAGES_ARCHIVE = archive_statement("chats.delete_chat_messages")
+
+
+DELETE_CHAT_SUMMARY_CONTENT = statement(
+    "chats.delete_chat_summary_content",
+    """
+        UPDATE
+          chat_summaries
+        SET
+          last_content = "<em>Deleted Message!</em>",
+          modified_date = :modified_date
+        WHERE
+          owner = :receiver_id
+        AND
+          peer = :sender_id
+    """,
+    params={
+        "modified_date": DateTime,
+        "receiver_id": Integer,
+        "sender_id": Integer,
+    },
+)
+
+
+UNINDEX_CHAT_MESSAGES = statement(
+    "chats.unindex_chat_messages",
+    """
+        DELETE FROM
+          message_search
+        WHERE
+          sender = :sender_id
+        AND
+          receiver = :receiver_id
+    """,
+    params={"sender_id": Integer, "receiver_id": Integer},
+)
+
+
 async def delete_chat_messages(
     sender_id: int,
     receiver: EmailStr,
@@ -348,43 +915,29 @@ async def delete_chat_messages(
             "status_code": 400,
             "message": "Contact not found!",
         }
-    query = """
-        SELECT
-            *
-        FROM
-            messages
-        WHERE
-          sender = :sender_id
-        AND
-          receiver = :receiver_id
-    """
     values = {"sender_id": sender_id, "receiver_id": receiver.id}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_CHAT_MESSAGES, values)
     messages = result.fetchall()
+    if not messages:
+        result = await session.execute(FIND_CHAT_MESSAGES_ARCHIVE, values)
+        messages = result.fetchall()
     if not messages:  # pylint: disable=R1705
         return {
             "status_code": 400,
             "message": "There are no messages to delete!",
         }
     else:
-        query = """
-            UPDATE
-              messages
-            SET
-              content = "<em>Deleted Message!</em>",
-              modified_date = :modified_date
-            WHERE
-              sender = :sender_id
-            AND
-              receiver = :receiver_id
-        """
         values = {
             "sender_id": sender_id,
             "receiver_id": receiver.id,
             "modified_date": datetime.datetime.utcnow(),
         }
 
-        await session.execute(text(query), values)
+        await session.execute(DELETE_CHAT_MESSAGES, values)
+        await session.execute(DELETE_CHAT_MESSAGES_ARCHIVE, values)
+        await session.execute(UNINDEX_CHAT_MESSAGES, values)
+
+        await session.execute(DELETE_CHAT_SUMMARY_CONTENT, values)
 
         results = {
             "status_code": 200,
@@ -394,32 +947,9 @@ async def delete_chat_messages(
     return results
 
 
-async def get_sender_receiver_messages(
-    sender: UserObjectSchema, receiver: EmailStr, session: AsyncSession
-):
-    """
-    A method to fetch messages between a sender and a receiver.
-
-    Args:
-        sender (UserObjectSchema) : A user object schema that contains infor about a sender.
-        receiver (EmailStr) : An email for the recipient of the message.
-        session (AsyncSession) : SqlAlchemy session object.
-
-    Returns:
-        Result: Database result.
+GET_SENDER_RECEIVER_MESSAGES = statement(
+    "chats.get_sender_receiver_messages",
     """
-    if receiver == "chatgpt@brave-chat.net":
-        return {
-            "status_code": 400,
-            "message": "Contact not found!",
-        }
-    receiver = await find_existed_user(email=receiver, session=session)
-    if not receiver:
-        return {
-            "status_code": 400,
-            "message": "Contact not found!",
-        }
-    query = """
         SELECT
             id,
             content,
@@ -443,49 +973,457 @@ async def get_sender_receiver_messages(
           receiver = :sender_id
         )
         ORDER BY
-          creation_date
+          id
+    """,
+    params={"sender_id": Integer, "receiver_id": Integer},
+    columns={
+        "id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+    },
+)
+GET_SENDER_RECEIVER_MESSAGES_ARCHIVE = archive_statement(
+    "chats.get_sender_receiver_messages"
+)
+
+
+async def get_sender_receiver_messages(
+    sender: UserObjectSchema,
+    receiver: EmailStr,
+    session: AsyncSession,
+    read_session: Optional[AsyncSession] = None,
+):
+    """
+    A method to fetch messages between a sender and a receiver.
+
+    Args:
+        sender (UserObjectSchema) : A user object schema that contains infor about a sender.
+        receiver (EmailStr) : An email for the recipient of the message.
+        session (AsyncSession) : SqlAlchemy session object.
+        read_session (AsyncSession) : An optional session for the reads, e.g. on a replica.
+
+    Returns:
+        Result: Database result.
     """
+    if receiver == "chatgpt@brave-chat.net":
+        return {
+            "status_code": 400,
+            "message": "Contact not found!",
+        }
+    read_session = read_session or session
+    receiver = await find_existed_user(email=receiver, session=read_session)
+    if not receiver:
+        return {
+            "status_code": 400,
+            "message": "Contact not found!",
+        }
     values = {"sender_id": sender.id, "receiver_id": receiver.id}
-    result = await session.execute(text(query), values)
-    messages_sent_received = result.fetchall()
+    messages_sent_received = await read_full_history(
+        GET_SENDER_RECEIVER_MESSAGES,
+        GET_SENDER_RECEIVER_MESSAGES_ARCHIVE,
+        values,
+        read_session,
+    )
     results = {
         "status_code": 200,
         "result": messages_sent_received,
     }
-    # Mark received messages by this sender as read
-    query = """
+    await mark_messages_as_read(receiver.id, sender.id, session)
+    return results
+
+
+GET_SENDER_RECEIVER_MESSAGES_AFTER = statement(
+    "chats.get_sender_receiver_messages_after",
+    """
+        SELECT
+            *
+        FROM (
+            (
+                SELECT
+                    id,
+                    content,
+                    "sent" as type,
+                    media,
+                    creation_date
+                FROM
+                    messages
+                WHERE
+                  sender = :sender_id
+                AND
+                  receiver = :receiver_id
+                AND
+                  id > :cursor_id
+                ORDER BY
+                  id
+                LIMIT :limit
+            )
+            UNION ALL
+            (
+                SELECT
+                    id,
+                    content,
+                    "received" as type,
+                    media,
+                    creation_date
+                FROM
+                    messages
+                WHERE
+                  sender = :receiver_id
+                AND
+                  receiver = :sender_id
+                AND
+                  id > :cursor_id
+                ORDER BY
+                  id
+                LIMIT :limit
+            )
+        ) AS page
+        ORDER BY
+          id
+        LIMIT :limit
+    """,
+    params={
+        "sender_id": Integer,
+        "receiver_id": Integer,
+        "cursor_id": Integer,
+        "limit": Integer,
+    },
+    columns={
+        "id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+    },
+)
+GET_SENDER_RECEIVER_MESSAGES_AFTER_ARCHIVE = archive_statement(
+    "chats.get_sender_receiver_messages_after"
+)
+
+
+GET_SENDER_RECEIVER_MESSAGES_BEFORE = statement(
+    "chats.get_sender_receiver_messages_before",
+    """
+        SELECT
+            *
+        FROM (
+            (
+                SELECT
+                    id,
+                    content,
+                    "sent" as type,
+                    media,
+                    creation_date
+                FROM
+                    messages
+                WHERE
+                  sender = :sender_id
+                AND
+                  receiver = :receiver_id
+                AND
+                  id < :cursor_id
+                ORDER BY
+                  id DESC
+                LIMIT :limit
+            )
+            UNION ALL
+            (
+                SELECT
+                    id,
+                    content,
+                    "received" as type,
+                    media,
+                    creation_date
+                FROM
+                    messages
+                WHERE
+                  sender = :receiver_id
+                AND
+                  receiver = :sender_id
+                AND
+                  id < :cursor_id
+                ORDER BY
+                  id DESC
+                LIMIT :limit
+            )
+        ) AS page
+        ORDER BY
+          id DESC
+        LIMIT :limit
+    """,
+    params={
+        "sender_id": Integer,
+        "receiver_id": Integer,
+        "cursor_id": Integer,
+        "limit": Integer,
+    },
+    columns={
+        "id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+    },
+)
+GET_SENDER_RECEIVER_MESSAGES_BEFORE_ARCHIVE = archive_statement(
+    "chats.get_sender_receiver_messages_before"
+)
+
+
+async def get_sender_receiver_messages_page(  # pylint: disable=R0913
+    sender: UserObjectSchema,
+    receiver: EmailStr,
+    before: Optional[str],
+    after: Optional[str],
+    limit: int,
+    session: AsyncSession,
+    read_session: Optional[AsyncSession] = None,
+):
+    """
+    A method to fetch one page of messages between a sender and a receiver.
+
+    Pages are selected with a keyset on the message id, so every page costs
+    the same regardless of the length of the conversation. Without a cursor
+    the latest page is returned. Messages are returned in chronological order.
+
+    Args:
+        sender (UserObjectSchema) : A user object schema that contains infor about a sender.
+        receiver (EmailStr) : An email for the recipient of the message.
+        before (str) : An opaque cursor to fetch the messages older than it.
+        after (str) : An opaque cursor to fetch the messages newer than it.
+        limit (int) : The maximum number of messages in the page.
+        session (AsyncSession) : SqlAlchemy session object.
+        read_session (AsyncSession) : An optional session for the reads, e.g. on a replica.
+
+    Returns:
+        Result: Database result.
+    """
+    if before and after:
+        return {
+            "status_code": 400,
+            "message": "You can't paginate in both directions!",
+        }
+    cursor = before or after
+    cursor_id = decode_cursor(cursor) if cursor else None
+    if cursor and cursor_id is None:
+        return {
+            "status_code": 400,
+            "message": "Invalid cursor!",
+        }
+    if receiver == "chatgpt@brave-chat.net":
+        return {
+            "status_code": 400,
+            "message": "Contact not found!",
+        }
+    read_session = read_session or session
+    receiver = await find_existed_user(email=receiver, session=read_session)
+    if not receiver:
+        return {
+            "status_code": 400,
+            "message": "Contact not found!",
+        }
+    # each branch of the union is a range scan on (sender, receiver, id).
+    if after:
+        query = GET_SENDER_RECEIVER_MESSAGES_AFTER
+        archive_query = GET_SENDER_RECEIVER_MESSAGES_AFTER_ARCHIVE
+    else:
+        query = GET_SENDER_RECEIVER_MESSAGES_BEFORE
+        archive_query = GET_SENDER_RECEIVER_MESSAGES_BEFORE_ARCHIVE
+    values = {
+        "sender_id": sender.id,
+        "receiver_id": receiver.id,
+        "cursor_id": cursor_id if cursor_id is not None else MAX_MESSAGE_ID,
+        # fetch one extra message to know whether there is a next page.
+        "limit": limit + 1,
+    }
+    # the old messages are read from the archive.
+    messages = await read_history(
+        query, archive_query, values, bool(after), read_session
+    )
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].id)
+    if not after:
+        messages.reverse()
+    # Only the latest messages are on the screen of the user.
+    if not before:
+        await mark_messages_as_read(receiver.id, sender.id, session)
+    return {
+        "status_code": 200,
+        "result": messages,
+        "next_cursor": next_cursor,
+    }
+
+
+MARK_MESSAGES_AS_READ = statement(
+    "chats.mark_messages_as_read",
+    """
         UPDATE
           messages
         SET
           status = 0,
           modified_date = :modified_date
         WHERE
-          sender = :receiver_id
+          sender = :sender_id
         AND
-          receiver = :sender_id
+          receiver = :receiver_id
+        AND
+          status = 1
+    """,
+    params={
+        "modified_date": DateTime,
+        "sender_id": Integer,
+        "receiver_id": Integer,
+    },
+)
+
+
+RESET_CHAT_SUMMARY_UNREAD = statement(
+    "chats.reset_chat_summary_unread",
+    """
+        UPDATE
+          chat_summaries
+        SET
+          nb_unread = 0,
+          modified_date = :modified_date
+        WHERE
+          owner = :receiver_id
+        AND
+          peer = :sender_id
+        AND
+          nb_unread > 0
+    """,
+    params={
+        "modified_date": DateTime,
+        "receiver_id": Integer,
+        "sender_id": Integer,
+    },
+)
+
+
+async def mark_messages_as_read(
+    sender_id: int, receiver_id: int, session: AsyncSession
+):
+    """
+    A method to mark the messages sent by a sender to a receiver as read,
+    and to reset the unread counter of the sender in the receiver's chat list.
+
+    Args:
+        sender_id (int) : A user id for the sender of the messages.
+        receiver_id (int) : A user id for the recipient of the messages.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
     """
     values = {
-        "sender_id": sender.id,
-        "receiver_id": receiver.id,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
         "modified_date": datetime.datetime.utcnow(),
     }
-    await session.execute(text(query), values)
-    return results
+    result = await session.execute(MARK_MESSAGES_AS_READ, values)
+    await session.execute(RESET_CHAT_SUMMARY_UNREAD, values)
+    return result
+
+
+SEARCH_CHATS_USER = statement(
+    "chats.search_chats_user",
+    """
+        SELECT
+          chat_summaries.last_message_id as message_id,
+          chat_summaries.last_content as content,
+          chat_summaries.last_message_time,
+          chat_summaries.nb_unread as nb_unread_message,
+          SUM(chat_summaries.nb_unread) OVER() AS nb_total_unread_message,
+          users.id as id,
+          users.first_name,
+          users.last_name,
+          users.bio,
+          users.chat_status,
+          users.email,
+          users.phone_number,
+          users.profile_picture
+        FROM
+          chat_summaries
+        INNER JOIN
+          users
+        ON
+          chat_summaries.peer = users.id
+        WHERE
+          chat_summaries.owner = :user_id
+        AND
+          users.first_name LIKE :prefix
+        ORDER BY
+          chat_summaries.last_message_time
+    """,
+    params={"user_id": Integer, "prefix": String},
+    columns={
+        "message_id": Integer,
+        "content": Text,
+        "last_message_time": DateTime,
+        "nb_unread_message": Integer,
+        "id": Integer,
+    },
+)
+
+
+GET_CHATS_USER = statement(
+    "chats.get_chats_user",
+    """
+        SELECT
+          chat_summaries.last_message_id as message_id,
+          chat_summaries.last_content as content,
+          chat_summaries.last_message_time,
+          chat_summaries.nb_unread as nb_unread_message,
+          SUM(chat_summaries.nb_unread) OVER() AS nb_total_unread_message,
+          users.id as id,
+          users.first_name,
+          users.last_name,
+          users.bio,
+          users.chat_status,
+          users.email,
+          users.phone_number,
+          users.profile_picture
+        FROM
+          chat_summaries
+        INNER JOIN
+          users
+        ON
+          chat_summaries.peer = users.id
+        WHERE
+          chat_summaries.owner = :user_id
+        ORDER BY
+          chat_summaries.last_message_time
+    """,
+    params={"user_id": Integer},
+    columns={
+        "message_id": Integer,
+        "content": Text,
+        "last_message_time": DateTime,
+        "nb_unread_message": Integer,
+        "id": Integer,
+    },
+)
 
 
 async def get_chats_user(user_id: int, search: str, session: AsyncSession):
     """
-    A method to fetch messages between a sender and a receiver.
+    A method to fetch the chat list of a user.
+
+    The list is read from the chat summaries of the user, one row per peer
+    that sent them a message, so it costs O(peers) instead of O(messages).
 
     Args:
-        user_id (int) : A user id for the sender of the message.
-        search (str) : A string that represents the first name of the recipient.
+        user_id (int) : A user id for the owner of the chat list.
+        search (str) : The beginning of the first name of the peers to list.
         session (AsyncSession) : SqlAlchemy session object.
 
     Returns:
         Result: Database result.
     """
-    messages = await find_existed_user_messages(user_id, session)
     chatgpt = {
         "message_id": 100000000000000000,
         "content": "",
@@ -500,79 +1438,223 @@ async def get_chats_user(user_id: int, search: str, session: AsyncSession):
         "phone_number": None,
         "profile_picture": "user/1125899906842626/profile.png",
     }
-    if messages:
-        if search:
-            query = """
-                SELECT
-                  messages.id as message_id,
-                  content,
-                  MAX(messages.creation_date) OVER(PARTITION BY users.email) AS last_message_time,
-                  SUM(status) OVER(PARTITION BY users.email) AS nb_unread_message,
-                  SUM(status) OVER() AS nb_total_unread_message,
-                  users.id as id,
-                  users.first_name,
-                  users.last_name,
-                  users.bio,
-                  users.chat_status,
-                  users.email,
-                  users.phone_number,
-                  users.profile_picture
-                FROM
-                  messages
-                LEFT JOIN
-                  users
-                ON
-                  messages.sender = users.id
-                WHERE
-                  messages.receiver = :user_id
-                AND
-                  INSTR(users.first_name, :search) > 0
-                ORDER BY
-                  messages.creation_date
-            """
-            values = {"user_id": user_id, "search": search}
-        else:
-            query = """
-                SELECT
-                  messages.id as message_id,
-                  content,
-                  MAX(messages.creation_date) OVER(PARTITION BY users.email) AS last_message_time,
-                  SUM(status) OVER(PARTITION BY users.email) AS nb_unread_message,
-                  SUM(status) OVER() AS nb_total_unread_message,
-                  users.id as id,
-                  users.first_name,
-                  users.last_name,
-                  users.bio,
-                  users.chat_status,
-                  users.email,
-                  users.phone_number,
-                  users.profile_picture
-                FROM
-                  messages
-                LEFT JOIN
-                  users
-                ON
-                  messages.sender = users.id
-                WHERE
-                  messages.receiver = :user_id
-                ORDER BY
-                  messages.creation_date
-            """
-            values = {"user_id": user_id}
-        result = await session.execute(text(query), values)
-        contacts = result.fetchall()
-        # HAVING after a window function is not supported by SINGLESTORE
-        if contacts:
-            contacts = list(
-                {
-                    dict(myObject)["email"]: dict(myObject)
-                    for myObject in contacts
-                }.values()
+    if search:
+        query = SEARCH_CHATS_USER
+        values = {"user_id": user_id, "prefix": like_prefix(search)}
+    else:
+        query = GET_CHATS_USER
+        values = {"user_id": user_id}
+    result = await session.execute(query, values)
+    contacts = [dict(contact) for contact in result.fetchall()]
+    contacts.insert(0, chatgpt)
+    return {"status_code": 200, "result": contacts}
+
+
+SEARCH_MESSAGES = statement(
+    "chats.search_messages",
+    """
+        SELECT
+          matches.id,
+          matches.content,
+          matches.creation_date,
+          matches.score,
+          senders.email AS sender,
+          receivers.email AS receiver,
+          rooms.room_name AS room
+        FROM (
+          SELECT
+            id,
+            sender,
+            receiver,
+            room,
+            content,
+            creation_date,
+            MATCH(content) AGAINST (:search) AS score
+          FROM
+            message_search
+          WHERE
+            MATCH(content) AGAINST (:search)
+          AND (
+            (
+              room IS NULL
+              AND
+              (sender = :user_id OR receiver = :user_id)
+            )
+            OR room IN (
+              SELECT
+                room
+              FROM
+                room_members
+              WHERE
+                member = :user_id
+              AND
+                banned = 0
             )
-        contacts.insert(0, chatgpt)
-        results = {"status_code": 200, "result": contacts}
-        return results
+          )
+        ) AS matches
+        INNER JOIN
+          users AS senders
+        ON
+          matches.sender = senders.id
+        LEFT JOIN
+          users AS receivers
+        ON
+          matches.receiver = receivers.id
+        LEFT JOIN
+          rooms
+        ON
+          matches.room = rooms.id
+        ORDER BY
+          matches.score DESC,
+          matches.id DESC
+        LIMIT
+          :limit
+    """,
+    params={"search": Text, "user_id": Integer, "limit": Integer},
+    columns={
+        "id": Integer,
+        "content": Text,
+        "creation_date": DateTime,
+        "score": Float,
+    },
+)
+
+
+SEARCH_MESSAGES_AFTER = statement(
+    "chats.search_messages_after",
+    """
+        SELECT
+          matches.id,
+          matches.content,
+          matches.creation_date,
+          matches.score,
+          senders.email AS sender,
+          receivers.email AS receiver,
+          rooms.room_name AS room
+        FROM (
+          SELECT
+            id,
+            sender,
+            receiver,
+            room,
+            content,
+            creation_date,
+            MATCH(content) AGAINST (:search) AS score
+          FROM
+            message_search
+          WHERE
+            MATCH(content) AGAINST (:search)
+          AND (
+            (
+              room IS NULL
+              AND
+              (sender = :user_id OR receiver = :user_id)
+            )
+            OR room IN (
+              SELECT
+                room
+              FROM
+                room_members
+              WHERE
+                member = :user_id
+              AND
+                banned = 0
+            )
+          )
+        ) AS matches
+        INNER JOIN
+          users AS senders
+        ON
+          matches.sender = senders.id
+        LEFT JOIN
+          users AS receivers
+        ON
+          matches.receiver = receivers.id
+        LEFT JOIN
+          rooms
+        ON
+          matches.room = rooms.id
+        WHERE
+          matches.score < :score
+        OR (
+          matches.score = :score
+          AND
+          matches.id < :cursor_id
+        )
+        ORDER BY
+          matches.score DESC,
+          matches.id DESC
+        LIMIT
+          :limit
+    """,
+    params={
+        "search": Text,
+        "user_id": Integer,
+        "score": Float,
+        "cursor_id": Integer,
+        "limit": Integer,
+    },
+    columns={
+        "id": Integer,
+        "content": Text,
+        "creation_date": DateTime,
+        "score": Float,
+    },
+)
+
+
+async def search_messages(
+    user_id: int,
+    search: str,
+    cursor: Optional[str],
+    limit: int,
+    session: AsyncSession,
+):
+    """
+    A method to search the messages of the chats and rooms of a user.
+
+    The messages are matched by the FULLTEXT index of the message_search
+    table, ranked by relevance, and paged with a keyset on (score, id), so
+    every page costs the same however many messages match.
+
+    Args:
+        user_id (int) : A user id for the owner of the chats and rooms.
+        search (str) : The words to look for in the content of the messages.
+        cursor (str) : An opaque cursor to fetch the results ranked after it.
+        limit (int) : The maximum number of results in the page.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    # only the words are kept, the full-text query operators are not.
+    words = " ".join(re.findall(r"\w+", search))
+    if not words:
+        return {
+            "status_code": 400,
+            "message": "You can't search for an empty text!",
+        }
+    values = {"search": words, "user_id": user_id, "limit": limit + 1}
+    if cursor:
+        rank = decode_search_cursor(cursor)
+        if rank is None:
+            return {
+                "status_code": 400,
+                "message": "Invalid cursor!",
+            }
+        query = SEARCH_MESSAGES_AFTER
+        values["score"], values["cursor_id"] = rank
+    else:
+        query = SEARCH_MESSAGES
+    result = await session.execute(query, values)
+    messages = result.fetchall()
+    next_cursor = None
+    # one extra result was fetched to know whether there is a next page.
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_search_cursor(messages[-1].score, messages[-1].id)
     return {
         "status_code": 200,
-        "result": [chatgpt],
+        "result": messages,
+        "next_cursor": next_cursor,
     }
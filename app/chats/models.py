@@ -2,17 +2,28 @@
 
 # conflict between isort and pylint
 # pylint: disable=C0411
+import datetime
 from enum import Enum
 from sqlalchemy import (
+    BIGINT,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.mysql import (
+    TEXT,
 )
 from typing import (
     Optional,
 )
 
+from app.utils.full_text_search import (
+    Fulltext,
+)
 from app.utils.mixins import (
     Base,
     CommonMixin,
@@ -38,27 +49,173 @@ class Messages(Base, CommonMixin, TimestampMixin):  # pylint: disable=R0903
     The `messages` model.
 
     Args:
-        __table_args__ (dict) : SqlAlchemy configs to convert from COLUMNAR to ROWSTORE.
+        __table_args__ (tuple) : The composite indexes, and configs to convert from COLUMNAR to ROWSTORE.
         sender (int) : A user id foreign key value for the sender of the message.
         receiver (int) : A user id foreign key value for the recipient of the message.
         room (int) : A room id foreign key value of the message.
         content (str) : The content of the message.
         status (int) : The status of the message(e.g. read or not read).
         message_type (str) : The message type(e.g. 'text' or 'media').
-        media (str) : A relative URL to the location of the image on the Deta drive.
+        media (str) : A relative URL to the location of the image in the media storage.
+    """
+
+    __table_args__ = (
+        # keyset pagination of direct conversations.
+        Index("ix_messages_sender_receiver_id", "sender", "receiver", "id"),
+        # keyset pagination of room conversations.
+        Index("ix_messages_room_id", "room", "id"),
+        # unread messages of a receiver, e.g. the chat summaries backfill.
+        Index("ix_messages_receiver_status", "receiver", "status"),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
+    )
+
+    # the sender, receiver and room lookups use the composite indexes.
+    sender: int = Column(ForeignKey("users.id"))
+    receiver: int = Column(ForeignKey("users.id"))
+    room: int = Column(ForeignKey("rooms.id"), default=None)
+    content: str = Column(String(1024))
+    status: int = Column(Integer, default=MessageStatus.NOT_READ.value)
+    message_type: str = Column(String(10))
+    media: Optional[str] = Column(String(220), nullable=True)
+
+
+class MessagesArchive(
+    Base, CommonMixin, TimestampMixin
+):  # pylint: disable=R0903
+    """
+    The `messages_archive` model.
+
+    The cold tier of the messages: the messages older than
+    `MESSAGE_ARCHIVE_AFTER_DAYS` are moved here, keeping their id, by the
+    messages archive job. It's a compressed COLUMNAR table, and it only
+    holds ids lower than every id of the `messages` table, so a keyset
+    cursor tells which table a page must be read from.
+
+    Args:
+        __table_args__ (tuple) : The composite indexes of the history queries.
+        sender (int) : A user id foreign key value for the sender of the message.
+        receiver (int) : A user id foreign key value for the recipient of the message.
+        room (int) : A room id foreign key value of the message.
+        content (str) : The content of the message.
+        status (int) : The status of the message(e.g. read or not read).
+        message_type (str) : The message type(e.g. 'text' or 'media').
+        media (str) : A relative URL to the location of the image in the media storage.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_messages_archive_sender_receiver_id",
+            "sender",
+            "receiver",
+            "id",
+        ),
+        Index("ix_messages_archive_room_id", "room", "id"),
+    )
+
+    sender: int = Column(ForeignKey("users.id"))
+    receiver: int = Column(ForeignKey("users.id"))
+    room: int = Column(ForeignKey("rooms.id"), default=None)
+    # created with emoji support, like the content of the messages.
+    content: str = Column(TEXT(charset="utf8mb4"))
+    status: int = Column(Integer)
+    message_type: str = Column(String(10))
+    media: Optional[str] = Column(String(220), nullable=True)
+
+
+class MessageSearch(
+    Base, CommonMixin, TimestampMixin
+):  # pylint: disable=R0903
+    """
+    The `message_search` model.
+
+    A copy of the searchable columns of every message, keyed by the message
+    id, in a COLUMNAR table behind a FULLTEXT index on the content, which
+    the ROWSTORE `messages` table can't have. Rows are inserted in the
+    transaction of their messages, and deleted with them.
+
+    Args:
+        __table_args__ (tuple) : The FULLTEXT index on the content.
+        sender (int) : A user id foreign key value for the sender of the message.
+        receiver (int) : A user id foreign key value for the recipient of the message.
+        room (int) : A room id foreign key value of the message.
+        content (str) : The content of the message.
     """
 
-    __table_args__ = {
-        "mysql_engine": "InnoDB",
-        "prefixes": ["ROWSTORE", "REFERENCE"],
-    }
+    __table_args__ = (Fulltext("content"),)
 
     sender: int = Column(ForeignKey("users.id"), index=True)
     receiver: int = Column(ForeignKey("users.id"), index=True)
     room: int = Column(ForeignKey("rooms.id"), index=True, default=None)
-    content: str = Column(String(1024), index=True)
-    status: int = Column(
-        Integer, index=True, default=MessageStatus.NOT_READ.value
+    # created with emoji support, a FULLTEXT column can't be altered.
+    content: str = Column(TEXT(charset="utf8mb4"))
+
+
+class ChatSummaries(
+    Base, CommonMixin, TimestampMixin
+):  # pylint: disable=R0903
+    """
+    The `chat_summaries` model.
+
+    One row per (owner, peer) pair that summarizes the direct messages the
+    owner received from the peer. Rows are upserted when a message is sent
+    and reset when the owner reads the conversation, so the chat list is
+    read in O(peers) instead of O(messages).
+
+    Args:
+        __table_args__ (tuple) : The (owner, peer) unique key, and the configs of a ROWSTORE table.
+        owner (int) : A user id foreign key value for the recipient of the messages.
+        peer (int) : A user id foreign key value for the sender of the messages.
+        last_message_id (int) : The id of the last message received from the peer.
+        last_content (str) : The content of the last message received from the peer.
+        last_message_time (datetime) : The creation date of the last message received from the peer.
+        nb_unread (int) : The number of unread messages received from the peer.
+    """
+
+    __table_args__ = (
+        UniqueConstraint("owner", "peer", name="uq_chat_summaries_owner_peer"),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
     )
-    message_type: str = Column(String(10), index=True)
-    media: Optional[str] = Column(String(220), nullable=True)
+
+    # the owner lookups use the (owner, peer) unique key.
+    owner: int = Column(ForeignKey("users.id"))
+    peer: int = Column(ForeignKey("users.id"))
+    last_message_id: int = Column(BIGINT)
+    last_content: str = Column(String(1024))
+    last_message_time: datetime.datetime = Column(DateTime)
+    nb_unread: int = Column(Integer, default=0)
+
+
+class MediaBlobs(Base, CommonMixin, TimestampMixin):  # pylint: disable=R0903
+    """
+    The `media_blobs` model.
+
+    One row per distinct chat image, addressed by the SHA-256 digest of its
+    bytes. Every message that sends the image takes a reference, so an image
+    forwarded to many chats is stored and uploaded once.
+
+    Args:
+        __table_args__ (tuple) : The digest unique key, and the configs of a ROWSTORE table.
+        digest (str) : The hex SHA-256 digest of the image.
+        size (int) : The size in bytes of the image.
+        ref_count (int) : The number of messages that reference the image.
+        stored (int) : 1 once the image has been uploaded to the media storage.
+    """
+
+    __table_args__ = (
+        UniqueConstraint("digest", name="uq_media_blobs_digest"),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
+    )
+
+    digest: str = Column(String(64))
+    size: int = Column(BIGINT)
+    ref_count: int = Column(Integer, default=0)
+    stored: int = Column(Integer, default=0)
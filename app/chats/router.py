@@ -2,11 +2,11 @@
 
 # conflict between isort and py
 # pylint: disable=C0411
-from deta import Deta
 from fastapi import (
     APIRouter,
     Depends,
-    responses,
+    Query,
+    Request,
 )
 from pydantic import (
     EmailStr,
@@ -15,6 +15,7 @@ from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
 from typing import (
+    Optional,
     Union,
 )
 
@@ -25,29 +26,47 @@ from app.chats.crud import (
     delete_chat_messages,
     get_chats_user,
     get_sender_receiver_messages,
+    get_sender_receiver_messages_page,
+    search_messages,
     send_new_message,
 )
 from app.chats.schemas import (
     DeleteChatMessages,
     GetAllMessageResults,
+    GetPagedMessageResults,
     MessageCreate,
 )
-from app.config import (
-    settings,
-)
 from app.users.schemas import (
     UserObjectSchema,
 )
+from app.utils.constants import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
 from app.utils.dependencies import (
     get_db_autocommit_session,
+    get_db_read_session,
 )
 from app.utils.jwt_util import (
     get_current_active_user,
 )
+from app.utils.media_response import (
+    IMMUTABLE_CACHE_CONTROL,
+    media_response,
+)
+from app.utils.media_upload import (
+    media_etag,
+    media_storage_name,
+)
+from app.utils.storage import (
+    SENT_IMAGES_BUCKET,
+    get_storage,
+)
+from app.utils.thumbnails import (
+    ImageVariant,
+)
 
-deta = Deta(settings.DETA_PROJECT_KEY)
-
-sent_images = deta.Drive("sent-images")
+sent_images = get_storage(SENT_IMAGES_BUCKET)
 
 router = APIRouter(prefix="/api/v1")
 
@@ -86,29 +105,47 @@ async def send_message(
 
 @router.get(
     "/conversation",
-    response_model=Union[ResponseSchema, GetAllMessageResults],
+    response_model=Union[
+        ResponseSchema, GetPagedMessageResults, GetAllMessageResults
+    ],
     status_code=200,
     name="chats:get-all-conversations",
     responses={
         200: {
-            "model": GetAllMessageResults,
-            "description": "Return a list of messages between two parties.",
+            "model": GetPagedMessageResults,
+            "description": "Return a list of messages between two parties."
+            " The list is paginated when a cursor or a limit is given.",
         },
     },
 )
 async def get_conversation(
     receiver: EmailStr,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     currentUser: UserObjectSchema = Depends(
         get_current_active_user
     ),  # pylint: disable=C0103
     session: AsyncSession = Depends(get_db_autocommit_session),
+    read_session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     The get_conversation endpoint.
     """
-    results = await get_sender_receiver_messages(
-        currentUser, receiver, session
-    )
+    if before or after or limit:
+        results = await get_sender_receiver_messages_page(
+            currentUser,
+            receiver,
+            before,
+            after,
+            limit or DEFAULT_PAGE_SIZE,
+            session,
+            read_session,
+        )
+    else:
+        results = await get_sender_receiver_messages(
+            currentUser, receiver, session, read_session
+        )
     return results
 
 
@@ -122,7 +159,7 @@ async def get_chats_user_list(
     currentUser: UserObjectSchema = Depends(
         get_current_active_user
     ),  # pylint: disable=C0103
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     The get_chats_user_list endpoint.
@@ -141,7 +178,7 @@ async def get_chats_user_search_list(
     currentUser: UserObjectSchema = Depends(
         get_current_active_user
     ),  # pylint: disable=C0103
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     The get_chats_user_search_list endpoint.
@@ -150,6 +187,41 @@ async def get_chats_user_search_list(
     return results
 
 
+@router.get(
+    "/messages/search",
+    response_model=Union[ResponseSchema, GetPagedMessageResults],
+    status_code=200,
+    name="chats:search-messages",
+    responses={
+        200: {
+            "model": GetPagedMessageResults,
+            "description": "Return a page of the messages of the chats and"
+            " rooms of a user that match a search, best matches first.",
+        },
+        400: {
+            "model": ResponseSchema,
+            "description": "Empty search, invalid cursor!",
+        },
+    },
+)
+async def search_user_messages(
+    search: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    currentUser: UserObjectSchema = Depends(
+        get_current_active_user
+    ),  # pylint: disable=C0103
+    session: AsyncSession = Depends(get_db_read_session),
+):
+    """
+    The search_user_messages endpoint.
+    """
+    results = await search_messages(
+        currentUser.id, search, cursor, limit, session
+    )
+    return results
+
+
 @router.delete(
     "/user/chat",
     status_code=200,
@@ -184,14 +256,24 @@ async def delete_user_chat(
 
 
 @router.get("/chat/images/user/{user_id}/{uuid_val}")
-async def get_sent_user_chat_images(user_id: int, uuid_val: str):
+async def get_sent_user_chat_images(
+    request: Request,
+    user_id: int,
+    uuid_val: str,
+    size: Optional[ImageVariant] = None,
+):
     """
     The get_sent_user_chat_images endpoint.
     """
     try:
-        img = sent_images.get(f"/chat/images/user/{user_id}/{uuid_val}")
-        return responses.StreamingResponse(
-            img.iter_chunks(), media_type="image/png"
+        url = f"/chat/images/user/{user_id}/{uuid_val}"
+        return await media_response(
+            request,
+            sent_images,
+            media_storage_name(url),
+            IMMUTABLE_CACHE_CONTROL,
+            etag=media_etag(url),
+            variant=size,
         )
     except Exception:  # pylint: disable=W0703
         return {"status_code": 400, "message": "Something went wrong!"}
@@ -85,6 +85,21 @@ class GetAllMessageResults(BaseModel):
     result: list[dict[str, Any]]
 
 
+class GetPagedMessageResults(BaseModel):
+    """
+    A Pydantic class that defines the message response schema for fetching a page of messages.
+
+    Args:
+        status_code (int) : A response status code.
+        result (list[dict[str, Any]]) : The messages of the page in chronological order.
+        next_cursor (str) : An opaque cursor to the next page, if any.
+    """
+
+    status_code: int = Field(..., example=200)
+    result: list[dict[str, Any]]
+    next_cursor: Optional[str] = Field(..., example="eyJpZCI6IDQyfQ==")
+
+
 class DeleteChatMessages(BaseModel):
     """
     A Pydantic class that defines the message response schema for deleting messages.
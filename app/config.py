@@ -3,7 +3,7 @@
 # conflict between isort and pylint
 # pylint: disable=C0411
 from aioredis import (
-    from_url,
+    ConnectionPool,
 )
 import os
 from pathlib import (
@@ -15,6 +15,9 @@ from pydantic import (
 from tempfile import (
     gettempdir,
 )
+from typing import (
+    Optional,
+)
 
 TEMP_DIR = Path(gettempdir())
 
@@ -41,6 +44,66 @@ class Settings(BaseSettings):
         DEBUG (str) : A variable used to separate testing env from production env.
         CORS_ORIGINS (str) : A string that contains comma separated urls for cors origins.
         PROMETHEUS_DIR (str) : A temporary posix path for prometheus metrics.
+        REDIS_MAX_CONNECTIONS (int) : The size of the per-worker Redis connection pool.
+        WS_QUEUE_SIZE (int) : The maximum number of pending messages per web socket.
+        PUB_SUB_READ_TIMEOUT (float) : Seconds the subscriber waits for a message before re-checking.
+        WS_HEARTBEAT_INTERVAL (float) : Seconds of silence after which a ping frame is sent to a socket.
+        OPENAI_API_BASE (str) : An optional OpenAI compatible API base URL.
+        CHATGPT_MODEL (str) : The OpenAI chat model used in ChatGPT conversations.
+        CHATGPT_MAX_CONCURRENCY (int) : The maximum number of running completions per worker.
+        CHATGPT_MAX_PENDING (int) : The maximum number of queued completions per worker.
+        CHATGPT_CHUNK_SIZE (int) : The number of characters coalesced before publishing a delta.
+        CHATGPT_FLUSH_INTERVAL (float) : The number of seconds after which a partial delta is published.
+        MESSAGE_BATCH_SIZE (int) : The maximum number of messages written by one INSERT.
+        MESSAGE_FLUSH_INTERVAL (float) : Seconds after which a partial batch of messages is written.
+        MESSAGE_QUEUE_SIZE (int) : The maximum number of messages waiting to be written per worker.
+        MESSAGE_WRITE_RETRIES (int) : The number of times a failed batch of messages is retried.
+        MESSAGE_RETRY_DELAY (float) : Seconds before the first retry of a failed batch, doubled every retry.
+        CACHE_ENABLED (bool) : Whether user, room and membership lookups are cached in memory.
+        CACHE_MAX_SIZE (int) : The maximum number of entries per lookup cache.
+        CACHE_TTL (float) : The number of seconds a cached lookup is trusted.
+        REVOCATION_CAPACITY (int) : The expected number of revoked tokens that are not expired yet.
+        REVOCATION_ERROR_RATE (float) : The false positive rate of the revoked tokens filter.
+        REVOCATION_RELOAD_INTERVAL (float) : Seconds between two reloads of the revoked tokens.
+        PASSWORD_HASHER_POOL (str) : The kind of pool that runs bcrypt, 'thread' or 'process'.
+        PASSWORD_HASHER_WORKERS (int) : The number of bcrypt workers per worker process.
+        PASSWORD_HASHER_MAX_PENDING (int) : The number of queued bcrypt calls above which new ones fail.
+        MEDIA_MAX_SIZE (int) : The maximum size in bytes of an uploaded image.
+        MEDIA_UPLOAD_CONCURRENCY (int) : The maximum number of concurrent image uploads per worker.
+        MEDIA_DECODE_CHUNK_SIZE (int) : The number of base64 characters decoded at once.
+        STORAGE_BACKEND (str) : The media storage driver, 'local', 's3' or 'deta'.
+        STORAGE_ROOT (Path) : The directory of the local media storage.
+        STORAGE_CHUNK_SIZE (int) : The number of bytes read at once from the media storage.
+        S3_ENDPOINT_URL (str) : An optional S3 compatible endpoint, e.g. a MinIO server.
+        S3_ACCESS_KEY_ID (str) : The S3 access key id.
+        S3_SECRET_ACCESS_KEY (str) : The S3 secret access key.
+        S3_REGION (str) : The region of the S3 buckets.
+        MEDIA_MAX_AGE (int) : The number of seconds browsers and CDNs cache a chat image.
+        PROFILE_IMAGE_MAX_AGE (int) : Seconds browsers and CDNs cache a profile picture before revalidation.
+        THUMBNAIL_SIZE (int) : The bounding box size in pixels of the image thumbnails.
+        PREVIEW_SIZE (int) : The bounding box size in pixels of the image previews.
+        THUMBNAIL_WORKERS (int) : The number of processes that render image variants per worker.
+        THUMBNAIL_MAX_PENDING (int) : The number of images waiting to be resized before new ones are skipped.
+        MEDIA_CACHE_ENABLED (bool) : Whether the images of a remote media storage are cached on local disk.
+        MEDIA_CACHE_DIR (Path) : The directory of the media cache, shared by the workers of a node.
+        MEDIA_CACHE_MAX_BYTES (int) : The maximum size in bytes of the media cache of a node.
+        MEDIA_CACHE_MAX_FILE_SIZE (int) : The size in bytes above which a file is not cached.
+        MEDIA_CACHE_REVALIDATE_AFTER (float) : Seconds after which a cached profile picture is checked.
+        MEDIA_CACHE_SCAN_INTERVAL (float) : Seconds between two scans that enforce the media cache size.
+        DB_POOL_SIZE (int) : The number of database connections kept open per worker.
+        DB_MAX_OVERFLOW (int) : The number of database connections opened beyond the pool size under load.
+        DB_POOL_TIMEOUT (float) : Seconds a request waits for a database connection before failing.
+        DB_POOL_RECYCLE (int) : The number of seconds after which a database connection is reopened.
+        DB_POOL_PRE_PING (bool) : Whether a database connection is tested before being used.
+        DB_CONNECT_TIMEOUT (int) : The number of seconds to wait when opening a database connection.
+        DB_ECHO (bool) : Whether every SQL statement is logged, for development only.
+        DB_ECHO_POOL (bool) : Whether the pool checkouts and checkins are logged, for development only.
+        SINGLESTORE_REPLICA_HOST (str) : An optional read replica URL, that serves the read-only queries.
+        SINGLESTORE_REPLICA_PORT (str) : The read replica port number, the primary one by default.
+        READ_YOUR_WRITES_WINDOW (float) : Seconds during which the reads of a writer go to the primary.
+        MESSAGE_ARCHIVE_AFTER_DAYS (int) : The age in days after which the messages are archived, 0 to never.
+        MESSAGE_ARCHIVE_INTERVAL (float) : The number of seconds between two runs of the messages archive job.
+        MESSAGE_ARCHIVE_BATCH_SIZE (int) : The maximum number of messages archived by one transaction.
 
     Example:
         >>> REDIS_HOST=redis-123456789.ec2.cloud.redislabs.com
@@ -57,6 +120,66 @@ class Settings(BaseSettings):
         >>> DEBUG="" # "" means production, "test" means testing, "info" means development.
         >>> CORS_ORIGINS="https://app-name.herokuapp.com,http://app-name.pages.dev"
         >>> PROMETHEUS_DIR="/tmp/prom"
+        >>> REDIS_MAX_CONNECTIONS=50
+        >>> WS_QUEUE_SIZE=100
+        >>> PUB_SUB_READ_TIMEOUT=30
+        >>> WS_HEARTBEAT_INTERVAL=25
+        >>> OPENAI_API_BASE="http://localhost:8080/v1"
+        >>> CHATGPT_MODEL="gpt-3.5-turbo"
+        >>> CHATGPT_MAX_CONCURRENCY=8
+        >>> CHATGPT_MAX_PENDING=32
+        >>> CHATGPT_CHUNK_SIZE=64
+        >>> CHATGPT_FLUSH_INTERVAL=0.1
+        >>> MESSAGE_BATCH_SIZE=100
+        >>> MESSAGE_FLUSH_INTERVAL=0.05
+        >>> MESSAGE_QUEUE_SIZE=10000
+        >>> MESSAGE_WRITE_RETRIES=3
+        >>> MESSAGE_RETRY_DELAY=0.5
+        >>> CACHE_ENABLED=True
+        >>> CACHE_MAX_SIZE=10000
+        >>> CACHE_TTL=30
+        >>> REVOCATION_CAPACITY=100000
+        >>> REVOCATION_ERROR_RATE=0.001
+        >>> REVOCATION_RELOAD_INTERVAL=30
+        >>> PASSWORD_HASHER_POOL="thread"
+        >>> PASSWORD_HASHER_WORKERS=4
+        >>> PASSWORD_HASHER_MAX_PENDING=64
+        >>> MEDIA_MAX_SIZE=10485760
+        >>> MEDIA_UPLOAD_CONCURRENCY=4
+        >>> MEDIA_DECODE_CHUNK_SIZE=65536
+        >>> STORAGE_BACKEND="local"
+        >>> STORAGE_ROOT="/var/lib/brave-chat/media"
+        >>> STORAGE_CHUNK_SIZE=65536
+        >>> S3_ENDPOINT_URL="http://localhost:9000"
+        >>> S3_ACCESS_KEY_ID=minioadmin
+        >>> S3_SECRET_ACCESS_KEY=minioadmin
+        >>> S3_REGION="us-east-1"
+        >>> MEDIA_MAX_AGE=31536000
+        >>> PROFILE_IMAGE_MAX_AGE=60
+        >>> THUMBNAIL_SIZE=128
+        >>> PREVIEW_SIZE=640
+        >>> THUMBNAIL_WORKERS=2
+        >>> THUMBNAIL_MAX_PENDING=64
+        >>> MEDIA_CACHE_ENABLED=True
+        >>> MEDIA_CACHE_DIR="/tmp/media-cache"
+        >>> MEDIA_CACHE_MAX_BYTES=1073741824
+        >>> MEDIA_CACHE_MAX_FILE_SIZE=10485760
+        >>> MEDIA_CACHE_REVALIDATE_AFTER=60
+        >>> MEDIA_CACHE_SCAN_INTERVAL=300
+        >>> DB_POOL_SIZE=30
+        >>> DB_MAX_OVERFLOW=30
+        >>> DB_POOL_TIMEOUT=30
+        >>> DB_POOL_RECYCLE=3600
+        >>> DB_POOL_PRE_PING=True
+        >>> DB_CONNECT_TIMEOUT=10
+        >>> DB_ECHO=False
+        >>> DB_ECHO_POOL=False
+        >>> SINGLESTORE_REPLICA_HOST=svc-987654321.svc.singlestore.com
+        >>> SINGLESTORE_REPLICA_PORT=3306
+        >>> READ_YOUR_WRITES_WINDOW=5
+        >>> MESSAGE_ARCHIVE_AFTER_DAYS=90
+        >>> MESSAGE_ARCHIVE_INTERVAL=3600
+        >>> MESSAGE_ARCHIVE_BATCH_SIZE=5000
     """
 
     REDIS_HOST: str = os.getenv("REDIS_HOST")
@@ -73,6 +196,70 @@ class Settings(BaseSettings):
     DEBUG: str = os.getenv("DEBUG")
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS")
     PROMETHEUS_DIR: Path = TEMP_DIR / "prom"
+    REDIS_MAX_CONNECTIONS: int = 50
+    WS_QUEUE_SIZE: int = 100
+    PUB_SUB_READ_TIMEOUT: float = 30.0
+    WS_HEARTBEAT_INTERVAL: float = 25.0
+    OPENAI_API_BASE: Optional[str] = os.getenv("OPENAI_API_BASE")
+    CHATGPT_MODEL: str = "gpt-3.5-turbo"
+    CHATGPT_MAX_CONCURRENCY: int = 8
+    CHATGPT_MAX_PENDING: int = 32
+    CHATGPT_CHUNK_SIZE: int = 64
+    CHATGPT_FLUSH_INTERVAL: float = 0.1
+    MESSAGE_BATCH_SIZE: int = 100
+    MESSAGE_FLUSH_INTERVAL: float = 0.05
+    MESSAGE_QUEUE_SIZE: int = 10000
+    MESSAGE_WRITE_RETRIES: int = 3
+    MESSAGE_RETRY_DELAY: float = 0.5
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_SIZE: int = 10000
+    CACHE_TTL: float = 30.0
+    REVOCATION_CAPACITY: int = 100000
+    REVOCATION_ERROR_RATE: float = 0.001
+    REVOCATION_RELOAD_INTERVAL: float = 30.0
+    PASSWORD_HASHER_POOL: str = "thread"
+    PASSWORD_HASHER_WORKERS: int = 4
+    PASSWORD_HASHER_MAX_PENDING: int = 64
+    MEDIA_MAX_SIZE: int = 10485760
+    MEDIA_UPLOAD_CONCURRENCY: int = 4
+    MEDIA_DECODE_CHUNK_SIZE: int = 65536
+    STORAGE_BACKEND: str = "deta"
+    STORAGE_ROOT: Path = Path("media")
+    STORAGE_CHUNK_SIZE: int = 65536
+    S3_ENDPOINT_URL: Optional[str] = os.getenv("S3_ENDPOINT_URL")
+    S3_ACCESS_KEY_ID: Optional[str] = os.getenv("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY: Optional[str] = os.getenv("S3_SECRET_ACCESS_KEY")
+    S3_REGION: str = "us-east-1"
+    MEDIA_MAX_AGE: int = 31536000
+    PROFILE_IMAGE_MAX_AGE: int = 60
+    THUMBNAIL_SIZE: int = 128
+    PREVIEW_SIZE: int = 640
+    THUMBNAIL_WORKERS: int = 2
+    THUMBNAIL_MAX_PENDING: int = 64
+    MEDIA_CACHE_ENABLED: bool = True
+    MEDIA_CACHE_DIR: Path = TEMP_DIR / "media-cache"
+    MEDIA_CACHE_MAX_BYTES: int = 1073741824
+    MEDIA_CACHE_MAX_FILE_SIZE: int = 10485760
+    MEDIA_CACHE_REVALIDATE_AFTER: float = 60.0
+    MEDIA_CACHE_SCAN_INTERVAL: float = 300.0
+    DB_POOL_SIZE: int = 30
+    DB_MAX_OVERFLOW: int = 30
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    DB_CONNECT_TIMEOUT: int = 10
+    DB_ECHO: bool = False
+    DB_ECHO_POOL: bool = False
+    SINGLESTORE_REPLICA_HOST: Optional[str] = os.getenv(
+        "SINGLESTORE_REPLICA_HOST"
+    )
+    SINGLESTORE_REPLICA_PORT: Optional[str] = os.getenv(
+        "SINGLESTORE_REPLICA_PORT"
+    )
+    READ_YOUR_WRITES_WINDOW: float = 5.0
+    MESSAGE_ARCHIVE_AFTER_DAYS: int = 90
+    MESSAGE_ARCHIVE_INTERVAL: float = 3600.0
+    MESSAGE_ARCHIVE_BATCH_SIZE: int = 5000
 
     class Config:  # pylint: disable=R0903
         """
@@ -123,6 +310,33 @@ class Settings(BaseSettings):
             )
         return sqlalchemy_database_url
 
+    @property
+    def replica_db_url(self) -> Optional[str]:
+        """
+        Assemble the read replica URL from self.
+
+        Args:
+            self ( _obj_ ) : object reference.
+
+        Returns:
+            Optional[str]: The assembled URL, or None without a replica.
+        """
+
+        if self.DEBUG == "test" or not self.SINGLESTORE_REPLICA_HOST:
+            return None
+        return (
+            "mysql+aiomysql://"
+            + self.SINGLESTORE_USERNAME
+            + ":"
+            + self.SINGLESTORE_PASSWORD
+            + "@"
+            + self.SINGLESTORE_REPLICA_HOST
+            + ":"
+            + (self.SINGLESTORE_REPLICA_PORT or self.SINGLESTORE_PORT)
+            + "/"
+            + self.SINGLESTORE_DATABASE
+        )
+
     @property
     def cors_origins(self) -> list[str]:
         """
@@ -140,7 +354,8 @@ class Settings(BaseSettings):
             else []
         )
 
-    async def redis_conn(self) -> str:
+    @property
+    def redis_url(self) -> str:
         """
         Assemble Redis URL from self.
 
@@ -150,7 +365,7 @@ class Settings(BaseSettings):
         Returns:
             str: The assembled Redis host URL.
         """
-        return await from_url(
+        return (
             "redis://"
             + self.REDIS_USERNAME
             + ":"
@@ -160,7 +375,22 @@ class Settings(BaseSettings):
             + ":"
             + self.REDIS_PORT
             + "/"
-            "0",
+            "0"
+        )
+
+    def redis_pool(self) -> ConnectionPool:
+        """
+        Create a Redis connection pool to be shared by a worker.
+
+        Args:
+            self ( _obj_ ) : object reference.
+
+        Returns:
+            ConnectionPool: A Redis connection pool.
+        """
+        return ConnectionPool.from_url(
+            self.redis_url,
+            max_connections=self.REDIS_MAX_CONNECTIONS,
             decode_responses=True,
         )
 
@@ -3,17 +3,60 @@ import logging
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
-from sqlalchemy.sql import (
-    text,
+from sqlalchemy.types import (
+    DateTime,
+    Integer,
+    String,
 )
 
 from app.auth.crud import (
     find_existed_user,
 )
+from app.utils.statements import (
+    statement,
+)
 
 logger = logging.getLogger(__name__)
 
 
+FIND_CONTACT = statement(
+    "contacts.find_contact",
+    """
+        SELECT
+          *
+        FROM
+          contacts
+        WHERE
+          user = :user_id
+        AND
+          contact = :contact_id
+    """,
+    params={"user_id": Integer, "contact_id": Integer},
+)
+
+
+INSERT_CONTACT = statement(
+    "contacts.insert_contact",
+    """
+        INSERT INTO contacts (
+          user,
+          contact,
+          creation_date
+        )
+        VALUES (
+          :user_id,
+          :contact_id,
+          :creation_date
+        )
+    """,
+    params={
+        "user_id": Integer,
+        "contact_id": Integer,
+        "creation_date": DateTime,
+    },
+)
+
+
 async def create_new_contact(
     contact_email: str, user_id: int, session: AsyncSession
 ):
@@ -28,18 +71,8 @@ async def create_new_contact(
             "status_code": 400,
             "message": "You can't add yourself!",
         }
-    query = """
-        SELECT
-          *
-        FROM
-          contacts
-        WHERE
-          user = :user_id
-        AND
-          contact = :contact_id
-    """
     values = {"user_id": user_id, "contact_id": contact.id}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_CONTACT, values)
     found_contact = result.fetchone()
     if found_contact:
         return {
@@ -48,25 +81,13 @@ async def create_new_contact(
             " contact list!",
         }
     # add contact_id to contact list
-    query = """
-        INSERT INTO contacts (
-          user,
-          contact,
-          creation_date
-        )
-        VALUES (
-          :user_id,
-          :contact_id,
-          :creation_date
-        )
-    """
     values = {
         "user_id": user_id,
         "contact_id": contact.id,
         "creation_date": datetime.datetime.utcnow(),
     }
 
-    await session.execute(text(query), values)
+    await session.execute(INSERT_CONTACT, values)
     results = {
         "status_code": 201,
         "message": f"{contact.first_name} has been added to your contact"
@@ -75,6 +96,21 @@ async def create_new_contact(
     return results
 
 
+DELETE_CONTACT = statement(
+    "contacts.delete_contact",
+    """
+        DELETE
+        FROM
+          contacts
+        WHERE
+          user = :user_id
+        AND
+          contact = :contact_id
+    """,
+    params={"user_id": Integer, "contact_id": Integer},
+)
+
+
 async def delete_contact_user(
     contact_email: str, user_id: int, session: AsyncSession
 ):
@@ -89,18 +125,8 @@ async def delete_contact_user(
             "status_code": 400,
             "message": "You can't delete yourself!",
         }
-    query = """
-        SELECT
-          *
-        FROM
-          contacts
-        WHERE
-          user = :user_id
-        AND
-          contact = :contact_id
-    """
     values = {"user_id": user_id, "contact_id": contact.id}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_CONTACT, values)
     contacts = result.fetchall()
     if not contacts:
         return {
@@ -108,17 +134,8 @@ async def delete_contact_user(
             "message": "There is no contact to delete!",
         }
     else:
-        query = """
-            DELETE
-            FROM
-              contacts
-            WHERE
-              user = :user_id
-            AND
-              contact = :contact_id
-        """
         values = {"user_id": user_id, "contact_id": contact.id}
-        await session.execute(text(query), values)
+        await session.execute(DELETE_CONTACT, values)
 
         results = {
             "status_code": 200,
@@ -128,9 +145,9 @@ async def delete_contact_user(
     return results
 
 
-async def get_contacts(session: AsyncSession):
-    # get all contacts for each user.
-    query = """
+GET_CONTACTS = statement(
+    "contacts.get_contacts",
+    """
         SELECT
           *
         FROM
@@ -141,9 +158,14 @@ async def get_contacts(session: AsyncSession):
           contacts.user= users.id
         GROUP BY
           contacts.id
-    """
+    """,
+)
+
+
+async def get_contacts(session: AsyncSession):
+    # get all contacts for each user.
     values = {}
-    result = await session.execute(text(query), values)
+    result = await session.execute(GET_CONTACTS, values)
     contacts = result.fetchall()
     results = {
         "status_code": 200,
@@ -152,86 +174,92 @@ async def get_contacts(session: AsyncSession):
     return results
 
 
+FIND_EXISTED_USER_CONTACT = statement(
+    "contacts.find_existed_user_contact",
+    "SELECT * FROM contacts WHERE user=:user_id",
+    params={"user_id": Integer},
+)
+
+
 async def find_existed_user_contact(user_id: int, session: AsyncSession):
-    query = "SELECT * FROM contacts WHERE user=:user_id"
     values = {"user_id": user_id}
-    result = await session.execute(text(query), values)
+    result = await session.execute(FIND_EXISTED_USER_CONTACT, values)
     return result.fetchone()
 
 
+GET_USER_CONTACTS = statement(
+    "contacts.get_user_contacts",
+    """
+        SELECT
+          *
+        FROM
+          contacts
+        LEFT JOIN
+          users
+        ON
+          contacts.contact= users.id
+        WHERE
+          contacts.user= :user_id
+    """,
+    params={"user_id": Integer},
+)
+
+
 async def get_user_contacts(user_id: int, session: AsyncSession):
     user = await find_existed_user_contact(user_id, session)
     if user:
         # get all contacts for each user.
-        query = """
-            SELECT
-              *
-            FROM
-              contacts
-            LEFT JOIN
-              users
-            ON
-              contacts.contact= users.id
-            WHERE
-              contacts.user= :user_id
-        """
         values = {"user_id": user_id}
 
-        result = await session.execute(text(query), values)
+        result = await session.execute(GET_USER_CONTACTS, values)
         contacts = result.fetchall()
         results = {"status_code": 200, "result": contacts}
         return results
     return {"status_code": 200, "result": []}
 
 
+SEARCH_USER_CONTACTS = statement(
+    "contacts.search_user_contacts",
+    """
+        SELECT
+          *
+        FROM
+          contacts
+        LEFT JOIN
+          users
+        ON
+          contacts.contact= users.id
+        WHERE
+          contacts.user= :user_id
+        AND
+          MATCH (
+            first_name,
+            last_name,
+            email
+          )
+          AGAINST (
+            :search
+          )
+    """,
+    params={"user_id": Integer, "search": String},
+)
+
+
 async def search_user_contacts(
     search: str, user_id: int, session: AsyncSession
 ):
     user = await find_existed_user_contact(user_id, session)
     if not search or len(search) == 0:
-        query = """
-            SELECT
-              *
-            FROM
-              contacts
-            LEFT JOIN
-              users
-            ON
-              contacts.contact= users.id
-            WHERE
-              contacts.user= :user_id
-        """
         values = {"user_id": user_id}
-        result = await session.execute(text(query), values)
+        result = await session.execute(GET_USER_CONTACTS, values)
         return_results = result.fetchall()
         results = {"status_code": 200, "result": return_results}
         return results
 
     elif user and search:
         # TODO: CONCAT(*, :search, *)
-        query = """
-            SELECT
-              *
-            FROM
-              contacts
-            LEFT JOIN
-              users
-            ON
-              contacts.contact= users.id
-            WHERE
-              contacts.user= :user_id
-            AND
-              MATCH (
-                first_name,
-                last_name,
-                email
-              )
-              AGAINST (
-                :search
-              )
-        """
         values = {"user_id": user_id, "search": search}
-        result = await session.execute(text(query), values)
+        result = await session.execute(SEARCH_USER_CONTACTS, values)
         return_results = result.fetchall()
         results = {"status_code": 200, "result": return_results}
         return results
@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
 )
 
 from app.utils.mixins import (
@@ -11,10 +12,14 @@ from app.utils.mixins import (
 
 
 class Contacts(Base, CommonMixin, TimestampMixin):
-    __table_args__ = {
-        "mysql_engine": "InnoDB",
-        "prefixes": ["ROWSTORE", "REFERENCE"],
-    }
+    __table_args__ = (
+        # the contacts of a user, and (user, contact) lookups.
+        Index("ix_contacts_user_contact", "user", "contact"),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
+    )
 
-    user: int = Column(ForeignKey("users.id"), index=True)
+    user: int = Column(ForeignKey("users.id"))
     contact: int = Column(ForeignKey("users.id"), index=True)
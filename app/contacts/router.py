@@ -27,6 +27,7 @@ from app.users.schemas import (
 )
 from app.utils.dependencies import (
     get_db_autocommit_session,
+    get_db_read_session,
 )
 from app.utils.jwt_util import (
     get_current_active_user,
@@ -81,7 +82,7 @@ async def add_contact(
 )
 async def get_contacts_user(
     currentUser: UserObjectSchema = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     Get all contacts for an authenticated user.
@@ -104,7 +105,7 @@ async def get_contacts_user(
 async def search_contacts_user(
     search: str,
     currentUser: UserObjectSchema = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     Search for a contact given an authenticated user.
@@ -6,8 +6,14 @@ from pydantic import (
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
-from sqlalchemy.sql import (
-    text,
+from sqlalchemy.types import (
+    DateTime,
+    Integer,
+    String,
+    Text,
+)
+from typing import (
+    Optional,
 )
 
 from app.auth.crud import (
@@ -19,29 +25,64 @@ from app.chats import (
 from app.chats.schemas import (
     MessageCreateRoom,
 )
+from app.utils.cache import (
+    invalidate_room,
+    invalidate_room_member,
+    room_members_cache,
+    rooms_cache,
+)
+from app.utils.message_archive import (
+    read_full_history,
+    read_history,
+)
+from app.utils.pagination import (
+    decode_cursor,
+    encode_cursor,
+)
+from app.utils.replica import (
+    from_replica,
+)
+from app.utils.statements import (
+    archive_statement,
+    like_prefix,
+    statement,
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def find_existed_room(room_name: str, session: AsyncSession):
-    query = """
+FIND_EXISTED_ROOM = statement(
+    "rooms.find_existed_room",
+    """
         SELECT
           *
         FROM
           rooms
         WHERE
           room_name = :room_name
-    """
+    """,
+    params={"room_name": String},
+)
+
+
+async def find_existed_room(room_name: str, session: AsyncSession):
+    room = rooms_cache.get(room_name.lower())
+    if room is not None:
+        return room
+    epoch = rooms_cache.epoch
     values = {"room_name": room_name}
 
-    result = await session.execute(text(query), values)
-    return result.fetchone()
+    result = await session.execute(FIND_EXISTED_ROOM, values)
+    room = result.fetchone()
+    # a replica may not have the last bans and changes yet.
+    if not from_replica(session):
+        rooms_cache.set(room_name.lower(), room, epoch)
+    return room
 
 
-async def find_existed_user_in_room(
-    user_id: int, room_id: int, session: AsyncSession
-):
-    query = """
+FIND_EXISTED_USER_IN_ROOM = statement(
+    "rooms.find_existed_user_in_room",
+    """
         SELECT
           *
         FROM
@@ -50,36 +91,40 @@ async def find_existed_user_in_room(
           room = :room_id
         AND
           member = :user_id
-    """
+    """,
+    params={"room_id": Integer, "user_id": Integer},
+)
+
+
+async def find_existed_user_in_room(
+    user_id: int, room_id: int, session: AsyncSession
+):
+    member = room_members_cache.get((room_id, user_id))
+    if member is not None:
+        return member
+    epoch = room_members_cache.epoch
     values = {"room_id": room_id, "user_id": user_id}
 
-    result = await session.execute(text(query), values)
-    return result.fetchone()
+    result = await session.execute(FIND_EXISTED_USER_IN_ROOM, values)
+    member = result.fetchone()
+    if not from_replica(session):
+        room_members_cache.set((room_id, user_id), member, epoch)
+    return member
 
 
 async def find_admin_in_room(
     user_id: int, room_id: int, session: AsyncSession
 ):
-    query = """
-        SELECT
-          *
-        FROM
-          room_members
-        WHERE
-          room = :room_id
-        AND
-          member = :user_id
-        AND
-          admin = 1
-    """
-    values = {"room_id": room_id, "user_id": user_id}
+    # the admin flag is read from the (cached) membership.
+    member = await find_existed_user_in_room(user_id, room_id, session)
+    if member and member.admin == 1:
+        return member
+    return None
 
-    result = await session.execute(text(query), values)
-    return result.fetchone()
 
-
-async def create_room(room_name: int, description: str, session: AsyncSession):
-    query = """
+CREATE_ROOM = statement(
+    "rooms.create_room",
+    """
         INSERT INTO rooms (
           room_name,
           description,
@@ -90,64 +135,90 @@ async def create_room(room_name: int, description: str, session: AsyncSession):
           :description,
           :creation_date
         )
-    """
+    """,
+    params={
+        "room_name": String,
+        "description": String,
+        "creation_date": DateTime,
+    },
+)
+
+
+async def create_room(room_name: int, description: str, session: AsyncSession):
     values = {
         "room_name": room_name,
         "description": description,
         "creation_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    return await session.execute(CREATE_ROOM, values)
+
+
+JOIN_ROOM_AS_ADMIN = statement(
+    "rooms.join_room_as_admin",
+    """
+        INSERT INTO room_members (
+          room,
+          member,
+          banned,
+          admin,
+          creation_date
+        )
+        VALUES (
+          :room,
+          :member,
+          0,
+          1,
+          :creation_date
+        )
+    """,
+    params={"room": Integer, "member": Integer, "creation_date": DateTime},
+)
+
+
+JOIN_ROOM_AS_MEMBER = statement(
+    "rooms.join_room_as_member",
+    """
+        INSERT INTO room_members (
+          room,
+          member,
+          banned,
+          admin,
+          creation_date
+        )
+        VALUES (
+          :room,
+          :member,
+          0,
+          0,
+          :creation_date
+        )
+    """,
+    params={"room": Integer, "member": Integer, "creation_date": DateTime},
+)
 
 
 async def join_room(
     user_id: int, room_id: int, session: AsyncSession, is_admin=False
 ):
     if is_admin:
-        query = """
-            INSERT INTO room_members (
-              room,
-              member,
-              banned,
-              admin,
-              creation_date
-            )
-            VALUES (
-              :room,
-              :member,
-              0,
-              1,
-              :creation_date
-            )
-        """
+        query = JOIN_ROOM_AS_ADMIN
     else:
-        query = """
-            INSERT INTO room_members (
-              room,
-              member,
-              banned,
-              admin,
-              creation_date
-            )
-            VALUES (
-              :room,
-              :member,
-              0,
-              0,
-              :creation_date
-            )
-        """
+        query = JOIN_ROOM_AS_MEMBER
     values = {
         "room": room_id,
         "member": user_id,
         "creation_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(query, values)
+    invalidate_room_member(room_id, user_id, session)
+    return result
 
 
-async def delete_room_user(user_id: int, room_id: int, session: AsyncSession):
-    query = """
+DELETE_ROOM_USER = statement(
+    "rooms.delete_room_user",
+    """
         DELETE
         FROM
           room_members
@@ -155,14 +226,22 @@ async def delete_room_user(user_id: int, room_id: int, session: AsyncSession):
           room = :room
         AND
           member = :member
-    """
+    """,
+    params={"room": Integer, "member": Integer},
+)
+
+
+async def delete_room_user(user_id: int, room_id: int, session: AsyncSession):
     values = {"room": room_id, "member": user_id}
 
-    return await session.execute(text(query), values)
+    result = await session.execute(DELETE_ROOM_USER, values)
+    invalidate_room_member(room_id, user_id, session)
+    return result
 
 
-async def ban_room_user(user_id: int, room_id: int, session: AsyncSession):
-    query = """
+BAN_ROOM_USER = statement(
+    "rooms.ban_room_user",
+    """
         UPDATE
           room_members
         SET
@@ -172,18 +251,26 @@ async def ban_room_user(user_id: int, room_id: int, session: AsyncSession):
           room = :room
         AND
           member = :member
-    """
+    """,
+    params={"modified_date": DateTime, "room": Integer, "member": Integer},
+)
+
+
+async def ban_room_user(user_id: int, room_id: int, session: AsyncSession):
     values = {
         "room": room_id,
         "member": user_id,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(BAN_ROOM_USER, values)
+    invalidate_room_member(room_id, user_id, session)
+    return result
 
 
-async def unban_room_user(user_id: int, room_id: int, session: AsyncSession):
-    query = """
+UNBAN_ROOM_USER = statement(
+    "rooms.unban_room_user",
+    """
         UPDATE
           room_members
         SET
@@ -193,20 +280,26 @@ async def unban_room_user(user_id: int, room_id: int, session: AsyncSession):
           room = :room
         AND
           member = :member
-    """
+    """,
+    params={"modified_date": DateTime, "room": Integer, "member": Integer},
+)
+
+
+async def unban_room_user(user_id: int, room_id: int, session: AsyncSession):
     values = {
         "room": room_id,
         "member": user_id,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(UNBAN_ROOM_USER, values)
+    invalidate_room_member(room_id, user_id, session)
+    return result
 
 
-async def update_room_invite_link(
-    room_name: str, invite_link: str, session: AsyncSession
-):
-    query = """
+UPDATE_ROOM_INVITE_LINK = statement(
+    "rooms.update_room_invite_link",
+    """
         UPDATE
           rooms
         SET
@@ -215,7 +308,19 @@ async def update_room_invite_link(
           link_expire_date = :link_expire_date
         WHERE
           room_name = :room_name
-    """
+    """,
+    params={
+        "invite_link": String,
+        "modified_date": DateTime,
+        "link_expire_date": DateTime,
+        "room_name": String,
+    },
+)
+
+
+async def update_room_invite_link(
+    room_name: str, invite_link: str, session: AsyncSession
+):
     values = {
         "invite_link": invite_link,
         "modified_date": datetime.datetime.utcnow(),
@@ -224,7 +329,9 @@ async def update_room_invite_link(
         "room_name": room_name,
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(UPDATE_ROOM_INVITE_LINK, values)
+    invalidate_room(room_name, session)
+    return result
 
 
 async def create_assign_new_room(
@@ -303,6 +410,105 @@ async def create_assign_new_room(
         return results
 
 
+GET_ROOM_CONVERSATIONS_AS_ADMIN = statement(
+    "rooms.get_room_conversations_as_admin",
+    """
+        SELECT
+            messages.id as msg_id,
+            messages.content,
+            CASE
+                WHEN messages.sender = :sender_id THEN "sent"
+                ELSE "received"
+            END as type,
+            messages.media,
+            messages.creation_date,
+            users.id as id,
+            users.first_name,
+            users.last_name,
+            users.bio,
+            users.chat_status,
+            users.email,
+            users.phone_number,
+            users.profile_picture,
+            room_members.admin
+        FROM
+            messages
+        LEFT JOIN
+            users
+        ON
+          messages.sender = users.id
+        LEFT JOIN
+            room_members
+        ON
+          room_members.room = messages.room
+        AND
+          room_members.member = messages.sender
+        WHERE
+          messages.room = :room_id
+        ORDER BY
+          messages.id
+    """,
+    params={"sender_id": Integer, "room_id": Integer},
+    columns={
+        "msg_id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+        "id": Integer,
+    },
+)
+GET_ROOM_CONVERSATIONS_AS_ADMIN_ARCHIVE = archive_statement(
+    "rooms.get_room_conversations_as_admin"
+)
+
+
+GET_ROOM_CONVERSATIONS = statement(
+    "rooms.get_room_conversations",
+    """
+        SELECT
+            messages.id as msg_id,
+            messages.content,
+            CASE
+                WHEN messages.sender = :sender_id THEN "sent"
+                ELSE "received"
+            END as type,
+            messages.media,
+            messages.creation_date,
+            users.id as id,
+            users.first_name,
+            users.last_name,
+            users.bio,
+            users.chat_status,
+            users.email,
+            users.phone_number,
+            users.profile_picture
+        FROM
+            messages
+        LEFT JOIN
+            users
+        ON
+          messages.sender = users.id
+        WHERE
+          messages.room = :room_id
+        ORDER BY
+          messages.id
+    """,
+    params={"sender_id": Integer, "room_id": Integer},
+    columns={
+        "msg_id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+        "id": Integer,
+    },
+)
+GET_ROOM_CONVERSATIONS_ARCHIVE = archive_statement(
+    "rooms.get_room_conversations"
+)
+
+
 async def get_room_conversations(
     room_name: str, sender_id: int, session: AsyncSession
 ):
@@ -315,75 +521,15 @@ async def get_room_conversations(
     # test if sender_id is admin
     admin = await find_admin_in_room(sender_id, room.id, session)
     if admin:
-        query = """
-            SELECT
-                messages.id as msg_id,
-                messages.content,
-                CASE
-                    WHEN messages.sender = :sender_id THEN "sent"
-                    ELSE "received"
-                END as type,
-                messages.media,
-                messages.creation_date,
-                users.id as id,
-                users.first_name,
-                users.last_name,
-                users.bio,
-                users.chat_status,
-                users.email,
-                users.phone_number,
-                users.profile_picture,
-                room_members.admin
-            FROM
-                messages
-            LEFT JOIN
-                users
-            ON
-              messages.sender = users.id
-            LEFT JOIN
-                room_members
-            ON
-              messages.room = room_members.room
-            WHERE
-              messages.room = :room_id
-            GROUP BY
-              messages.id
-            ORDER BY
-              messages.creation_date
-        """
+        query = GET_ROOM_CONVERSATIONS_AS_ADMIN
+        archive_query = GET_ROOM_CONVERSATIONS_AS_ADMIN_ARCHIVE
     else:
-        query = """
-            SELECT
-                messages.id as msg_id,
-                messages.content,
-                CASE
-                    WHEN messages.sender = :sender_id THEN "sent"
-                    ELSE "received"
-                END as type,
-                messages.media,
-                messages.creation_date,
-                users.id as id,
-                users.first_name,
-                users.last_name,
-                users.bio,
-                users.chat_status,
-                users.email,
-                users.phone_number,
-                users.profile_picture
-            FROM
-                messages
-            LEFT JOIN
-                users
-            ON
-              messages.sender = users.id
-            WHERE
-              messages.room = :room_id
-            ORDER BY
-              messages.creation_date
-        """
+        query = GET_ROOM_CONVERSATIONS
+        archive_query = GET_ROOM_CONVERSATIONS_ARCHIVE
     values = {"room_id": room.id, "sender_id": sender_id}
-    result = await session.execute(text(query), values)
-    messages_sent_received = result.fetchall()
+    messages_sent_received = await read_full_history(
+        query, archive_query, values, session, key="msg_id"
+    )
     results = {
         "status_code": 200,
         "result": messages_sent_received,
@@ -391,6 +537,207 @@ async def get_room_conversations(
     return results
 
 
+GET_ROOM_CONVERSATIONS_AFTER = statement(
+    "rooms.get_room_conversations_after",
+    """
+        SELECT
+            messages.id as msg_id,
+            messages.content,
+            CASE
+                WHEN messages.sender = :sender_id THEN "sent"
+                ELSE "received"
+            END as type,
+            messages.media,
+            messages.creation_date,
+            users.id as id,
+            users.first_name,
+            users.last_name,
+            users.bio,
+            users.chat_status,
+            users.email,
+            users.phone_number,
+            users.profile_picture,
+            room_members.admin
+        FROM
+            messages
+        LEFT JOIN
+            users
+        ON
+          messages.sender = users.id
+        LEFT JOIN
+            room_members
+        ON
+          room_members.room = messages.room
+        AND
+          room_members.member = messages.sender
+        WHERE
+          messages.room = :room_id
+        AND
+          messages.id > :cursor_id
+        ORDER BY
+          messages.id
+        LIMIT :limit
+    """,
+    params={
+        "sender_id": Integer,
+        "room_id": Integer,
+        "cursor_id": Integer,
+        "limit": Integer,
+    },
+    columns={
+        "msg_id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+        "id": Integer,
+    },
+)
+GET_ROOM_CONVERSATIONS_AFTER_ARCHIVE = archive_statement(
+    "rooms.get_room_conversations_after"
+)
+
+
+GET_ROOM_CONVERSATIONS_BEFORE = statement(
+    "rooms.get_room_conversations_before",
+    """
+        SELECT
+            messages.id as msg_id,
+            messages.content,
+            CASE
+                WHEN messages.sender = :sender_id THEN "sent"
+                ELSE "received"
+            END as type,
+            messages.media,
+            messages.creation_date,
+            users.id as id,
+            users.first_name,
+            users.last_name,
+            users.bio,
+            users.chat_status,
+            users.email,
+            users.phone_number,
+            users.profile_picture,
+            room_members.admin
+        FROM
+            messages
+        LEFT JOIN
+            users
+        ON
+          messages.sender = users.id
+        LEFT JOIN
+            room_members
+        ON
+          room_members.room = messages.room
+        AND
+          room_members.member = messages.sender
+        WHERE
+          messages.room = :room_id
+        AND
+          messages.id < :cursor_id
+        ORDER BY
+          messages.id DESC
+        LIMIT :limit
+    """,
+    params={
+        "sender_id": Integer,
+        "room_id": Integer,
+        "cursor_id": Integer,
+        "limit": Integer,
+    },
+    columns={
+        "msg_id": Integer,
+        "content": Text,
+        "type": String,
+        "media": String,
+        "creation_date": DateTime,
+        "id": Integer,
+    },
+)
+GET_ROOM_CONVERSATIONS_BEFORE_ARCHIVE = archive_statement(
+    "rooms.get_room_conversations_before"
+)
+
+
+async def get_room_conversations_page(  # pylint: disable=R0913
+    room_name: str,
+    sender_id: int,
+    before: Optional[str],
+    after: Optional[str],
+    limit: int,
+    session: AsyncSession,
+):
+    """
+    A method to fetch one page of messages of a room.
+
+    Pages are selected with a keyset on (room, id), and the admin flag of
+    each sender is attached through a direct (room, member) lookup, so the
+    cost of a page depends neither on the history length nor on the number
+    of members. Without a cursor the latest page is returned. Messages are
+    returned in chronological order, each with the admin flag of its sender.
+
+    Args:
+        room_name (str) : A room name.
+        sender_id (int) : The id of the user fetching the messages.
+        before (str) : An opaque cursor to fetch the messages older than it.
+        after (str) : An opaque cursor to fetch the messages newer than it.
+        limit (int) : The maximum number of messages in the page.
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Result: Database result.
+    """
+    if before and after:
+        return {
+            "status_code": 400,
+            "message": "You can't paginate in both directions!",
+        }
+    cursor = before or after
+    cursor_id = decode_cursor(cursor) if cursor else None
+    if cursor and cursor_id is None:
+        return {
+            "status_code": 400,
+            "message": "Invalid cursor!",
+        }
+    room = await find_existed_room(room_name, session)
+    if not room:
+        return {
+            "status_code": 400,
+            "message": "Room not found!",
+        }
+    # the admin flag of each sender is a direct (room, member) lookup.
+    if after:
+        query = GET_ROOM_CONVERSATIONS_AFTER
+        archive_query = GET_ROOM_CONVERSATIONS_AFTER_ARCHIVE
+    else:
+        query = GET_ROOM_CONVERSATIONS_BEFORE
+        archive_query = GET_ROOM_CONVERSATIONS_BEFORE_ARCHIVE
+    values = {
+        "room_id": room.id,
+        "sender_id": sender_id,
+        "cursor_id": cursor_id
+        if cursor_id is not None
+        else chats_crud.MAX_MESSAGE_ID,
+        # fetch one extra message to know whether there is a next page.
+        "limit": limit + 1,
+    }
+    # the old messages are read from the archive.
+    messages = await read_history(
+        query, archive_query, values, bool(after), session, key="msg_id"
+    )
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].msg_id)
+    if not after:
+        messages.reverse()
+    return {
+        "status_code": 200,
+        "result": messages,
+        "next_cursor": next_cursor,
+    }
+
+
 async def send_new_room_message(
     sender_id: int,
     request: MessageCreateRoom,
@@ -500,46 +847,58 @@ async def delete_room_user_chat(
     return results
 
 
+GET_ROOMS_USER = statement(
+    "rooms.get_rooms_user",
+    """
+        SELECT
+          *
+        FROM
+          room_members
+        LEFT JOIN
+          rooms
+        ON
+          room_members.room= rooms.id
+        WHERE
+          room_members.member= :user_id
+        AND
+          room_members.banned= 0
+    """,
+    params={"user_id": Integer},
+)
+
+
+SEARCH_ROOMS = statement(
+    "rooms.search_rooms",
+    """
+        SELECT
+          *
+        FROM
+          room_members
+        LEFT JOIN
+          rooms
+        ON
+          room_members.room= rooms.id
+        WHERE
+          room_members.member= :user_id
+        AND
+          rooms.room_name LIKE :prefix
+        AND
+          room_members.banned= 0
+    """,
+    params={"user_id": Integer, "prefix": String},
+)
+
+
 async def search_rooms(search: str, user_id: int, session: AsyncSession):
     if not search:
-        query = """
-            SELECT
-              *
-            FROM
-              room_members
-            LEFT JOIN
-              rooms
-            ON
-              room_members.room= rooms.id
-            WHERE
-              room_members.member= :user_id
-            AND
-              room_members.banned= 0
-        """
         values = {"user_id": user_id}
-        result = await session.execute(text(query), values)
+        result = await session.execute(GET_ROOMS_USER, values)
         return_results = result.fetchall()
         results = {"status_code": 200, "result": return_results}
         return results
     elif user_id and search:
-        query = """
-            SELECT
-              *
-            FROM
-              room_members
-            LEFT JOIN
-              rooms
-            ON
-              room_members.room= rooms.id
-            WHERE
-              room_members.member= :user_id
-            AND
-              INSTR(room_name, :search) > 0
-            AND
-              room_members.banned= 0
-        """
-        values = {"user_id": user_id, "search": search.lower()}
-        result = await session.execute(text(query), values)
+        values = {"user_id": user_id, "prefix": like_prefix(search.lower())}
+        result = await session.execute(SEARCH_ROOMS, values)
         return_results = result.fetchall()
         results = {"status_code": 200, "result": return_results}
         return results
@@ -549,23 +908,9 @@ async def search_rooms(search: str, user_id: int, session: AsyncSession):
 
 async def get_rooms_user(user_id: int, session: AsyncSession):
     # get all rooms for this user.
-    query = """
-        SELECT
-          *
-        FROM
-          room_members
-        LEFT JOIN
-          rooms
-        ON
-          room_members.room= rooms.id
-        WHERE
-          room_members.member= :user_id
-        AND
-          room_members.banned= 0
-    """
     values = {"user_id": user_id}
 
-    result = await session.execute(text(query), values)
+    result = await session.execute(GET_ROOMS_USER, values)
     contacts = result.fetchall()
     results = {"status_code": 200, "result": contacts}
     return results
@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
@@ -43,12 +44,18 @@ class Rooms(Base, CommonMixin, TimestampMixin):
 
 
 class RoomMembers(Base, CommonMixin, TimestampMixin):
-    __table_args__ = {
-        "mysql_engine": "InnoDB",
-        "prefixes": ["ROWSTORE", "REFERENCE"],
-    }
+    __table_args__ = (
+        # direct (room, member) lookups of memberships and admin flags.
+        Index("ix_room_members_room_member", "room", "member", "admin"),
+        # the rooms of a member.
+        Index("ix_room_members_member_banned", "member", "banned"),
+        {
+            "mysql_engine": "InnoDB",
+            "prefixes": ["ROWSTORE", "REFERENCE"],
+        },
+    )
 
-    room: int = Column(ForeignKey("rooms.id"), index=True)
-    member: int = Column(ForeignKey("users.id"), index=True)
-    banned: Optional[UserStatus] = Column(Integer, index=True)
-    admin: Optional[UserRole] = Column(Integer, index=True)
+    room: int = Column(ForeignKey("rooms.id"))
+    member: int = Column(ForeignKey("users.id"))
+    banned: Optional[UserStatus] = Column(Integer)
+    admin: Optional[UserRole] = Column(Integer)
@@ -1,12 +1,15 @@
-from deta import Deta
 from fastapi import (
     APIRouter,
     Depends,
-    responses,
+    Query,
+    Request,
 )
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
+from typing import (
+    Optional,
+)
 
 from app.auth.schemas import (
     ResponseSchema,
@@ -14,15 +17,13 @@ from app.auth.schemas import (
 from app.chats.schemas import (
     MessageCreateRoom,
 )
-from app.config import (
-    settings,
-)
 from app.rooms.crud import (
     ban_user_from_room,
     create_assign_new_room,
     create_invite_link,
     delete_room_user_chat,
     get_room_conversations,
+    get_room_conversations_page,
     get_rooms_user,
     invite_user_to_room,
     leave_room_user,
@@ -39,17 +40,34 @@ from app.rooms.schemas import (
 from app.users.schemas import (
     UserObjectSchema,
 )
+from app.utils.constants import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
 from app.utils.dependencies import (
     get_db_autocommit_session,
-    get_db_transactional_session,
+    get_db_read_session,
 )
 from app.utils.jwt_util import (
     get_current_active_user,
 )
+from app.utils.media_response import (
+    IMMUTABLE_CACHE_CONTROL,
+    media_response,
+)
+from app.utils.media_upload import (
+    media_etag,
+    media_storage_name,
+)
+from app.utils.storage import (
+    SENT_IMAGES_BUCKET,
+    get_storage,
+)
+from app.utils.thumbnails import (
+    ImageVariant,
+)
 
-deta = Deta(settings.DETA_PROJECT_KEY)
-
-sent_images = deta.Drive("sent-images")
+sent_images = get_storage(SENT_IMAGES_BUCKET)
 
 router = APIRouter(prefix="/api/v1")
 
@@ -87,13 +105,26 @@ async def create_room(
 @router.get("/room/conversation", name="room:get-conversations")
 async def get_room_users_conversation(
     room: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     currentUser: UserObjectSchema = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_db_transactional_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
-    Get Room by room name
+    Get Room by room name, paginated when a cursor or a limit is given.
     """
-    results = await get_room_conversations(room, currentUser.id, session)
+    if before or after or limit:
+        results = await get_room_conversations_page(
+            room,
+            currentUser.id,
+            before,
+            after,
+            limit or DEFAULT_PAGE_SIZE,
+            session,
+        )
+    else:
+        results = await get_room_conversations(room, currentUser.id, session)
     return results
 
 
@@ -176,7 +207,7 @@ async def delete_room_chat(
 async def search_for_room(
     search: str,
     currentUser: UserObjectSchema = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     Search for a room given an authenticated user.
@@ -188,7 +219,7 @@ async def search_for_room(
 @router.get("/rooms", status_code=200, name="rooms:get-rooms-for-user")
 async def get_rooms_for_user(
     currentUser: UserObjectSchema = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_db_autocommit_session),
+    session: AsyncSession = Depends(get_db_read_session),
 ):
     """
     Fetch all the joined room for an authenticated user.
@@ -198,11 +229,21 @@ async def get_rooms_for_user(
 
 
 @router.get("/chat/images/room/{room_id}/{uuid_val}")
-async def get_sent_room_chat_images(room_id: int, uuid_val: str):
+async def get_sent_room_chat_images(
+    request: Request,
+    room_id: int,
+    uuid_val: str,
+    size: Optional[ImageVariant] = None,
+):
     try:
-        img = sent_images.get(f"/chat/images/room/{room_id}/{uuid_val}")
-        return responses.StreamingResponse(
-            img.iter_chunks(), media_type="image/png"
+        url = f"/chat/images/room/{room_id}/{uuid_val}"
+        return await media_response(
+            request,
+            sent_images,
+            media_storage_name(url),
+            IMMUTABLE_CACHE_CONTROL,
+            etag=media_etag(url),
+            variant=size,
         )
     except Exception:
         return {"status_code": 400, "message": "Something went wrong!"}
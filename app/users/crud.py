@@ -2,12 +2,14 @@ import datetime
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
-from sqlalchemy.sql import (
-    text,
+from sqlalchemy.types import (
+    DateTime,
+    String,
+    Text,
 )
 
 from app.auth.crud import (
-    find_existed_user,
+    find_user_password,
 )
 from app.users.models import (
     Users,
@@ -15,14 +17,24 @@ from app.users.models import (
 from app.users.schemas import (
     ResetPassword,
 )
+from app.utils.cache import (
+    invalidate_user,
+)
 from app.utils.crypt_util import (
-    get_password_hash,
-    verify_password,
+    BUSY_RESPONSE,
+    PasswordHasherBusy,
+    password_hasher,
+)
+from app.utils.revocation import (
+    revoke_token,
+)
+from app.utils.statements import (
+    statement,
 )
 
-
-async def deactivate_user(currentUser: Users, session: AsyncSession):
-    query = """
+DEACTIVATE_USER = statement(
+    "users.deactivate_user",
+    """
         UPDATE
           users
         SET
@@ -31,17 +43,25 @@ async def deactivate_user(currentUser: Users, session: AsyncSession):
         WHERE
           user_status = 1
           AND email = :email
-    """
+    """,
+    params={"modified_date": DateTime, "email": String},
+)
+
+
+async def deactivate_user(currentUser: Users, session: AsyncSession):
     values = {
         "email": currentUser.email,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(DEACTIVATE_USER, values)
+    invalidate_user(values["email"], session)
+    return result
 
 
-async def set_black_list(token: str, session: AsyncSession):
-    query = """
+SET_BLACK_LIST = statement(
+    "users.set_black_list",
+    """
         UPDATE
           access_tokens
         SET
@@ -50,17 +70,25 @@ async def set_black_list(token: str, session: AsyncSession):
         WHERE
           token_status = 1
           AND token = :token
-    """
+    """,
+    params={"modified_date": DateTime, "token": String},
+)
+
+
+async def set_black_list(token: str, session: AsyncSession):
     values = {
         "token": token,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(SET_BLACK_LIST, values)
+    revoke_token(token)
+    return result
 
 
-async def update_user_info(currentUser: Users, session: AsyncSession):
-    query = """
+UPDATE_USER_INFO = statement(
+    "users.update_user_info",
+    """
         UPDATE
           users
         SET
@@ -72,7 +100,19 @@ async def update_user_info(currentUser: Users, session: AsyncSession):
         WHERE
           user_status = 1
           AND email = :email
-    """
+    """,
+    params={
+        "first_name": String,
+        "last_name": String,
+        "bio": Text,
+        "phone_number": String,
+        "modified_date": DateTime,
+        "email": String,
+    },
+)
+
+
+async def update_user_info(currentUser: Users, session: AsyncSession):
     values = {
         "first_name": currentUser.first_name,
         "last_name": currentUser.last_name,
@@ -82,13 +122,14 @@ async def update_user_info(currentUser: Users, session: AsyncSession):
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(UPDATE_USER_INFO, values)
+    invalidate_user(values["email"], session)
+    return result
 
 
-async def update_chat_status(
-    chat_status: str, currentUser: Users, session: AsyncSession
-):
-    query = """
+UPDATE_CHAT_STATUS = statement(
+    "users.update_chat_status",
+    """
         UPDATE
           users
         SET
@@ -97,26 +138,58 @@ async def update_chat_status(
         WHERE
           user_status = 1
           AND email = :email
-    """
+    """,
+    params={"chat_status": String, "modified_date": DateTime, "email": String},
+)
+
+
+async def update_chat_status(
+    chat_status: str, currentUser: Users, session: AsyncSession
+):
     values = {
         "chat_status": chat_status,
         "email": currentUser.email,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(UPDATE_CHAT_STATUS, values)
+    invalidate_user(values["email"], session)
+    return result
+
+
+UPDATE_USER_PASSWORD = statement(
+    "users.update_user_password",
+    """
+        UPDATE
+          users
+        SET
+          password = :password,
+          modified_date = :modified_date
+        WHERE
+          user_status = 1
+          AND email = :email
+    """,
+    params={"password": String, "modified_date": DateTime, "email": String},
+)
 
 
 async def update_user_password(
     request: ResetPassword, currentUser: Users, session: AsyncSession
 ):
-    user = await find_existed_user(currentUser.email, session)
-    if not verify_password(request.old_password, user.password):
+    password = await find_user_password(currentUser.email, session)
+    if password is None:
+        return {"status_code": 400, "message": "User not found!"}
+    try:
+        is_valid = await password_hasher.verify(request.old_password, password)
+    except PasswordHasherBusy:
+        return dict(BUSY_RESPONSE)
+    if not is_valid:
         results = {
             "status_code": 400,
             "message": "Your old password is not correct!",
         }
-    elif verify_password(request.new_password, user.password):
+    # the old password matches, so the new one matches only if it is equal.
+    elif request.new_password == request.old_password:
         results = {
             "status_code": 400,
             "message": "Your new password can't be your old one!",
@@ -127,34 +200,27 @@ async def update_user_password(
             "message": "Please confirm your new password!",
         }
     else:
-        query = """
-            UPDATE
-              users
-            SET
-              password = :password,
-              modified_date = :modified_date
-            WHERE
-              user_status = 1
-              AND email = :email
-        """
+        try:
+            password = await password_hasher.hash(request.new_password)
+        except PasswordHasherBusy:
+            return dict(BUSY_RESPONSE)
         values = {
-            "password": get_password_hash(request.new_password),
+            "password": password,
             "email": currentUser.email,
             "modified_date": datetime.datetime.utcnow(),
         }
-        await session.execute(text(query), values)
+        await session.execute(UPDATE_USER_PASSWORD, values)
+        invalidate_user(currentUser.email, session)
         results = {
             "status_code": 200,
             "message": "Your password has been reseted successfully!",
         }
-        await session.execute(text(query), values)
     return results
 
 
-async def update_profile_picture(
-    email: str, file_name: str, session: AsyncSession
-):
-    query = """
+UPDATE_PROFILE_PICTURE = statement(
+    "users.update_profile_picture",
+    """
         UPDATE
           users
         SET
@@ -163,11 +229,20 @@ async def update_profile_picture(
         WHERE
           user_status = 1
           AND email = :email
-    """
+    """,
+    params={"file_name": String, "modified_date": DateTime, "email": String},
+)
+
+
+async def update_profile_picture(
+    email: str, file_name: str, session: AsyncSession
+):
     values = {
         "file_name": file_name,
         "email": email,
         "modified_date": datetime.datetime.utcnow(),
     }
 
-    return await session.execute(text(query), values)
+    result = await session.execute(UPDATE_PROFILE_PICTURE, values)
+    invalidate_user(values["email"], session)
+    return result
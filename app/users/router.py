@@ -1,10 +1,9 @@
-from deta import Deta
 from fastapi import (
     APIRouter,
     Depends,
     File,
+    Request,
     UploadFile,
-    responses,
 )
 from fastapi.encoders import (
     jsonable_encoder,
@@ -13,6 +12,9 @@ import openai
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
+from typing import (
+    Optional,
+)
 
 from app.auth.schemas import (
     UserSchema,
@@ -39,10 +41,24 @@ from app.utils.dependencies import (
     get_db_autocommit_session,
     get_db_transactional_session,
 )
+from app.utils.media_response import (
+    REVALIDATE_CACHE_CONTROL,
+    media_response,
+)
+from app.utils.media_upload import (
+    MediaTooLarge,
+    read_upload,
+)
+from app.utils.storage import (
+    PROFILE_IMAGES_BUCKET,
+    get_storage,
+)
+from app.utils.thumbnails import (
+    ImageVariant,
+    thumbnail_generator,
+)
 
-deta = Deta(settings.DETA_PROJECT_KEY)
-
-profile_images = deta.Drive("profile-images")
+profile_images = get_storage(PROFILE_IMAGES_BUCKET)
 
 router = APIRouter(prefix="/api/v1")
 
@@ -119,11 +135,16 @@ async def reset_user_password(
 
 
 @router.get("/user/profile-image/{name}")
-async def get_profile_image(name: str):
+async def get_profile_image(
+    request: Request, name: str, size: Optional[ImageVariant] = None
+):
     try:
-        img = profile_images.get(f"user/{name}/profile.png")
-        return responses.StreamingResponse(
-            img.iter_chunks(), media_type="image/png"
+        return await media_response(
+            request,
+            profile_images,
+            f"user/{name}/profile.png",
+            REVALIDATE_CACHE_CONTROL,
+            variant=size,
         )
     except Exception:
         return {"status_code": 400, "message": "Something went wrong!"}
@@ -137,7 +158,26 @@ async def upload_profile_image(
 ):
     try:
         file_name = "user/" + str(currentUser.id) + "/" + "profile.png"
-        profile_images.put(file_name, file.file)
+        try:
+            data = await read_upload(
+                file, settings.MEDIA_MAX_SIZE, settings.MEDIA_DECODE_CHUNK_SIZE
+            )
+        except MediaTooLarge:
+            return {
+                "status_code": 400,
+                "message": "The image is too large!",
+            }
+        old = await profile_images.stat(file_name)
+        # the variants are named after the uploaded content, see
+        # `variant_name`, so a concurrent upload never overwrites them.
+        info = await profile_images.put(file_name, data)
+        thumbnail_generator.submit(profile_images, file_name, data, info.etag)
+        if old is not None:
+            # the variants rendered before they were named after a content.
+            await thumbnail_generator.delete(profile_images, file_name)
+            await thumbnail_generator.delete(
+                profile_images, file_name, old.etag
+            )
         await user_crud.update_profile_picture(
             email=currentUser.email, file_name=file_name, session=session
         )
@@ -151,11 +191,16 @@ async def upload_profile_image(
 
 
 @router.get("/profile/user/{user_id}/profile.png")
-async def get_profile_user_image(user_id: int):
+async def get_profile_user_image(
+    request: Request, user_id: int, size: Optional[ImageVariant] = None
+):
     try:
-        img = profile_images.get(f"user/{user_id}/profile.png")
-        return responses.StreamingResponse(
-            img.iter_chunks(), media_type="image/png"
+        return await media_response(
+            request,
+            profile_images,
+            f"user/{user_id}/profile.png",
+            REVALIDATE_CACHE_CONTROL,
+            variant=size,
         )
     except Exception:
         return {"status_code": 400, "message": "Something went wrong!"}
@@ -0,0 +1,336 @@
+"""In-process lookup cache module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from collections import (
+    OrderedDict,
+)
+from fastapi import (
+    FastAPI,
+)
+import json
+import logging
+from prometheus_client import (
+    Counter,
+)
+from sqlalchemy import (
+    event,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+from sqlalchemy.orm import (
+    Session,
+)
+import time
+from typing import (
+    Any,
+    Hashable,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.pub_sub_broker import (
+    ControlTopic,
+)
+
+logger = logging.getLogger(__name__)
+
+# the Redis channel of the cross-worker invalidation events.
+CACHE_INVALIDATION_TOPIC = "cache-invalidation"
+
+CACHE_HITS = Counter(
+    "cache_hits_total",
+    "Number of lookups served from an in-process cache.",
+    labelnames=("cache",),
+)
+CACHE_MISSES = Counter(
+    "cache_misses_total",
+    "Number of lookups that missed an in-process cache.",
+    labelnames=("cache",),
+)
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total",
+    "Number of invalidation events received from other workers.",
+    labelnames=("cache",),
+)
+
+
+class TTLCache:
+    """
+    A class that keeps the most recently used values of a lookup in memory.
+
+    Entries expire `ttl` seconds after they are set, and the least recently
+    used entry is evicted once the cache holds `maxsize` entries. Writes to
+    the underlying rows must call `invalidate`.
+
+    Every invalidation bumps the `epoch` of the cache. A lookup reads it
+    before querying the database and passes it to `set`, so a row read
+    before a concurrent invalidation is not cached.
+
+    Args:
+        name (str) : The cache name used as a Prometheus label.
+        maxsize (int) : The maximum number of entries.
+        ttl (float) : The number of seconds an entry is trusted.
+        enabled (bool) : Whether values are cached at all.
+    """
+
+    def __init__(
+        self, name: str, maxsize: int, ttl: float, enabled: bool = True
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.epoch = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get the value of a given key.
+
+        Args:
+            key (Hashable) : A lookup key.
+
+        Returns:
+            Optional[Any]: The cached value, or None when missing or expired.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            CACHE_MISSES.labels(self.name).inc()
+            return None
+        self._entries.move_to_end(key)
+        CACHE_HITS.labels(self.name).inc()
+        return entry[1]
+
+    def set(
+        self, key: Hashable, value: Any, epoch: Optional[int] = None
+    ) -> None:
+        """
+        Set the value of a given key. None values are not cached.
+
+        Args:
+            key (Hashable) : A lookup key.
+            value (Any) : The value to cache.
+            epoch (Optional[int]) : The epoch read before the value, if any.
+        """
+        if not self.enabled or value is None:
+            return
+        if epoch is not None and epoch != self.epoch:
+            # the value may predate an invalidation.
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove a given key.
+
+        Args:
+            key (Hashable) : A lookup key.
+        """
+        self.epoch += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove every key.
+        """
+        self.epoch += 1
+        self._entries.clear()
+
+
+# users by email, and user emails by id since an email never changes.
+users_cache = TTLCache(
+    "users",
+    settings.CACHE_MAX_SIZE,
+    settings.CACHE_TTL,
+    settings.CACHE_ENABLED,
+)
+user_emails_cache = TTLCache(
+    "user_emails",
+    settings.CACHE_MAX_SIZE,
+    settings.CACHE_TTL,
+    settings.CACHE_ENABLED,
+)
+# rooms by name.
+rooms_cache = TTLCache(
+    "rooms",
+    settings.CACHE_MAX_SIZE,
+    settings.CACHE_TTL,
+    settings.CACHE_ENABLED,
+)
+# room memberships by (room id, user id), admin flags included.
+room_members_cache = TTLCache(
+    "room_members",
+    settings.CACHE_MAX_SIZE,
+    settings.CACHE_TTL,
+    settings.CACHE_ENABLED,
+)
+
+
+CACHES = {
+    cache.name: cache
+    for cache in (
+        users_cache,
+        user_emails_cache,
+        rooms_cache,
+        room_members_cache,
+    )
+}
+
+# the invalidations of a session, run once its transaction is committed.
+PENDING_INVALIDATIONS = "pending_invalidations"
+
+
+def _evict(name: str, key: Hashable) -> None:
+    CACHES[name].invalidate(key)
+    invalidations.publish(json.dumps({"cache": name, "key": key}))
+
+
+def _is_autocommit(session: AsyncSession) -> bool:
+    if session.bind is None:
+        return False
+    options = session.bind.sync_engine.get_execution_options()
+    return options.get("isolation_level") == "AUTOCOMMIT"
+
+
+def _invalidate(name: str, key: Hashable, session: AsyncSession) -> None:
+    # a row read before the commit of a transaction would be cached again,
+    # so the transaction's invalidations wait for it, see `_run_pending`.
+    if _is_autocommit(session):
+        _evict(name, key)
+    else:
+        pending = session.sync_session.info.setdefault(
+            PENDING_INVALIDATIONS, []
+        )
+        pending.append((name, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_pending(session: Session) -> None:
+    for name, key in session.info.pop(PENDING_INVALIDATIONS, ()):
+        _evict(name, key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    # the cached rows are still the committed ones.
+    session.info.pop(PENDING_INVALIDATIONS, None)
+
+
+async def apply_invalidation(data: str) -> None:
+    """
+    Evict the key of an invalidation event published by a worker.
+
+    Args:
+        data (str) : A serialized invalidation event.
+    """
+    event = json.loads(data)
+    cache = CACHES.get(event["cache"])
+    if cache is None:
+        return
+    key = event["key"]
+    # JSON turns the tuple keys into lists.
+    cache.invalidate(tuple(key) if isinstance(key, list) else key)
+    CACHE_INVALIDATIONS.labels(cache.name).inc()
+
+
+def disable_caches() -> None:
+    """
+    Clear and disable every cache while invalidation events may be lost.
+    """
+    for cache in CACHES.values():
+        cache.enabled = False
+        cache.clear()
+
+
+async def enable_caches() -> None:
+    """
+    Clear and enable every cache again once no invalidation event can be
+    lost anymore.
+    """
+    for cache in CACHES.values():
+        cache.clear()
+        cache.enabled = settings.CACHE_ENABLED
+
+
+invalidations = ControlTopic(
+    CACHE_INVALIDATION_TOPIC,
+    apply=apply_invalidation,
+    lost=disable_caches,
+    resync=enable_caches,
+)
+
+
+def invalidate_user(email: str, session: AsyncSession) -> None:
+    """
+    Invalidate the cached row of a user on every worker once the write of a
+    session is committed.
+
+    Args:
+        email (str) : The user email.
+        session (AsyncSession) : The session of the write.
+    """
+    _invalidate(users_cache.name, email.lower(), session)
+
+
+def invalidate_room(room_name: str, session: AsyncSession) -> None:
+    """
+    Invalidate the cached row of a room on every worker once the write of a
+    session is committed.
+
+    Args:
+        room_name (str) : The room name.
+        session (AsyncSession) : The session of the write.
+    """
+    _invalidate(rooms_cache.name, room_name.lower(), session)
+
+
+def invalidate_room_member(
+    room_id: int, user_id: int, session: AsyncSession
+) -> None:
+    """
+    Invalidate the cached membership of a user on every worker once the
+    write of a session is committed.
+
+    Args:
+        room_id (int) : The room id.
+        user_id (int) : The user id.
+        session (AsyncSession) : The session of the write.
+    """
+    _invalidate(room_members_cache.name, (room_id, user_id), session)
+
+
+async def init_cache_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the cross-worker cache invalidation bus.
+
+    Invalidations are published on a Redis channel through the worker's
+    pub/sub broker, which must be created first, and every worker evicts
+    the published keys from its own caches. The caches are disabled while
+    the broker reconnects, since the events of that time are lost.
+
+    :param app: fastAPI application.
+    """
+    await app.state.pub_sub_broker.follow(invalidations)
+
+
+async def close_cache_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the cross-worker cache invalidation bus.
+
+    :param app: fastAPI application.
+    """
+    await app.state.pub_sub_broker.unfollow(invalidations)
@@ -0,0 +1,237 @@
+"""ChatGPT streaming relay module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+from fastapi import (
+    FastAPI,
+)
+import json
+import logging
+import openai
+from typing import (
+    Any,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.pub_sub_broker import (
+    PubSubBroker,
+)
+
+logger = logging.getLogger(__name__)
+
+CHATGPT_USER = {
+    "id": 100000000000000000,
+    "first_name": "ChatGPT",
+    "last_name": "",
+    "bio": None,
+    "chat_status": "online",
+    "email": "chatgpt@brave-chat.net",
+    "phone_number": None,
+}
+
+
+class ChatGPTRelay:
+    """
+    A class that streams ChatGPT completions to a pub/sub topic without
+    blocking the event loop.
+
+    Tokens are coalesced into chunks that are published as deltas once
+    they reach `chunk_size` characters or every `flush_interval` seconds,
+    followed by a final message that carries the assembled answer. At most
+    `max_concurrency` completions run at once on a worker, `max_pending`
+    more wait for a slot, and the rest are rejected.
+
+    Frames published on the topic:
+        {"content": "start", ...} : a completion has started.
+        {"content": <chunk>, "stream": "delta", ...} : the next chunk.
+        {"content": <answer>, "stream": "end", ...} : the assembled answer.
+        {"content": <reason>, "stream": "error", ...} : the completion failed.
+
+    Args:
+        max_concurrency (int) : The maximum number of running completions.
+        max_pending (int) : The maximum number of queued completions.
+        chunk_size (int) : The number of characters that triggers a flush.
+        flush_interval (float) : The number of seconds that triggers a flush.
+        model (str) : The OpenAI chat model.
+        api_base (str) : An optional OpenAI compatible API base URL.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        max_concurrency: int,
+        max_pending: int,
+        chunk_size: int,
+        flush_interval: float,
+        model: str,
+        api_base: Optional[str] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.model = model
+        self.api_base = api_base
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(
+        self,
+        broker: PubSubBroker,
+        topic: str,
+        message_data: dict[str, Any],
+        prompt: str,
+    ) -> asyncio.Task:
+        """
+        Schedule a completion in the background.
+
+        Args:
+            broker (PubSubBroker) : The worker's pub/sub broker.
+            topic (str) : A topic name to publish the frames on.
+            message_data (dict[str, Any]) : The incoming socket message.
+            prompt (str) : The user prompt.
+
+        Returns:
+            asyncio.Task: The scheduled task.
+        """
+        task = asyncio.create_task(
+            self.relay(broker, topic, message_data, prompt)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self) -> None:
+        """
+        Cancel every running or queued completion.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def relay(
+        self,
+        broker: PubSubBroker,
+        topic: str,
+        message_data: dict[str, Any],
+        prompt: str,
+    ) -> None:
+        """
+        Stream a completion for a given prompt to a given topic.
+
+        Args:
+            broker (PubSubBroker) : The worker's pub/sub broker.
+            topic (str) : A topic name to publish the frames on.
+            message_data (dict[str, Any]) : The incoming socket message.
+            prompt (str) : The user prompt.
+        """
+        message_data = dict(message_data, user=CHATGPT_USER)
+        if self._pending >= self.max_concurrency + self.max_pending:
+            await self._publish(
+                broker,
+                topic,
+                message_data,
+                "ChatGPT is busy, please try again later!",
+                "error",
+            )
+            return
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                await self._stream(broker, topic, message_data, prompt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:  # pylint: disable=W0703
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+            logger.error(message)
+            await self._publish(
+                broker, topic, message_data, "Something went wrong!", "error"
+            )
+        finally:
+            self._pending -= 1
+
+    async def _stream(
+        self,
+        broker: PubSubBroker,
+        topic: str,
+        message_data: dict[str, Any],
+        prompt: str,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        await self._publish(broker, topic, message_data, "start")
+        answer: list[str] = []
+        chunk: list[str] = []
+        chunk_length = 0
+        last_flush = loop.time()
+        async for resp in await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=[dict(role="user", content=prompt)],
+            stream=True,
+            api_base=self.api_base,
+        ):
+            resp = resp.choices[0]
+            if "content" not in resp["delta"]:
+                continue
+            if resp["finish_reason"] == "stop":
+                break
+            chunk.append(resp["delta"]["content"])
+            chunk_length += len(resp["delta"]["content"])
+            if (
+                chunk_length >= self.chunk_size
+                or loop.time() - last_flush >= self.flush_interval
+            ):
+                answer.append("".join(chunk))
+                await self._publish(
+                    broker, topic, message_data, answer[-1], "delta"
+                )
+                chunk, chunk_length, last_flush = [], 0, loop.time()
+        if chunk:
+            answer.append("".join(chunk))
+            await self._publish(
+                broker, topic, message_data, answer[-1], "delta"
+            )
+        await self._publish(
+            broker, topic, message_data, "".join(answer), "end"
+        )
+
+    @staticmethod
+    async def _publish(
+        broker: PubSubBroker,
+        topic: str,
+        message_data: dict[str, Any],
+        content: str,
+        stream: Optional[str] = None,
+    ) -> None:
+        frame = dict(message_data, content=content)
+        if stream:
+            frame["stream"] = stream
+        await broker.publish(topic, json.dumps(frame, default=str))
+
+
+async def init_chatgpt_relay_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the worker's ChatGPT relay.
+
+    :param app: fastAPI application.
+    """
+    app.state.chatgpt_relay = ChatGPTRelay(
+        max_concurrency=settings.CHATGPT_MAX_CONCURRENCY,
+        max_pending=settings.CHATGPT_MAX_PENDING,
+        chunk_size=settings.CHATGPT_CHUNK_SIZE,
+        flush_interval=settings.CHATGPT_FLUSH_INTERVAL,
+        model=settings.CHATGPT_MODEL,
+        api_base=settings.OPENAI_API_BASE,
+    )
+
+
+async def close_chatgpt_relay_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Cancels the completions of the worker's ChatGPT relay.
+
+    :param app: fastAPI application.
+    """
+    await app.state.chatgpt_relay.close()
@@ -6,3 +6,5 @@ from app.config import (
 JWT_SECRET_KEY = settings.JWT_SECRET_KEY
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 360
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
@@ -1,6 +1,28 @@
+"""Password hashing module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from fastapi import (
+    FastAPI,
+)
 from passlib.context import (
     CryptContext,
 )
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -11,3 +33,110 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when too many bcrypt calls are already queued.
+    """
+
+
+class PasswordHasher:
+    """
+    A class that runs bcrypt in a bounded pool instead of the event loop.
+
+    A bcrypt call takes hundreds of milliseconds of CPU, which would stall
+    every socket of the worker. At most `max_workers` calls run at once,
+    `max_pending` more wait for a worker, and the rest are rejected with
+    `PasswordHasherBusy`.
+
+    Args:
+        max_workers (int) : The number of threads or processes.
+        max_pending (int) : The maximum number of queued calls.
+        pool (str) : The kind of pool, 'thread' or 'process'.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, pool: str):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pool = pool
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.max_workers + self.max_pending:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), function, *args
+            )
+        finally:
+            self._pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify a password against a bcrypt hash.
+
+        Args:
+            plain_password (str) : A plain password.
+            hashed_password (str) : A bcrypt hash.
+
+        Returns:
+            bool: True if the password matches the hash.
+        """
+        return await self._run(
+            verify_password, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with bcrypt.
+
+        Args:
+            password (str) : A plain password.
+
+        Returns:
+            str: The bcrypt hash.
+        """
+        return await self._run(get_password_hash, password)
+
+    def close(self) -> None:
+        """
+        Wait for the running calls and release the pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASHER_WORKERS,
+    settings.PASSWORD_HASHER_MAX_PENDING,
+    settings.PASSWORD_HASHER_POOL,
+)
+
+# the response of the requests rejected by the password hasher.
+BUSY_RESPONSE = {
+    "status_code": 503,
+    "message": "The server is busy, please try again later!",
+}
+
+
+async def close_password_hasher_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Releases the worker's password hasher pool.
+
+    :param app: fastAPI application.
+    """
+    password_hasher.close()
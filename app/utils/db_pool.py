@@ -0,0 +1,150 @@
+"""Instrumented database connection pool module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from prometheus_client import (
+    Counter,
+    Gauge,
+    Histogram,
+)
+from sqlalchemy import (
+    event,
+    exc,
+)
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    Pool,
+)
+import time
+from typing import (
+    Any,
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the database pool.",
+    labelnames=("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Number of checkouts that timed out on an exhausted database pool.",
+    labelnames=("pool",),
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_waiting",
+    "Number of checkouts queued on an exhausted database pool.",
+    labelnames=("pool",),
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Number of database connections in use.",
+    labelnames=("pool",),
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Number of database connections opened beyond the pool size.",
+    labelnames=("pool",),
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_OPENED = Counter(
+    "db_pool_connections_opened_total",
+    "Number of database connections opened by the pool.",
+    labelnames=("pool",),
+)
+DB_POOL_CONNECTIONS_CLOSED = Counter(
+    "db_pool_connections_closed_total",
+    "Number of database connections closed by the pool.",
+    labelnames=("pool",),
+)
+DB_POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations_total",
+    "Number of database connections invalidated, e.g. by a failed ping.",
+    labelnames=("pool",),
+)
+
+
+def pool_name(pool: Pool) -> str:
+    """
+    Get the Prometheus label of a pool, i.e. its `pool_logging_name`.
+
+    Args:
+        pool (Pool) : The pool.
+
+    Returns:
+        str: The pool label.
+    """
+    return pool._orig_logging_name or "primary"  # pylint: disable=W0212
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    A class that times the checkouts of the asyncio queue pool, and exports
+    its usage.
+
+    A checkout only waits once every connection of the pool and of its
+    overflow is in use, so those are counted as queued until they get one
+    or time out.
+    """
+
+    def _update_usage(self) -> None:
+        name = pool_name(self)
+        DB_POOL_CHECKED_OUT.labels(name).set(self.checkedout())
+        DB_POOL_OVERFLOW.labels(name).set(max(self.overflow(), 0))
+
+    def _do_get(self) -> Any:
+        name = pool_name(self)
+        exhausted = (
+            self._max_overflow > -1
+            and self._overflow >= self._max_overflow
+            and self._pool.empty()
+        )
+        if exhausted:
+            DB_POOL_WAITING.labels(name).inc()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(name).observe(
+                time.perf_counter() - start
+            )
+            if exhausted:
+                DB_POOL_WAITING.labels(name).dec()
+            self._update_usage()
+
+    def _do_return_conn(self, record: Any) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_usage()
+
+
+def instrument_pool(pool: Pool) -> None:
+    """
+    Export the connection churn of a pool.
+
+    The listeners are kept when the pool is recreated, e.g. on dispose.
+
+    Args:
+        pool (Pool) : The pool.
+    """
+    name = pool_name(pool)
+
+    def count_opened(*_: Any) -> None:
+        DB_POOL_CONNECTIONS_OPENED.labels(name).inc()
+
+    def count_closed(*_: Any) -> None:
+        DB_POOL_CONNECTIONS_CLOSED.labels(name).inc()
+
+    def count_invalidated(*_: Any) -> None:
+        DB_POOL_INVALIDATIONS.labels(name).inc()
+
+    event.listen(pool, "connect", count_opened)
+    event.listen(pool, "close", count_closed)
+    event.listen(pool, "close_detached", count_closed)
+    event.listen(pool, "invalidate", count_invalidated)
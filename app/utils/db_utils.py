@@ -1,6 +1,23 @@
 from sqlalchemy import (
+    Column,
+    Integer,
+    inspect,
     text,
 )
+from sqlalchemy.engine import (
+    Connection,
+)
+from sqlalchemy.schema import (
+    CreateIndex,
+    DDLElement,
+    DropIndex,
+    Index,
+    MetaData,
+    Table,
+)
+
+# the prefix of the indexes declared by the models.
+INDEX_PREFIX = "ix_"
 
 
 async def create_database(engine) -> None:
@@ -27,3 +44,72 @@ async def drop_database(engine) -> None:
     """Drop current database."""
     async with engine.connect() as conn:
         await conn.execute(text("DROP DATABASE test;"))
+
+
+def _index_columns(index: Index) -> list[str]:
+    return [column.name for column in index.columns]
+
+
+def _existing_index(table: str, name: str, columns: list[str]) -> Index:
+    # a detached copy, declaring it on the model table would add it there.
+    stub = Table(table, MetaData(), *(Column(c, Integer) for c in columns))
+    return Index(name, *(stub.c[column] for column in columns))
+
+
+def sync_indexes(conn: Connection, metadata: MetaData) -> list[str]:
+    """
+    Make the `ix_` indexes of the existing tables match the models.
+
+    `create_all` only creates the indexes of new tables, so the indexes
+    declared since are created, the ones no longer declared are dropped,
+    and the ones whose columns changed are rebuilt. The other indexes,
+    e.g. the unique and FULLTEXT keys, are left alone.
+
+    Args:
+        conn (Connection) : SqlAlchemy connection object.
+        metadata (MetaData) : The metadata of the models.
+
+    Returns:
+        list[str]: The DDL statements that were run, in order.
+    """
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    ddl: list[DDLElement] = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        declared = {
+            index.name: index
+            for index in table.indexes
+            if index.name.startswith(INDEX_PREFIX)
+        }
+        existing = {
+            index["name"]: index["column_names"]
+            for index in inspector.get_indexes(table.name)
+            if index["name"].startswith(INDEX_PREFIX)
+        }
+        stale = [
+            name
+            for name, columns in existing.items()
+            if name not in declared
+            or _index_columns(declared[name]) != columns
+        ]
+        # the new indexes are created before any index is dropped, so that
+        # a foreign key never loses the last index on its column.
+        ddl.extend(
+            CreateIndex(index)
+            for name, index in declared.items()
+            if name not in existing
+        )
+        ddl.extend(
+            DropIndex(_existing_index(table.name, name, existing[name]))
+            for name in stale
+        )
+        ddl.extend(
+            CreateIndex(declared[name]) for name in stale if name in declared
+        )
+    statements = []
+    for element in ddl:
+        conn.execute(element)
+        statements.append(str(element.compile(dialect=conn.dialect)))
+    return statements
@@ -11,6 +11,10 @@ from typing import (
     AsyncGenerator,
 )
 
+from app.utils.replica import (
+    use_replica,
+)
+
 
 async def get_db_transactional_session(
     request: Request,
@@ -53,6 +57,35 @@ async def get_db_autocommit_session(
         await session.close()
 
 
+async def get_db_read_session(
+    request: Request,
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create and get a database session for read-only queries.
+
+    The session is bound to the read replica, unless the user has just
+    written, so they always read their own writes. The user must be
+    authenticated first, i.e. `get_current_active_user` is declared before
+    this dependency, otherwise the primary is used.
+
+    :param request: current request.
+    :yield: database session.
+    """
+    factory = request.app.state.db_replica_session_factory
+    if factory is None or not use_replica(
+        getattr(request.state, "user_id", None)
+    ):
+        factory = request.app.state.db_autocommit_session_factory
+    session: AsyncSession = factory()
+
+    try:  # noqa: WPS501
+        yield session
+    except exc.DBAPIError:
+        await session.rollback()
+    finally:
+        await session.close()
+
+
 async def get_db_autocommit_session_socket() -> AsyncGenerator[
     AsyncSession, None
 ]:
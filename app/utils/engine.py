@@ -5,6 +5,7 @@ from fastapi import (
     FastAPI,
 )
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_scoped_session,
     create_async_engine,
@@ -16,62 +17,63 @@ from sqlalchemy.orm import (
 from app.config import (
     settings,
 )
+from app.utils.db_pool import (
+    InstrumentedPool,
+    instrument_pool,
+)
+from app.utils.migrations import (
+    check_schema_version,
+)
+from app.utils.replica import (
+    REPLICA_SESSION,
+)
 
 
-async def init_engine_app(app: FastAPI) -> None:  # pragma: no cover
+def create_db_engine(url: str, name: str = "primary") -> AsyncEngine:
     """
-    Creates engine, data tables and connections to the database.
+    Creates an engine with the pool profile of the settings.
 
-    This function creates SQLAlchemy engine instance,
-    data tables, session_factory for creating sessions
-    and stores them in the application's state property.
+    Args:
+        url (str) : The database URL.
+        name (str) : The pool name, used in logs and as a Prometheus label.
 
-    :param app: fastAPI application.
+    Returns:
+        AsyncEngine: The engine, whose pool exports its metrics.
     """
-    from sqlalchemy import (
-        text,
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        echo=settings.DB_ECHO,
+        echo_pool=settings.DB_ECHO_POOL,
+        connect_args={"connect_timeout": settings.DB_CONNECT_TIMEOUT},
+        future=True,
     )
+    instrument_pool(engine.sync_engine.pool)
+    return engine
 
-    from app.auth.models import (  # noqa: WPS433
-        AccessTokens,
-    )
-    from app.chats.models import (  # noqa: WPS433
-        Messages,
-    )
-    from app.contacts.models import (  # noqa: WPS433
-        Contacts,
-    )
-    from app.rooms.models import (  # noqa: WPS433
-        RoomMembers,
-        Rooms,
-    )
-    from app.users.models import (  # noqa: WPS433
-        Users,
-    )
-    from app.utils.mixins import (  # noqa: WPS433
-        Base,
-    )
 
-    engine = create_async_engine(
-        settings.db_url,
-        pool_pre_ping=True,
-        pool_size=30,
-        max_overflow=30,
-        echo_pool=True,
-        future=True,
-        echo=True,
-        pool_recycle=3600,
-    )  # recycle every hour
+async def init_engine_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates engine and connections to the database.
 
-    async with engine.begin() as conn:
-        # Ignore foreign keys checks
-        await conn.execute(text("SET GLOBAL ignore_foreign_keys = 1;"))
-        # await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-        # add support for emojies
-        await conn.execute(
-            text("ALTER TABLE messages MODIFY content TEXT CHARSET utf8mb4;")
-        )
+    This function creates SQLAlchemy engine instance, checks
+    the schema version, creates session_factory for creating sessions
+    and stores them in the application's state property.
+    A second engine is created for the read replica, if any.
+
+    :param app: fastAPI application.
+    """
+    engine = create_db_engine(settings.db_url)
+
+    # the schema is migrated out of band, see `app.utils.migrations`.
+    async with engine.connect() as conn:
+        await check_schema_version(conn)
 
     # Refer to https://github.com/sqlalchemy/sqlalchemy/discussions/8713 for more info.  # noqa: E501
     autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
@@ -91,6 +93,23 @@ async def init_engine_app(app: FastAPI) -> None:  # pragma: no cover
         ),
         scopefunc=current_task,
     )
+    # the read-only queries go to the replica, see `get_db_read_session`.
+    replica_engine = None
+    replica_session_factory = None
+    if settings.replica_db_url:
+        replica_engine = create_db_engine(settings.replica_db_url, "replica")
+        replica_session_factory = async_scoped_session(
+            sessionmaker(
+                replica_engine.execution_options(isolation_level="AUTOCOMMIT"),
+                expire_on_commit=False,
+                class_=AsyncSession,
+                # its rows are never cached, see `from_replica`.
+                info={REPLICA_SESSION: True},
+            ),
+            scopefunc=current_task,
+        )
     app.state.db_engine = engine
     app.state.db_transactional_session_factory = transactional_session_factory
     app.state.db_autocommit_session_factory = autocommit_session_factory
+    app.state.db_replica_engine = replica_engine
+    app.state.db_replica_session_factory = replica_session_factory
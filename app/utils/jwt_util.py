@@ -5,6 +5,7 @@ from datetime import (
 from fastapi import (
     Depends,
     HTTPException,
+    Request,
     status,
 )
 from fastapi.security import (
@@ -37,6 +38,13 @@ from app.utils.constants import (
 from app.utils.dependencies import (
     get_db_transactional_session,
 )
+from app.utils.replica import (
+    SAFE_METHODS,
+    mark_write,
+)
+from app.utils.revocation import (
+    revocation_list,
+)
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/v1/auth/login", scheme_name="JWT"
@@ -71,6 +79,7 @@ async def create_access_token(
 
 
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     session: AsyncSession = Depends(get_db_transactional_session),
 ):
@@ -80,7 +89,13 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    black_list = await crud.get_users_with_black_listed_token(token, session)
+    # the revoked tokens are kept in memory once they have been loaded.
+    if revocation_list.loaded:
+        black_list = revocation_list.is_revoked(token)
+    else:
+        black_list = await crud.get_users_with_black_listed_token(
+            token, session
+        )
     if black_list:
         raise credentials_exception
     try:
@@ -98,6 +113,10 @@ async def get_current_user(
     user = await crud.find_existed_user(token_data.email, session)
     if user is None:
         raise credentials_exception
+    # routes the read-only queries of the request, see `get_db_read_session`.
+    request.state.user_id = user.id
+    if request.method not in SAFE_METHODS:
+        mark_write(user.id)
     return user
 
 
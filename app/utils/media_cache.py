@@ -0,0 +1,493 @@
+"""On-disk media cache module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+from collections import (
+    OrderedDict,
+)
+import datetime
+from fastapi import (
+    FastAPI,
+)
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import (
+    Path,
+)
+from prometheus_client import (
+    Counter,
+)
+import re
+import tempfile
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Optional,
+    Union,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.pub_sub_broker import (
+    ControlTopic,
+)
+from app.utils.storage import (
+    FileInfo,
+    Storage,
+)
+
+logger = logging.getLogger(__name__)
+
+# the Redis channel of the cross-worker invalidation events.
+MEDIA_CACHE_INVALIDATION_TOPIC = "media-cache-invalidation"
+
+# content addressed images and their variants never change.
+IMMUTABLE_NAME = re.compile(r"^[0-9a-f]{64}(_[a-z]+)?\.(png|webp)$")
+
+# seconds between two updates of the mtime of a file read from the cache.
+TOUCH_INTERVAL = 60.0
+
+MEDIA_CACHE_HITS = Counter(
+    "media_cache_hits_total",
+    "Number of media reads served from the on-disk cache.",
+    labelnames=("bucket",),
+)
+MEDIA_CACHE_MISSES = Counter(
+    "media_cache_misses_total",
+    "Number of media reads fetched from the media storage.",
+    labelnames=("bucket",),
+)
+
+
+class CachedStorage(Storage):
+    """
+    A class that keeps the hot files of a storage in a local directory.
+
+    Reads of a cached file are served from a memory map of it, so a hot
+    avatar costs no storage round trip and no read syscall. Concurrent
+    misses of a file share a single fetch, and the least recently used
+    files are evicted once the cache holds `max_bytes`. Writes go to the
+    storage and evict the file on every worker of every node, see
+    `init_media_cache_app`. A file that can be replaced, e.g. a profile
+    picture, is also checked against the entity tag of the storage once
+    it has been cached for `revalidate_after` seconds, or on every read
+    while the cache is not `trusted`.
+
+    The directory may be shared by the workers of a node: every file has a
+    metadata sidecar, so a worker adopts the files cached by the others
+    instead of fetching them again. `max_bytes` bounds the directory: every
+    `scan` rebuilds the entries of the worker from it, oldest mtime first,
+    and evicts the files beyond the budget, whoever cached them.
+
+    Args:
+        storage (Storage) : The cached storage.
+        root (Path) : The directory of the cache.
+        max_bytes (int) : The maximum size in bytes of the cached files.
+        max_file_size (int) : Larger files are not cached.
+        revalidate_after (float) : Seconds after which a replaceable file is checked.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        storage: Storage,
+        root: Union[str, Path],
+        max_bytes: int,
+        max_file_size: int,
+        revalidate_after: float = 60.0,
+    ):
+        super().__init__(storage.bucket, storage.chunk_size)
+        self.storage = storage
+        self.root = Path(root) / storage.bucket
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.revalidate_after = revalidate_after
+        self.trusted = True
+        self.size = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._fetches: dict[str, asyncio.Future] = {}
+        # bumped on every eviction, so a fetch started before any is dropped.
+        self._evictions = 0
+        # the last check of every replaceable file against the storage.
+        self._checked: dict[str, float] = {}
+        self._touched: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def path(self, name: str) -> Path:
+        """
+        Get the path of a cached file.
+
+        Args:
+            name (str) : The file name.
+
+        Returns:
+            Path: The path of the file, its metadata has a `.json` suffix.
+        """
+        digest = hashlib.sha1(name.lstrip("/").encode()).hexdigest()
+        return self.root / digest[:2] / digest
+
+    def _read_info(self, name: str) -> Optional[FileInfo]:
+        path = self.path(name)
+        try:
+            with open(path.with_suffix(".json"), encoding="utf-8") as file:
+                meta = json.load(file)
+            if path.stat().st_size != meta["size"]:
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+        last_modified = meta.get("last_modified")
+        return FileInfo(
+            meta["size"],
+            meta["etag"],
+            datetime.datetime.fromisoformat(last_modified)
+            if last_modified
+            else None,
+        )
+
+    def _write(self, name: str, info: FileInfo, data: bytes) -> None:
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "name": name,
+            "size": info.size,
+            "etag": info.etag,
+            "last_modified": info.last_modified.isoformat()
+            if info.last_modified
+            else None,
+        }
+        for target, content in (
+            (path, data),
+            (path.with_suffix(".json"), json.dumps(meta).encode()),
+        ):
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, delete=False
+            ) as file:
+                file.write(content)
+            os.replace(file.name, target)
+
+    def _unlink(self, name: str) -> None:
+        path = self.path(name)
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
+
+    def _touch(self, name: str) -> None:
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        files = []
+        for meta_path in self.root.glob("*/*.json"):
+            path = meta_path.with_suffix("")
+            try:
+                with open(meta_path, encoding="utf-8") as file:
+                    meta = json.load(file)
+                stat = path.stat()
+                if stat.st_size == meta["size"]:
+                    files.append((stat.st_mtime, meta["name"], stat.st_size))
+                    continue
+            except (OSError, ValueError, KeyError):
+                pass
+            # half written, or cached by an older version.
+            path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+        return sorted(files)
+
+    def _map(self, name: str) -> Optional[Any]:
+        try:
+            with open(self.path(name), "rb") as file:
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # missing, evicted by another worker, or empty.
+            return None
+
+    def _add(self, name: str, size: int) -> list[str]:
+        if name in self._entries:
+            self.size -= self._entries.pop(name)
+        self._entries[name] = size
+        self.size += size
+        return self._shrink()
+
+    def _shrink(self) -> list[str]:
+        evicted = []
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            oldest, oldest_size = self._entries.popitem(last=False)
+            self.size -= oldest_size
+            self._checked.pop(oldest, None)
+            self._touched.pop(oldest, None)
+            evicted.append(oldest)
+        return evicted
+
+    def _discard(self, name: str) -> None:
+        if name in self._entries:
+            self.size -= self._entries.pop(name)
+        self._checked.pop(name, None)
+        self._touched.pop(name, None)
+
+    async def _revalidate(self, name: str, info: FileInfo) -> bool:
+        if IMMUTABLE_NAME.match(name.rsplit("/", 1)[-1]):
+            return True
+        now = time.monotonic()
+        checked = self._checked.get(name)
+        if (
+            self.trusted
+            and checked is not None
+            and now - checked < self.revalidate_after
+        ):
+            return True
+        evictions = self._evictions
+        fresh = await self.storage.stat(name)
+        if fresh is not None and fresh.etag == info.etag:
+            if self._evictions == evictions:
+                self._checked[name] = now
+            return True
+        await self.evict(name)
+        return False
+
+    async def _fetch(self, name: str) -> Optional[FileInfo]:
+        loop = asyncio.get_running_loop()
+        # the file may have been cached by another worker of the node.
+        info = await loop.run_in_executor(None, self._read_info, name)
+        if info is not None and not await self._revalidate(name, info):
+            info = None
+        evictions = self._evictions
+        if info is not None:
+            MEDIA_CACHE_HITS.labels(self.bucket).inc()
+        else:
+            MEDIA_CACHE_MISSES.labels(self.bucket).inc()
+            checked = time.monotonic()
+            info = await self.storage.stat(name)
+            if info is None or info.size > self.max_file_size:
+                return None
+            chunks = await self.storage.get(name)
+            if chunks is None:
+                return None
+            data = b"".join([chunk async for chunk in chunks])
+            info.size = len(data)
+            if self._evictions != evictions:
+                return None
+            await loop.run_in_executor(None, self._write, name, info, data)
+            self._checked[name] = checked
+        if self._evictions != evictions:
+            # evicted while it was written, the file may be stale.
+            self._discard(name)
+            await loop.run_in_executor(None, self._unlink, name)
+            return None
+        for evicted in self._add(name, info.size):
+            await loop.run_in_executor(None, self._unlink, evicted)
+        return info
+
+    async def _lookup(self, name: str) -> Optional[FileInfo]:
+        fetch = self._fetches.get(name)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch(name))
+            self._fetches[name] = fetch
+            fetch.add_done_callback(lambda _: self._fetches.pop(name, None))
+        # a cancelled reader must not cancel the fetch of the others.
+        return await asyncio.shield(fetch)
+
+    async def _open(self, name: str) -> Optional[tuple[FileInfo, Any]]:
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            info = None
+            if name in self._entries:
+                info = await loop.run_in_executor(None, self._read_info, name)
+                if info is not None and not await self._revalidate(name, info):
+                    info = None
+            if info is not None:
+                MEDIA_CACHE_HITS.labels(self.bucket).inc()
+                self._entries.move_to_end(name)
+                now = time.monotonic()
+                # the scans of the other workers evict by mtime.
+                if now - self._touched.get(name, 0.0) > TOUCH_INTERVAL:
+                    self._touched[name] = now
+                    await loop.run_in_executor(None, self._touch, name)
+            else:
+                # evicted by another worker of the node, or never cached.
+                self._discard(name)
+                info = await self._lookup(name)
+                if info is None:
+                    return None
+            if info.size == 0:
+                return info, b""
+            data = await loop.run_in_executor(None, self._map, name)
+            if data is not None:
+                return info, data
+            self._discard(name)
+        return None
+
+    async def _read(
+        self, data: Any, offset: int, length: Optional[int]
+    ) -> AsyncIterator[bytes]:
+        end = len(data) if length is None else min(len(data), offset + length)
+        try:
+            for start in range(offset, end, self.chunk_size):
+                yield data[start : min(start + self.chunk_size, end)]
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    async def put(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        info = await self.storage.put(name, data)
+        await self.evict(name)
+        _publish_invalidation(self.bucket, name)
+        return info
+
+    async def get(
+        self, name: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        cached = await self._open(name)
+        if cached is None:
+            return await self.storage.get(name, offset, length)
+        return self._read(cached[1], offset, length)
+
+    async def stat(self, name: str) -> Optional[FileInfo]:
+        cached = await self._open(name)
+        if cached is None:
+            return await self.storage.stat(name)
+        info, data = cached
+        if isinstance(data, mmap.mmap):
+            data.close()
+        return info
+
+    async def delete(self, name: str) -> None:
+        await self.storage.delete(name)
+        await self.evict(name)
+        _publish_invalidation(self.bucket, name)
+
+    async def evict(self, name: str) -> None:
+        """
+        Remove a file from the cache of the worker, and from the directory.
+
+        Args:
+            name (str) : The file name.
+        """
+        # one counter for every name, it never grows with the evicted names.
+        self._evictions += 1
+        self._discard(name)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._unlink, name
+        )
+
+    async def scan(self) -> None:
+        """
+        Rebuild the entries of the worker from the directory, shared by the
+        workers of a node, and evict the least recently used files until it
+        holds `max_bytes`.
+        """
+        loop = asyncio.get_running_loop()
+        files = await loop.run_in_executor(None, self._scan)
+        self._entries = OrderedDict((name, size) for _, name, size in files)
+        self.size = sum(self._entries.values())
+        for name in set(self._checked) - set(self._entries):
+            del self._checked[name]
+        for name in set(self._touched) - set(self._entries):
+            del self._touched[name]
+        for evicted in self._shrink():
+            await loop.run_in_executor(None, self._unlink, evicted)
+
+    def revalidate_all(self) -> None:
+        """
+        Check every replaceable file against the storage on its next read,
+        e.g. once invalidation events may have been lost.
+        """
+        self._checked.clear()
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+# the cache of every bucket, set by `app.utils.storage.get_storage`.
+CACHES: dict[str, CachedStorage] = {}
+
+
+def _publish_invalidation(bucket: str, name: str) -> None:
+    invalidations.publish(json.dumps({"bucket": bucket, "name": name}))
+
+
+async def apply_invalidation(data: str) -> None:
+    """
+    Evict the file of an invalidation event published by a worker.
+
+    Args:
+        data (str) : A serialized invalidation event.
+    """
+    event = json.loads(data)
+    cache = CACHES.get(event["bucket"])
+    if cache is not None:
+        await cache.evict(event["name"])
+
+
+def distrust_caches() -> None:
+    """
+    Check every replaceable file on every read while invalidation events
+    may be lost.
+    """
+    for cache in CACHES.values():
+        cache.trusted = False
+        cache.revalidate_all()
+
+
+async def trust_caches() -> None:
+    """
+    Trust the caches again once no invalidation event can be lost anymore.
+    The files checked meanwhile are checked once more.
+    """
+    for cache in CACHES.values():
+        cache.revalidate_all()
+        cache.trusted = True
+
+
+invalidations = ControlTopic(
+    MEDIA_CACHE_INVALIDATION_TOPIC,
+    apply=apply_invalidation,
+    lost=distrust_caches,
+    resync=trust_caches,
+)
+
+
+async def _scan_caches(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        for cache in list(CACHES.values()):
+            try:
+                await cache.scan()
+            except Exception as ex:  # pylint: disable=W0703
+                message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                logger.error(message)
+
+
+async def init_media_cache_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the cross-worker media cache invalidation bus, and the scans
+    that keep the cache directory of the node within its budget.
+
+    The pub/sub broker must be created first.
+
+    :param app: fastAPI application.
+    """
+    await app.state.pub_sub_broker.follow(invalidations)
+    for cache in list(CACHES.values()):
+        await cache.scan()
+    app.state.media_cache_task = asyncio.create_task(
+        _scan_caches(settings.MEDIA_CACHE_SCAN_INTERVAL)
+    )
+
+
+async def close_media_cache_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the cross-worker media cache invalidation bus.
+
+    :param app: fastAPI application.
+    """
+    app.state.media_cache_task.cancel()
+    await app.state.pub_sub_broker.unfollow(invalidations)
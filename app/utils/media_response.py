@@ -0,0 +1,216 @@
+"""Cacheable media responses module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from email.utils import (
+    format_datetime,
+    parsedate_to_datetime,
+)
+from fastapi import (
+    Request,
+    Response,
+    responses,
+)
+import re
+from typing import (
+    Any,
+    Optional,
+    Union,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.storage import (
+    FileInfo,
+    Storage,
+)
+from app.utils.thumbnails import (
+    VARIANT_MEDIA_TYPE,
+    ImageVariant,
+    variant_name,
+)
+
+# a single `bytes=start-end`, `bytes=start-` or `bytes=-suffix` range.
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# chat images never change once uploaded, under any name.
+IMMUTABLE_CACHE_CONTROL = (
+    f"public, max-age={settings.MEDIA_MAX_AGE}, immutable"
+)
+# profile pictures are replaced in place, so caches revalidate them.
+REVALIDATE_CACHE_CONTROL = (
+    f"public, max-age={settings.PROFILE_IMAGE_MAX_AGE}, must-revalidate"
+)
+# the original sent in place of a variant not rendered yet.
+PENDING_VARIANT_CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """
+    Check an `If-None-Match` or `If-Range` header against an entity tag.
+
+    Args:
+        header (Optional[str]) : The header value.
+        etag (str) : A quoted entity tag.
+        weak (bool) : False for the strong comparison of `If-Range`, where a weak tag never matches.
+
+    Returns:
+        bool: True if the header lists the tag or is `*`.
+    """
+    if not header:
+        return False
+    if not weak:
+        return not etag.startswith("W/") and header.strip() == etag
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a `Range` header against the size of a file.
+
+    Args:
+        header (Optional[str]) : The header value.
+        size (int) : The size in bytes of the file.
+
+    Returns:
+        Optional[tuple[int, int]]: The first and last byte of the range, or
+        None to send the whole file. Raises ValueError if unsatisfiable.
+    """
+    match = RANGE.match(header.replace(" ", "")) if header else None
+    if not match or match.groups() == ("", ""):
+        # multiple or malformed ranges are ignored, as allowed by RFC 9110.
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range `{header}`.")
+    return start, end
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    """
+    Build a 304 response.
+
+    Args:
+        headers (dict[str, str]) : The validators and cache headers.
+
+    Returns:
+        Response: An empty 304 response.
+    """
+    return Response(status_code=304, headers=headers)
+
+
+async def media_response(  # pylint: disable=R0911,R0912,R0913
+    request: Request,
+    storage: Storage,
+    name: str,
+    cache_control: str,
+    etag: Optional[str] = None,
+    media_type: str = "image/png",
+    variant: Optional[ImageVariant] = None,
+) -> Union[Response, dict[str, Any]]:
+    """
+    Stream a stored file with caching headers, honouring the conditional
+    and range headers of the request.
+
+    When the entity tag of the file is known from its name, e.g. the digest
+    of a content addressed image, a matching `If-None-Match` is answered
+    with a 304 without touching the storage. Otherwise the metadata of the
+    file is read first, and the body only when it must be sent. A resized
+    variant is served in place of the original once it has been rendered,
+    for the current content of a replaceable original. Until then, the
+    original is sent with a `Cache-Control` that makes caches revalidate
+    it, so the variant replaces it as soon as it exists.
+
+    Args:
+        request (Request) : The HTTP request.
+        storage (Storage) : The storage of the file.
+        name (str) : The file name.
+        cache_control (str) : The `Cache-Control` header of the response.
+        etag (Optional[str]) : The quoted entity tag, if known in advance.
+        media_type (str) : The content type of the file.
+        variant (Optional[ImageVariant]) : The resized variant to send.
+
+    Returns:
+        Union[Response, dict[str, Any]]: The response, or an error message.
+    """
+    headers = {"Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    info: Optional[FileInfo] = None
+    if variant is not None:
+        resized_etag = None
+        if etag is None:
+            info = await storage.stat(name)
+            if info is None:
+                return {"status_code": 404, "message": "Image not found!"}
+            resized = variant_name(name, variant, info.etag)
+        else:
+            resized = variant_name(name, variant)
+            resized_etag = f'{etag[:-1]}-{variant.value}"'
+            if etag_matches(if_none_match, resized_etag):
+                return not_modified({**headers, "ETag": resized_etag})
+        resized_info = await storage.stat(resized)
+        if resized_info is not None:
+            name, etag, media_type = resized, resized_etag, VARIANT_MEDIA_TYPE
+            info = resized_info
+        else:
+            headers["Cache-Control"] = PENDING_VARIANT_CACHE_CONTROL
+    if info is None:
+        if etag is not None and etag_matches(if_none_match, etag):
+            return not_modified({**headers, "ETag": etag})
+        info = await storage.stat(name)
+        if info is None:
+            return {"status_code": 404, "message": "Image not found!"}
+    headers["ETag"] = etag = etag or info.etag
+    if info.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            info.last_modified, usegmt=True
+        )
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return not_modified(headers)
+    elif info.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(
+                request.headers.get("if-modified-since", "")
+            )
+            if info.last_modified.replace(microsecond=0) <= since:
+                return not_modified(headers)
+        except (TypeError, ValueError):
+            pass
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or etag_matches(if_range, etag, weak=False):
+        try:
+            byte_range = parse_range(request.headers.get("range"), info.size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{info.size}"},
+            )
+    if byte_range is None:
+        chunks = await storage.get(name)
+        status_code = 200
+        headers["Content-Length"] = str(info.size)
+    else:
+        start, end = byte_range
+        chunks = await storage.get(name, start, end - start + 1)
+        status_code = 206
+        headers["Content-Length"] = str(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    if chunks is None:
+        return {"status_code": 404, "message": "Image not found!"}
+    return responses.StreamingResponse(
+        chunks,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -0,0 +1,317 @@
+"""Chat media upload module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+import binascii
+from fastapi import (
+    UploadFile,
+)
+import hashlib
+import io
+import re
+import tempfile
+from typing import (
+    BinaryIO,
+    Optional,
+)
+
+from app.utils.storage import (
+    Storage,
+)
+
+# decoded images larger than this are spooled to disk.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# the base name of a content addressed image, i.e. its SHA-256 digest.
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.png$")
+
+# the characters skipped by the base64 decoder, e.g. line breaks.
+NOT_BASE64 = re.compile(r"[^A-Za-z0-9+/=]")
+
+
+class MediaTooLarge(Exception):
+    """
+    Raised when an image is larger than the maximum size.
+    """
+
+
+class InvalidMedia(Exception):
+    """
+    Raised when an image is not valid base64.
+    """
+
+
+class MediaBlob:
+    """
+    A class that holds a decoded image with its SHA-256 digest, which is
+    the address of the image in the media storage.
+
+    Args:
+        file (BinaryIO) : A file object positioned at the start of the image.
+        digest (str) : The hex SHA-256 digest of the image.
+        size (int) : The size in bytes of the image.
+    """
+
+    def __init__(self, file: BinaryIO, digest: str, size: int):
+        self.file = file
+        self.digest = digest
+        self.size = size
+
+    @property
+    def name(self) -> str:
+        """
+        Get the file name of the image in the media storage.
+
+        Returns:
+            str: The file name.
+        """
+        return blob_name(self.digest)
+
+    async def read(self) -> bytes:
+        """
+        Read the whole image off the event loop.
+
+        Returns:
+            bytes: The image.
+        """
+
+        def read() -> bytes:
+            self.file.seek(0)
+            return self.file.read()
+
+        return await asyncio.get_running_loop().run_in_executor(None, read)
+
+    def close(self) -> None:
+        """
+        Release the decoded image.
+        """
+        self.file.close()
+
+
+def blob_name(digest: str) -> str:
+    """
+    Get the file name of a content addressed image in the media storage.
+
+    Args:
+        digest (str) : The hex SHA-256 digest of the image.
+
+    Returns:
+        str: The file name.
+    """
+    return f"/chat/images/blobs/{digest}.png"
+
+
+def media_url(scope: str, sender_id: int, digest: str) -> str:
+    """
+    Build the relative URL of a chat image, as stored in the `media` column
+    of its messages.
+
+    Args:
+        scope (str) : Either 'user' or 'room'.
+        sender_id (int) : A user id for the sender of the image.
+        digest (str) : The hex SHA-256 digest of the image.
+
+    Returns:
+        str: The relative URL of the image.
+    """
+    return f"/chat/images/{scope}/{sender_id}/{digest}.png"
+
+
+def media_storage_name(url: str) -> str:
+    """
+    Get the file name in the media storage of a chat image URL.
+
+    Content addressed images are shared by every message that sent them,
+    while the images uploaded before were stored under their URL.
+
+    Args:
+        url (str) : The relative URL of the image.
+
+    Returns:
+        str: The file name.
+    """
+    match = BLOB_NAME.match(url.rsplit("/", 1)[-1])
+    return blob_name(match.group(1)) if match else url
+
+
+def media_etag(url: str) -> Optional[str]:
+    """
+    Get the entity tag of a chat image from its URL, without reading it.
+
+    Args:
+        url (str) : The relative URL of the image.
+
+    Returns:
+        Optional[str]: The quoted digest of a content addressed image, or
+        None for the images uploaded before.
+    """
+    match = BLOB_NAME.match(url.rsplit("/", 1)[-1])
+    return f'"{match.group(1)}"' if match else None
+
+
+def decode_base64(data: str, max_size: int, chunk_size: int) -> MediaBlob:
+    """
+    Decode a base64 string, wrapped in lines or not, chunk by chunk into a
+    spooled file, and hash it on the way.
+
+    The size is checked as the chunks are decoded, and only one chunk of
+    decoded bytes is in memory at a time once the file is spooled to disk.
+
+    Args:
+        data (str) : A base64 string.
+        max_size (int) : The maximum decoded size in bytes.
+        chunk_size (int) : The number of characters decoded at once.
+
+    Returns:
+        MediaBlob: The decoded image.
+    """
+    if not data:
+        raise InvalidMedia("You can't upload an empty file!")
+    chunk_size = max(4, chunk_size - chunk_size % 4)
+    file = tempfile.SpooledTemporaryFile(  # pylint: disable=R1732
+        max_size=SPOOL_MAX_SIZE
+    )
+    digest = hashlib.sha256()
+    size = 0
+    # every decoded chunk must hold whole groups of 4 characters, the rest
+    # is carried to the next chunk.
+    pending = ""
+    try:
+        for start in range(0, len(data), chunk_size):
+            pending += NOT_BASE64.sub("", data[start : start + chunk_size])
+            end = len(pending) - len(pending) % 4
+            chunk = binascii.a2b_base64(pending[:end])
+            pending = pending[end:]
+            size += len(chunk)
+            if size > max_size:
+                raise MediaTooLarge("The image is too large!")
+            digest.update(chunk)
+            file.write(chunk)
+        if pending or not size:
+            raise binascii.Error("Incorrect padding")
+    except binascii.Error as ex:
+        file.close()
+        raise InvalidMedia("The image is not valid!") from ex
+    except MediaTooLarge:
+        file.close()
+        raise
+    file.seek(0)
+    return MediaBlob(file, digest.hexdigest(), size)
+
+
+async def read_upload(
+    file: UploadFile, max_size: int, chunk_size: int = 65536
+) -> bytes:
+    """
+    Read an uploaded file in chunks, up to a maximum size.
+
+    Args:
+        file (UploadFile) : The uploaded file.
+        max_size (int) : The maximum size in bytes of the file.
+        chunk_size (int) : The number of bytes read at once.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_size:
+            raise MediaTooLarge("The image is too large!")
+        chunks.append(chunk)
+
+
+def hash_bytes(data: bytes) -> MediaBlob:
+    """
+    Hash an already decoded image.
+
+    Args:
+        data (bytes) : The image.
+
+    Returns:
+        MediaBlob: The image.
+    """
+    return MediaBlob(
+        io.BytesIO(data), hashlib.sha256(data).hexdigest(), len(data)
+    )
+
+
+class MediaUploader:
+    """
+    A class that uploads the chat images of a worker off the event loop.
+
+    Images are decoded and hashed in the default thread pool, then stored
+    under their digest in the media storage, at most `max_concurrency` at a
+    time, so a large image never blocks the sockets of the worker. Whether
+    a digest is already stored is up to the caller, see
+    `app.chats.crud.upload_media`.
+
+    Args:
+        storage (Storage) : The storage of the images.
+        max_size (int) : The maximum size in bytes of an image.
+        max_concurrency (int) : The maximum number of concurrent uploads.
+        chunk_size (int) : The number of base64 characters decoded at once.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        max_size: int,
+        max_concurrency: int,
+        chunk_size: int,
+    ):
+        self.storage = storage
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def decode(self, data: str) -> MediaBlob:
+        """
+        Decode and hash a base64 image.
+
+        Args:
+            data (str) : The base64 image.
+
+        Returns:
+            MediaBlob: The decoded image, which the caller must close.
+        """
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, decode_base64, data, self.max_size, self.chunk_size
+            )
+
+    async def decode_bytes(self, data: bytes) -> MediaBlob:
+        """
+        Hash an already decoded image.
+
+        Args:
+            data (bytes) : The image.
+
+        Returns:
+            MediaBlob: The image, which the caller must close.
+        """
+        if len(data) > self.max_size:
+            raise MediaTooLarge("The image is too large!")
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, hash_bytes, data
+            )
+
+    async def upload(self, blob: MediaBlob) -> str:
+        """
+        Upload a decoded image under its digest.
+
+        Args:
+            blob (MediaBlob) : The decoded image.
+
+        Returns:
+            str: The file name, once the storage has confirmed the upload.
+        """
+        async with self._semaphore:
+            await self.storage.put(blob.name, blob.file)
+        return blob.name
@@ -0,0 +1,395 @@
+"""Hot/cold messages tiering module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from aioredis import (
+    Redis,
+)
+from aioredis.exceptions import (
+    LockError,
+)
+import asyncio
+import datetime
+from fastapi import (
+    FastAPI,
+)
+import logging
+from prometheus_client import (
+    Counter,
+)
+from sqlalchemy.engine import (
+    Row,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+from sqlalchemy.types import (
+    DateTime,
+    Integer,
+)
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.statements import (
+    Statement,
+    statement,
+)
+
+logger = logging.getLogger(__name__)
+
+# the Redis lock that lets a single worker move the messages at a time.
+ARCHIVE_LOCK = "messages-archive"
+
+MESSAGES_ARCHIVED = Counter(
+    "messages_archived_total",
+    "Number of messages moved to the messages archive.",
+)
+
+
+GET_HOT_FLOOR = statement(
+    "archive.get_hot_floor",
+    """
+        SELECT
+          MIN(id) AS id
+        FROM
+          messages
+    """,
+    columns={"id": Integer},
+)
+
+
+async def get_hot_floor(session: AsyncSession) -> Optional[int]:
+    """
+    A method to get the lowest id of the `messages` table. Every archived
+    message has a lower id.
+
+    Args:
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        Optional[int]: The lowest id, or None if the table is empty.
+    """
+    result = await session.execute(GET_HOT_FLOOR)
+    return result.scalar()
+
+
+async def read_history(  # pylint: disable=R0913
+    query: Statement,
+    archive_query: Statement,
+    values: dict[str, Any],
+    after: bool,
+    session: AsyncSession,
+    key: str = "id",
+) -> list[Row]:
+    """
+    A method to read a page of messages from the `messages` table and its
+    archive.
+
+    The archive only holds the ids lower than the lowest id of `messages`,
+    so the cursor of the page tells which tables it must be read from: a
+    page of old messages never reads `messages`, and a page of recent
+    messages reads the archive only when `messages` can't fill it, e.g.
+    the first page of a conversation with fewer messages than the limit.
+    A page that spans both is completed from the second table.
+
+    Args:
+        query (Statement) : The keyset query of the page on `messages`.
+        archive_query (Statement) : The same query on the archive.
+        values (dict[str, Any]) : The values of the queries, with a `cursor_id` and a `limit`.
+        after (bool) : True for the newer messages, ascending, False for the older ones, descending.
+        session (AsyncSession) : SqlAlchemy session object.
+        key (str) : The name of the message id column of the queries.
+
+    Returns:
+        list[Row]: The rows of the page, in the order of the queries.
+    """
+    floor = await get_hot_floor(session)
+    cursor_id = values["cursor_id"]
+    if after:
+        # the archive is read first, it holds the oldest messages.
+        tiers = [
+            (archive_query, floor is None or cursor_id < floor - 1),
+            (query, floor is not None),
+        ]
+    else:
+        tiers = [
+            (query, floor is not None and cursor_id > floor),
+            (archive_query, True),
+        ]
+    rows: list[Row] = []
+    for tier_query, needed in tiers:
+        if not needed or len(rows) >= values["limit"]:
+            continue
+        result = await session.execute(tier_query, values)
+        seen = {getattr(row, key) for row in rows}
+        # a message moved between the two reads is read twice.
+        rows.extend(
+            row for row in result.fetchall() if getattr(row, key) not in seen
+        )
+    return rows[: values["limit"]]
+
+
+async def read_full_history(
+    query: Statement,
+    archive_query: Statement,
+    values: dict[str, Any],
+    session: AsyncSession,
+    key: str = "id",
+) -> list[Row]:
+    """
+    A method to read every message of a history, from the archive and the
+    `messages` table, in ascending id order.
+
+    Args:
+        query (Statement) : The history query on `messages`, in ascending id order.
+        archive_query (Statement) : The same query on the archive.
+        values (dict[str, Any]) : The values of the queries.
+        session (AsyncSession) : SqlAlchemy session object.
+        key (str) : The name of the message id column of the queries.
+
+    Returns:
+        list[Row]: The rows of the history.
+    """
+    result = await session.execute(archive_query, values)
+    rows = result.fetchall()
+    seen = {getattr(row, key) for row in rows}
+    result = await session.execute(query, values)
+    rows.extend(
+        row for row in result.fetchall() if getattr(row, key) not in seen
+    )
+    return rows
+
+
+GET_OLDEST_MESSAGES = statement(
+    "archive.get_oldest_messages",
+    """
+        SELECT
+          id,
+          creation_date
+        FROM
+          messages
+        ORDER BY
+          id
+        LIMIT :limit
+    """,
+    params={"limit": Integer},
+    columns={"id": Integer, "creation_date": DateTime},
+)
+
+
+COPY_MESSAGES_TO_ARCHIVE = statement(
+    "archive.copy_messages_to_archive",
+    """
+        INSERT INTO messages_archive (
+          id,
+          sender,
+          receiver,
+          room,
+          content,
+          status,
+          message_type,
+          media,
+          creation_date,
+          modified_date
+        )
+        SELECT
+          id,
+          sender,
+          receiver,
+          room,
+          content,
+          status,
+          message_type,
+          media,
+          creation_date,
+          modified_date
+        FROM
+          messages
+        WHERE
+          id <= :last_id
+    """,
+    params={"last_id": Integer},
+)
+
+
+DELETE_ARCHIVED_MESSAGES = statement(
+    "archive.delete_archived_messages",
+    """
+        DELETE FROM
+          messages
+        WHERE
+          id <= :last_id
+    """,
+    params={"last_id": Integer},
+)
+
+
+class MessageArchiver:
+    """
+    A class that moves the old messages from the `messages` table to the
+    compressed `messages_archive` table.
+
+    Every `interval` seconds, the worker that holds the Redis lock moves
+    the messages older than `archive_after` days, lowest ids first, in
+    transactions of at most `batch_size` messages. The lock is renewed
+    after every transaction, so a long run keeps it. Only a contiguous range
+    of the lowest ids is ever moved, so every archived id stays lower than
+    every id of `messages`.
+
+    Args:
+        session_factory (Callable[[], AsyncSession]) : A transactional session factory.
+        redis (Redis) : The Redis client of the lock.
+        archive_after (float) : The age in days after which a message is moved.
+        interval (float) : Seconds between two runs.
+        batch_size (int) : The maximum number of messages per transaction.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        session_factory: Callable[[], AsyncSession],
+        redis: Redis,
+        archive_after: float,
+        interval: float,
+        batch_size: int,
+    ):
+        self.session_factory = session_factory
+        self.redis = redis
+        self.archive_after = archive_after
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the task that moves the messages.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the task that moves the messages.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def archive(self) -> int:
+        """
+        Move the old messages, unless another worker is moving them.
+
+        Returns:
+            int: The number of moved messages.
+        """
+        # the lock expires if the worker dies while holding it.
+        lock = self.redis.lock(ARCHIVE_LOCK, timeout=self.interval)
+        if not await lock.acquire(blocking=False):
+            return 0
+        moved = 0
+        try:
+            while True:
+                batch = await self._archive_batch()
+                moved += batch
+                if batch < self.batch_size:
+                    return moved
+                try:
+                    await lock.reacquire()
+                except LockError:
+                    # another worker may be moving the same ids.
+                    logger.warning("The messages archive lock expired.")
+                    return moved
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass
+
+    async def _archive_batch(self) -> int:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+            days=self.archive_after
+        )
+        session = self.session_factory()
+        try:
+            result = await session.execute(
+                GET_OLDEST_MESSAGES, {"limit": self.batch_size}
+            )
+            last_id = None
+            count = 0
+            for message in result.fetchall():
+                # the moved ids must stay a contiguous range.
+                if message.creation_date is None:
+                    break
+                if message.creation_date >= cutoff:
+                    break
+                last_id = message.id
+                count += 1
+            if last_id is None:
+                return 0
+            values = {"last_id": last_id}
+            await session.execute(COPY_MESSAGES_TO_ARCHIVE, values)
+            await session.execute(DELETE_ARCHIVED_MESSAGES, values)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+        MESSAGES_ARCHIVED.inc(count)
+        return count
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                moved = await self.archive()
+                if moved:
+                    logger.info(f"Moved {moved} messages to the archive.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=W0703
+                message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                logger.error(message)
+            await asyncio.sleep(self.interval)
+
+
+async def init_message_archive_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the worker's messages archive job.
+
+    It must be started after the database engine and the pub/sub broker,
+    whose Redis client holds the lock.
+
+    :param app: fastAPI application.
+    """
+    app.state.message_archiver = None
+    if settings.MESSAGE_ARCHIVE_AFTER_DAYS <= 0:
+        return
+    archiver = MessageArchiver(
+        session_factory=app.state.db_transactional_session_factory,
+        redis=app.state.pub_sub_broker.redis,
+        archive_after=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+        interval=settings.MESSAGE_ARCHIVE_INTERVAL,
+        batch_size=settings.MESSAGE_ARCHIVE_BATCH_SIZE,
+    )
+    archiver.start()
+    app.state.message_archiver = archiver
+
+
+async def close_message_archive_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the worker's messages archive job.
+
+    :param app: fastAPI application.
+    """
+    if app.state.message_archiver is not None:
+        await app.state.message_archiver.close()
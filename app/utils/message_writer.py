@@ -0,0 +1,221 @@
+"""Per-worker write-behind message persistence module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+import datetime
+from fastapi import (
+    FastAPI,
+)
+import logging
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
+
+from app.chats.crud import (
+    index_messages,
+    insert_messages,
+    update_chat_summaries,
+)
+from app.config import (
+    settings,
+)
+from app.utils.replica import (
+    mark_write,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    A class that persists the socket messages of a worker in batches.
+
+    Messages are appended to a bounded queue and written by a single task
+    as multi-row INSERTs, once `batch_size` messages are pending or
+    `flush_interval` seconds after the first one. When the queue is full,
+    `put` waits, which slows the sockets down to the rate of the database.
+    A failed batch is retried `max_retries` times with an exponential
+    backoff before it is dropped, and `close` writes every pending message
+    before returning.
+
+    Args:
+        session_factory (Callable[[], AsyncSession]) : A transactional session factory.
+        batch_size (int) : The maximum number of messages per INSERT.
+        flush_interval (float) : Seconds to wait for a batch to fill up.
+        max_pending (int) : The maximum number of queued messages.
+        max_retries (int) : The number of retries of a failed batch.
+        retry_delay (float) : Seconds before the first retry.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        session_factory: Callable[[], AsyncSession],
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        max_retries: int,
+        retry_delay: float,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._draining = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the task that writes the queued messages.
+        """
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_messages())
+
+    async def close(self) -> None:
+        """
+        Write every queued message, then stop the writer task.
+        """
+        if self._writer is None:
+            return
+        self._draining.set()
+        await self._queue.join()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    async def put(  # pylint: disable=R0913
+        self,
+        sender_id: int,
+        content: str,
+        message_type: str,
+        receiver_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+        media: str = "",
+    ) -> None:
+        """
+        Queue a message, waiting while the queue is full.
+
+        Args:
+            sender_id (int) : A user id for the sender of the message.
+            content (str) : The content of the message.
+            message_type (str) : The message type(e.g. 'text' or 'media').
+            receiver_id (int) : A user id for the recipient of the message.
+            room_id (int) : The id of the room of the message.
+            media (str) : A relative URL to the location of the image.
+        """
+        # the sender reads the primary until the replicas have the message.
+        mark_write(sender_id)
+        await self._queue.put(
+            {
+                "sender": sender_id,
+                "receiver": receiver_id,
+                "room": room_id,
+                "content": content,
+                "message_type": message_type,
+                "media": media,
+                "creation_date": datetime.datetime.utcnow(),
+            }
+        )
+
+    async def _next_batch(self) -> list[dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._draining.is_set():
+                break
+            # a drain flushes the partial batch without waiting for the timer.
+            getter = asyncio.ensure_future(self._queue.get())
+            draining = asyncio.ensure_future(self._draining.wait())
+            await asyncio.wait(
+                {getter, draining},
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            draining.cancel()
+            getter.cancel()
+            if getter.done() and not getter.cancelled():
+                batch.append(getter.result())
+        return batch
+
+    async def _write_batch(self, batch: list[dict[str, Any]]) -> None:
+        session = self.session_factory()
+        try:
+            result = await insert_messages(batch, session)
+            # the last row id of a multi-row INSERT is the id of its first row.
+            await index_messages(result.lastrowid, session)
+            await update_chat_summaries(batch, session)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def _write_messages(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        await self._write_batch(batch)
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as ex:  # pylint: disable=W0703
+                        message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                        logger.error(message)
+                        if attempt == self.max_retries:
+                            logger.error(
+                                f"Dropping a batch of {len(batch)} messages."
+                            )
+                        else:
+                            await asyncio.sleep(
+                                self.retry_delay * 2**attempt
+                            )
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+async def init_message_writer_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the worker's message writer.
+
+    It must be created after the database engine, and closed before it.
+
+    :param app: fastAPI application.
+    """
+    writer = MessageWriter(
+        session_factory=app.state.db_transactional_session_factory,
+        batch_size=settings.MESSAGE_BATCH_SIZE,
+        flush_interval=settings.MESSAGE_FLUSH_INTERVAL,
+        max_pending=settings.MESSAGE_QUEUE_SIZE,
+        max_retries=settings.MESSAGE_WRITE_RETRIES,
+        retry_delay=settings.MESSAGE_RETRY_DELAY,
+    )
+    writer.start()
+    app.state.message_writer = writer
+
+
+async def close_message_writer_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Writes the pending messages and closes the worker's message writer.
+
+    :param app: fastAPI application.
+    """
+    await app.state.message_writer.close()
@@ -0,0 +1,370 @@
+"""
+Versioned schema migrations module.
+
+The schema changes run once per deployment, out of band, instead of on
+the startup of every worker, which only checks the schema version.
+
+Usage:
+    python -m app.utils.migrations upgrade
+    python -m app.utils.migrations status
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import argparse
+import asyncio
+import datetime
+import logging
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.exc import (
+    ProgrammingError,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+)
+from typing import (
+    Awaitable,
+    Callable,
+)
+
+logger = logging.getLogger(__name__)
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200)),
+    Column("applied_date", DateTime),
+    mysql_engine="InnoDB",
+    prefixes=["ROWSTORE", "REFERENCE"],
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """
+    Raised on startup when the database schema is older than the code.
+    """
+
+
+class Migration:  # pylint: disable=R0903
+    """
+    A class that holds one schema change.
+
+    Args:
+        version (int) : The schema version after the change.
+        description (str) : A short description of the change.
+        upgrade (Callable[[AsyncConnection], Awaitable[None]]) : The change, run in a transaction.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        upgrade: Callable[[AsyncConnection], Awaitable[None]],
+    ):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+# every migration, in version order.
+MIGRATIONS: list[Migration] = []
+
+
+def migration(
+    version: int, description: str
+) -> Callable[[Callable], Callable]:
+    """
+    Register a migration. Versions must follow each other, and a released
+    migration must never change, add a new one instead. The tables and
+    indexes are built from `app.utils.schema_snapshots`, not the models,
+    and the SQL is written in the migration, not shared with the CRUD.
+
+    Args:
+        version (int) : The schema version after the change.
+        description (str) : A short description of the change.
+
+    Returns:
+        Callable: A decorator of the change.
+    """
+
+    def register(
+        upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    ) -> Callable[[AsyncConnection], Awaitable[None]]:
+        if version != len(MIGRATIONS) + 1:
+            raise ValueError(
+                f"The migration {version} must have version"
+                f" {len(MIGRATIONS) + 1}."
+            )
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+
+    return register
+
+
+def latest_version() -> int:
+    """
+    Get the schema version this code needs.
+
+    Returns:
+        int: The version of the last migration.
+    """
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+async def get_schema_version(conn: AsyncConnection) -> int:
+    """
+    Get the schema version of the database.
+
+    Args:
+        conn (AsyncConnection) : SqlAlchemy connection object.
+
+    Returns:
+        int: The version of the last applied migration, 0 if none.
+    """
+    result = await conn.execute(select(func.max(schema_version.c.version)))
+    return result.scalar() or 0
+
+
+async def check_schema_version(conn: AsyncConnection) -> int:
+    """
+    Check that the database schema is recent enough for this code, with a
+    single query. A newer schema is accepted, so that the old workers keep
+    running during a rolling deploy.
+
+    Args:
+        conn (AsyncConnection) : SqlAlchemy connection object.
+
+    Returns:
+        int: The schema version of the database.
+    """
+    try:
+        version = await get_schema_version(conn)
+    except ProgrammingError:
+        # the schema_version table doesn't exist yet.
+        version = 0
+    if version < latest_version():
+        raise SchemaVersionError(
+            f"The database schema is at version {version}, but this code"
+            f" needs version {latest_version()}. Run `python -m"
+            " app.utils.migrations upgrade` first."
+        )
+    if version > latest_version():
+        logger.warning(
+            f"The database schema is at version {version}, ahead of this"
+            f" code at version {latest_version()}."
+        )
+    return version
+
+
+async def upgrade(engine: AsyncEngine) -> list[int]:
+    """
+    Apply the pending migrations, each in its own transaction with the
+    record of its version.
+
+    Args:
+        engine (AsyncEngine) : SqlAlchemy engine object.
+
+    Returns:
+        list[int]: The versions that were applied.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(schema_version.create, checkfirst=True)
+        version = await get_schema_version(conn)
+    applied = []
+    for pending in MIGRATIONS[version:]:
+        async with engine.begin() as conn:
+            logger.info(
+                f"Applying migration {pending.version}: {pending.description}"
+            )
+            await pending.upgrade(conn)
+            await conn.execute(
+                schema_version.insert().values(
+                    version=pending.version,
+                    description=pending.description,
+                    applied_date=datetime.datetime.utcnow(),
+                )
+            )
+        applied.append(pending.version)
+    return applied
+
+
+@migration(1, "Create the tables")
+async def create_tables(conn: AsyncConnection) -> None:
+    from app.utils.schema_snapshots import (  # noqa: WPS433
+        version_1,
+    )
+
+    # Ignore foreign keys checks
+    await conn.execute(text("SET GLOBAL ignore_foreign_keys = 1;"))
+    await conn.run_sync(version_1().create_all)
+    # add support for emojies
+    await conn.execute(
+        text("ALTER TABLE messages MODIFY content TEXT CHARSET utf8mb4;")
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE chat_summaries"
+            " MODIFY last_content TEXT CHARSET utf8mb4;"
+        )
+    )
+
+
+@migration(2, "Replace the single-column indexes with composite ones")
+async def sync_model_indexes(conn: AsyncConnection) -> None:
+    from app.utils.db_utils import (  # noqa: WPS433
+        sync_indexes,
+    )
+    from app.utils.schema_snapshots import (  # noqa: WPS433
+        version_2,
+    )
+
+    await conn.run_sync(sync_indexes, version_2())
+
+
+@migration(3, "Build the chat lists of an existing database")
+async def build_chat_summaries(conn: AsyncConnection) -> None:
+    # only runs when the chat_summaries table is empty, e.g. right after it
+    # has been created on an existing database.
+    await conn.execute(
+        text(
+            """
+            INSERT INTO chat_summaries (
+              owner,
+              peer,
+              last_message_id,
+              last_content,
+              last_message_time,
+              nb_unread,
+              creation_date
+            )
+            SELECT
+              messages.receiver,
+              messages.sender,
+              messages.id,
+              messages.content,
+              messages.creation_date,
+              peers.nb_unread,
+              :creation_date
+            FROM
+              messages
+            INNER JOIN (
+              SELECT
+                receiver,
+                sender,
+                MAX(id) AS last_message_id,
+                SUM(status) AS nb_unread
+              FROM
+                messages
+              WHERE
+                receiver IS NOT NULL
+              GROUP BY
+                receiver,
+                sender
+            ) AS peers
+            ON
+              messages.id = peers.last_message_id
+            WHERE NOT EXISTS (
+              SELECT
+                id
+              FROM
+                chat_summaries
+            )
+            """
+        ),
+        {"creation_date": datetime.datetime.utcnow()},
+    )
+
+
+@migration(4, "Build the message search index of an existing database")
+async def build_message_search(conn: AsyncConnection) -> None:
+    # only runs when the message_search table is empty, e.g. right after it
+    # has been created on an existing database.
+    await conn.execute(
+        text(
+            """
+            INSERT IGNORE INTO message_search (
+              id,
+              sender,
+              receiver,
+              room,
+              content,
+              creation_date
+            )
+            SELECT
+              id,
+              sender,
+              receiver,
+              room,
+              content,
+              creation_date
+            FROM
+              messages
+            WHERE
+              content != "<em>Deleted Message!</em>"
+            AND NOT EXISTS (
+              SELECT
+                id
+              FROM
+                message_search
+            )
+            """
+        )
+    )
+
+
+@migration(5, "Create the messages archive")
+async def create_messages_archive(conn: AsyncConnection) -> None:
+    from app.utils.schema_snapshots import (  # noqa: WPS433
+        version_5,
+    )
+
+    archive = version_5().tables["messages_archive"]
+    await conn.run_sync(archive.create, checkfirst=True)
+
+
+async def run(command: str) -> None:
+    from app.config import (  # noqa: WPS433
+        settings,
+    )
+    from app.utils.engine import (  # noqa: WPS433
+        create_db_engine,
+    )
+
+    engine = create_db_engine(settings.db_url, "migrations")
+    try:
+        if command == "upgrade":
+            applied = await upgrade(engine)
+            print(f"applied migrations:      {applied or 'none'}")
+        async with engine.connect() as conn:
+            try:
+                version = await get_schema_version(conn)
+            except ProgrammingError:
+                version = 0
+        print(f"schema version:          {version}")
+        print(f"latest version:          {latest_version()}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("command", choices=("upgrade", "status"))
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
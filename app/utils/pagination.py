@@ -0,0 +1,81 @@
+"""Keyset pagination helpers module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import base64
+import binascii
+import json
+from typing import (
+    Optional,
+)
+
+
+def encode_cursor(message_id: int) -> str:
+    """
+    Encode a message id into an opaque cursor.
+
+    Args:
+        message_id (int) : The id of the last message of a page.
+
+    Returns:
+        str: An url safe opaque cursor.
+    """
+    payload = json.dumps({"id": message_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """
+    Decode an opaque cursor into a message id.
+
+    Args:
+        cursor (str) : An opaque cursor returned by `encode_cursor`.
+
+    Returns:
+        Optional[int]: The message id, or None if the cursor is invalid.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        message_id = payload["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(message_id, int):
+        return None
+    return message_id
+
+
+def encode_search_cursor(score: float, message_id: int) -> str:
+    """
+    Encode the rank of a search result into an opaque cursor.
+
+    Args:
+        score (float) : The relevance score of the last result of a page.
+        message_id (int) : The id of the last result of a page.
+
+    Returns:
+        str: An url safe opaque cursor.
+    """
+    payload = json.dumps({"score": score, "id": message_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_search_cursor(cursor: str) -> Optional[tuple[float, int]]:
+    """
+    Decode an opaque cursor into the rank of a search result.
+
+    Args:
+        cursor (str) : An opaque cursor returned by `encode_search_cursor`.
+
+    Returns:
+        Optional[tuple[float, int]]: The score and the message id, or None if the cursor is invalid.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        score, message_id = payload["score"], payload["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(score, (int, float)) or isinstance(score, bool):
+        return None
+    if not isinstance(message_id, int) or isinstance(message_id, bool):
+        return None
+    return float(score), message_id
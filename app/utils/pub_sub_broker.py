@@ -0,0 +1,342 @@
+"""Per-worker Redis pub/sub broker module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from aioredis import (
+    Redis,
+)
+from aioredis.client import (
+    PubSub,
+)
+import asyncio
+from collections import (
+    deque,
+)
+from fastapi import (
+    FastAPI,
+)
+import logging
+from typing import (
+    Awaitable,
+    Callable,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+
+logger = logging.getLogger(__name__)
+
+# queued to a control topic after a reconnection, see `ControlTopic`.
+_RESYNC = object()
+
+
+class ControlTopic:  # pylint: disable=R0903
+    """
+    A class that describes a topic of control events between workers, e.g.
+    cache invalidations, whose loss must never go unnoticed.
+
+    Unlike the topics of the web sockets, the events are queued without
+    bound, and a failed publish is retried until Redis is reachable again,
+    see `PubSubBroker.follow`. The events published while the subscriber
+    reconnects are lost though: `lost` is called as soon as the reader
+    fails, and `resync` once it is subscribed again, in order with the
+    events, to rebuild the state the lost events would have updated.
+
+    Args:
+        topic (str) : The Redis channel of the events.
+        apply (Callable[[str], Awaitable[None]]) : Applies one event.
+        lost (Callable[[], None]) : Called when events may have been lost.
+        resync (Callable[[], Awaitable[None]]) : Called once no more events can be lost.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        apply: Callable[[str], Awaitable[None]],
+        lost: Optional[Callable[[], None]] = None,
+        resync: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.topic = topic
+        self.apply = apply
+        self.lost = lost
+        self.resync = resync
+        self.broker: Optional["PubSubBroker"] = None
+
+    def publish(self, message: str) -> None:
+        """
+        Publish an event to every worker, this one included, once the topic
+        is followed. It never blocks nor fails, see `PubSubBroker.send`.
+
+        Args:
+            message (str) : A serialized event.
+        """
+        if self.broker is not None:
+            self.broker.send(self.topic, message)
+
+
+class PubSubBroker:
+    """
+    A class that shares one Redis connection pool and one subscriber
+    between all the web sockets served by a worker.
+
+    Every local socket gets its own bounded queue per topic. A single
+    reader task receives the messages of all the subscribed topics and
+    fans them out to the queues of that topic. A topic is subscribed on
+    Redis when its first local socket joins, and unsubscribed when its
+    last local socket leaves.
+
+    The reader blocks on the subscriber stream for up to `read_timeout`
+    seconds instead of polling it, so an idle worker costs no CPU.
+
+    Args:
+        redis (Redis) : A Redis client backed by a shared connection pool.
+        queue_size (int) : The maximum number of pending messages per socket.
+        read_timeout (float) : Seconds to wait on the stream per read.
+    """
+
+    def __init__(self, redis: Redis, queue_size: int, read_timeout: float):
+        self.redis = redis
+        self.queue_size = queue_size
+        self.read_timeout = read_timeout
+        self._pub_sub: PubSub = redis.pubsub()
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+        self._subscribed = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+        # the followed control topics, with their queue and their task.
+        self._controls: dict[
+            str, tuple[ControlTopic, asyncio.Queue, asyncio.Task]
+        ] = {}
+        # the messages to publish, in order, until Redis accepts them.
+        self._outbox: deque[tuple[str, str]] = deque()
+        self._outbox_ready = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the reader task that dispatches the incoming messages, and the
+        sender task of the control events.
+        """
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read_messages())
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._send_messages())
+
+    async def close(self) -> None:
+        """
+        Stop the reader task and release every Redis connection.
+        """
+        for control, _, task in list(self._controls.values()):
+            control.broker = None
+            task.cancel()
+        self._controls.clear()
+        for task in (self._reader, self._sender):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._reader = None
+        self._sender = None
+        if self._outbox:
+            logger.warning(f"{len(self._outbox)} control events unsent.")
+        await self._pub_sub.close()
+        await self.redis.close()
+        await self.redis.connection_pool.disconnect()
+
+    async def publish(self, topic: str, message: str) -> int:
+        """
+        Publish a message on a given topic.
+
+        Args:
+            topic (str) : A topic name(e.g. a room name).
+            message (str) : A serialized message.
+
+        Returns:
+            int: The number of subscribers that received the message.
+        """
+        return await self.redis.publish(topic, message)
+
+    def send(self, topic: str, message: str) -> None:
+        """
+        Publish a message on a given topic from the sender task, which
+        retries it until Redis accepts it. Messages are published in order.
+
+        Args:
+            topic (str) : A topic name.
+            message (str) : A serialized message.
+        """
+        self._outbox.append((topic, message))
+        self._outbox_ready.set()
+
+    async def subscribe(
+        self, topic: str, maxsize: Optional[int] = None
+    ) -> asyncio.Queue:
+        """
+        Register a local subscriber on a given topic.
+
+        Args:
+            topic (str) : A topic name(e.g. a room name).
+            maxsize (Optional[int]) : The queue size, `queue_size` by default, 0 for no bound.
+
+        Returns:
+            asyncio.Queue: A queue that receives the messages of the topic.
+        """
+        queue: asyncio.Queue = asyncio.Queue(
+            maxsize=self.queue_size if maxsize is None else maxsize
+        )
+        async with self._lock:
+            queues = self._subscribers.setdefault(topic, set())
+            if not queues:
+                await self._pub_sub.subscribe(topic)
+                self._subscribed.set()
+            queues.add(queue)
+        return queue
+
+    async def unsubscribe(self, topic: str, queue: asyncio.Queue) -> None:
+        """
+        Remove a local subscriber from a given topic.
+
+        Args:
+            topic (str) : A topic name(e.g. a room name).
+            queue (asyncio.Queue) : The queue returned by `subscribe`.
+        """
+        async with self._lock:
+            queues = self._subscribers.get(topic)
+            if not queues:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[topic]
+                await self._pub_sub.unsubscribe(topic)
+
+    async def follow(self, control: ControlTopic) -> None:
+        """
+        Follow a control topic: its events are applied in order by a task of
+        the worker, and `control.publish` publishes to every worker.
+
+        Args:
+            control (ControlTopic) : The control topic.
+        """
+        queue = await self.subscribe(control.topic, maxsize=0)
+        task = asyncio.create_task(self._apply_events(control, queue))
+        self._controls[control.topic] = (control, queue, task)
+        control.broker = self
+
+    async def unfollow(self, control: ControlTopic) -> None:
+        """
+        Stop following a control topic.
+
+        Args:
+            control (ControlTopic) : The control topic.
+        """
+        control.broker = None
+        entry = self._controls.pop(control.topic, None)
+        if entry is None:
+            return
+        _, queue, task = entry
+        task.cancel()
+        await self.unsubscribe(control.topic, queue)
+
+    async def _apply_events(
+        self, control: ControlTopic, queue: asyncio.Queue
+    ) -> None:
+        while True:
+            data = await queue.get()
+            try:
+                if data is _RESYNC:
+                    if control.resync is not None:
+                        await control.resync()
+                else:
+                    await control.apply(data)
+            except Exception as ex:  # pylint: disable=W0703
+                message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                logger.error(message)
+
+    async def _send_messages(self) -> None:
+        while True:
+            await self._outbox_ready.wait()
+            while self._outbox:
+                topic, message = self._outbox[0]
+                try:
+                    await self.redis.publish(topic, message)
+                except Exception as ex:  # pylint: disable=W0703
+                    message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                    logger.error(message)
+                    await asyncio.sleep(1.0)
+                    continue
+                self._outbox.popleft()
+            self._outbox_ready.clear()
+
+    def _lost(self) -> None:
+        for control, _, _ in self._controls.values():
+            if control.lost is not None:
+                control.lost()
+
+    def _resynced(self) -> None:
+        for _, queue, _ in self._controls.values():
+            queue.put_nowait(_RESYNC)
+
+    def _dispatch(self, topic: str, data: str) -> None:
+        for queue in self._subscribers.get(topic, ()):
+            if queue.full():
+                # drop the oldest message of a slow socket.
+                logger.warning(f"Subscriber queue full on topic `{topic}`.")
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def _read_messages(self) -> None:
+        # the pub/sub connection is only created by the first subscribe.
+        await self._subscribed.wait()
+        resync = False
+        while True:
+            try:
+                message = await self._pub_sub.get_message(
+                    ignore_subscribe_messages=True, timeout=self.read_timeout
+                )
+                # a read reconnects and subscribes again to every topic.
+                if resync:
+                    resync = False
+                    self._resynced()
+                if message:
+                    self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=W0703
+                message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+                logger.error(message)
+                # the events published until the reconnection are lost.
+                if not resync:
+                    resync = True
+                    self._lost()
+                await asyncio.sleep(1.0)
+
+
+async def init_pub_sub_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the worker's Redis connection pool and pub/sub broker.
+
+    The broker is stored in the application's state property and
+    shared by every web socket served by this worker.
+
+    :param app: fastAPI application.
+    """
+    redis = Redis(connection_pool=settings.redis_pool())
+    broker = PubSubBroker(
+        redis, settings.WS_QUEUE_SIZE, settings.PUB_SUB_READ_TIMEOUT
+    )
+    broker.start()
+    app.state.pub_sub_broker = broker
+
+
+async def close_pub_sub_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the worker's pub/sub broker.
+
+    :param app: fastAPI application.
+    """
+    await app.state.pub_sub_broker.close()
@@ -1,17 +1,12 @@
-from aioredis.client import (
-    PubSub,
-    Redis,
-)
+import asyncio
 from asyncio import (
     ensure_future,
 )
-import base64
 from fastapi.websockets import (
     WebSocket,
 )
 import json
 import logging
-import openai
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
@@ -19,7 +14,7 @@ from starlette.websockets import (
     WebSocketState,
 )
 from typing import (
-    NamedTuple,
+    Any,
     Optional,
 )
 
@@ -27,50 +22,78 @@ from app.auth.crud import (
     find_existed_user_id,
 )
 from app.chats.crud import (
-    send_new_message,
+    media_uploader,
+    upload_media,
+)
+from app.config import (
+    settings,
 )
 from app.rooms.crud import (
     ban_user_from_room,
     find_admin_in_room,
     find_existed_room,
-    send_new_room_message,
+    find_existed_user_in_room,
     unban_user_from_room,
 )
+from app.rooms.models import (
+    UserStatus,
+)
 from app.users.crud import (
     update_chat_status,
 )
+from app.utils.chatgpt_relay import (
+    ChatGPTRelay,
+)
+from app.utils.media_upload import (
+    InvalidMedia,
+    MediaTooLarge,
+    media_url,
+)
+from app.utils.message_writer import (
+    MessageWriter,
+)
+from app.utils.pub_sub_broker import (
+    PubSubBroker,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+HEARTBEAT_MESSAGE = json.dumps({"type": "ping"})
+
 
-class RequestRoomObject(NamedTuple):
-    room: str
-    content: str
-    message_type: str
-    media: str
+async def send_frame(web_socket: WebSocket, data: Any) -> None:
+    # frames are encoded the same way as the ones of the producer.
+    await web_socket.send_text(json.dumps(data, default=str))
 
 
-class RequestContactObject(NamedTuple):
-    receiver: str
-    content: str
-    message_type: str
-    media: str
+async def can_post_in_room(
+    sender_id: int, room_id: int, session: AsyncSession
+) -> bool:
+    # checked for every message, the sender may have left or been banned
+    # since they connected. The membership is cached, and invalidated.
+    member = await find_existed_user_in_room(sender_id, room_id, session)
+    return bool(member) and member.banned != UserStatus.banned
 
 
 async def consumer_handler(
-    connection: Redis,
+    broker: PubSubBroker,
     topic: str,
     web_socket: WebSocket,
     sender_id: int,
     receiver_id: Optional[int],
     session: AsyncSession,
+    chatgpt_relay: ChatGPTRelay,
+    message_writer: MessageWriter,
 ) -> None:
     try:
         user = await find_existed_user_id(sender_id, session)
         room = None
         admin = None
+        receiver = None
         if receiver_id:
+            # resolved once, the text messages are written in batches.
+            receiver = await find_existed_user_id(receiver_id, session)
             data = {
                 "content": f"{user.first_name} is online!",
                 "type": "online",
@@ -86,15 +109,16 @@ async def consumer_handler(
                 "user": dict(user),
             }
         await update_chat_status("online", user, session)
-        await connection.publish(topic, json.dumps(data, default=str))
+        await broker.publish(topic, json.dumps(data, default=str))
         # wait for messages
         while True:
             if web_socket.application_state == WebSocketState.CONNECTED:
-                data = await web_socket.receive_text()
-                message_data = json.loads(data)
+                message_data = json.loads(await web_socket.receive_text())
                 message_data["user"] = dict(user)
                 if room and not admin:
                     message_data["user"]["admin"] = 1
+                if message_data.get("type", None) in ("ping", "pong"):
+                    continue
                 if message_data.get("type", None) == "leave":
                     logger.warning(message_data)
                     logger.info("Disconnecting from Websocket")
@@ -104,48 +128,50 @@ async def consumer_handler(
                         "type": "offline",
                         "user": dict(user),
                     }
-                    await connection.publish(
-                        topic, json.dumps(data, default=str)
-                    )
+                    await broker.publish(topic, json.dumps(data, default=str))
                     await web_socket.close()
                     break
                 elif message_data.get("type", None) == "media":
+                    # only the base64 image is kept until it is uploaded.
                     data = message_data.pop("content")
-                    bin_photo = base64.b64decode(data)
-                    # f.write(bin_photo)
+                    message_data.pop("preview", None)
                     if receiver_id:
-                        receiver = await find_existed_user_id(
-                            receiver_id, session
-                        )
-                        request = RequestContactObject(
-                            receiver.email,
-                            "",
-                            message_data["type"],
-                            message_data,
-                        )
-                        url = await send_new_message(
-                            sender_id, request, bin_photo, None, session
-                        )
-                        message_data["media"] = url
-                        message_data["content"] = ""
-                        message_data.pop("preview")
+                        if not receiver or receiver.id == sender_id:
+                            continue
+                        scope = "user"
                     else:
-                        request = RequestRoomObject(
-                            topic,
-                            "",
-                            message_data["type"],
-                            message_data,
-                        )
-                        url = await send_new_room_message(
-                            sender_id, request, bin_photo, session
+                        if not await can_post_in_room(
+                            sender_id, room.id, session
+                        ):
+                            continue
+                        scope = "room"
+                    try:
+                        blob = await media_uploader.decode(data)
+                    except (InvalidMedia, MediaTooLarge) as ex:
+                        await send_frame(
+                            web_socket,
+                            json.dumps({"content": str(ex), "type": "error"}),
                         )
-                        message_data["media"] = url
-                        message_data["content"] = ""
-                        message_data.pop("preview")
-                    await connection.publish(
+                        continue
+                    finally:
+                        del data
+                    # the upload is skipped if the image is already stored.
+                    digest = await upload_media(blob, session)
+                    file_name = media_url(scope, sender_id, digest)
+                    await message_writer.put(
+                        sender_id,
+                        "",
+                        message_data["type"],
+                        receiver_id=receiver.id if receiver_id else None,
+                        room_id=room.id if room else None,
+                        media=file_name,
+                    )
+                    # published once the storage has confirmed the upload.
+                    message_data["media"] = file_name
+                    message_data["content"] = ""
+                    await broker.publish(
                         topic, json.dumps(message_data, default=str)
                     )
-                    del request
                 elif message_data.get("type", None) == "ban":
                     ensure_future(
                         ban_user_from_room(
@@ -155,7 +181,7 @@ async def consumer_handler(
                             session=session,
                         )
                     )
-                    await connection.publish(
+                    await broker.publish(
                         topic, json.dumps(message_data, default=str)
                     )
                 elif message_data.get("type", None) == "unban":
@@ -167,75 +193,37 @@ async def consumer_handler(
                             session=session,
                         )
                     )
-                    await connection.publish(
+                    await broker.publish(
                         topic, json.dumps(message_data, default=str)
                     )
                 elif message_data.get("type", None) == "chatgpt":
-                    content = message_data["content"]
-                    message_data["user"] = {
-                        "id": 100000000000000000,
-                        "first_name": "ChatGPT",
-                        "last_name": "",
-                        "bio": None,
-                        "chat_status": "online",
-                        "email": "chatgpt@brave-chat.net",
-                        "phone_number": None,
-                    }
-                    message_data["content"] = "start"
-                    await connection.publish(
-                        topic, json.dumps(message_data, default=str)
+                    chatgpt_relay.submit(
+                        broker, topic, message_data, message_data["content"]
                     )
-                    message_data["content"] = ""
-                    for resp in openai.ChatCompletion.create(
-                        model="gpt-3.5-turbo",
-                        messages=[dict(role="user", content=content)],
-                        stream=True,
-                    ):
-                        resp = resp.choices[0]
-                        if "content" not in resp["delta"]:
-                            continue
-                        if resp["finish_reason"] == "stop":
-                            break
-                        message_data["content"] += resp["delta"]["content"]
-                        print(message_data["content"])
-                        await connection.publish(
-                            topic, json.dumps(message_data, default=str)
-                        )
                 else:
                     logger.info(
                         f"CONSUMER RECIEVED: {json.dumps(message_data, default=str)}"  # noqa: E501
                     )
-                    await connection.publish(
+                    await broker.publish(
                         topic, json.dumps(message_data, default=str)
                     )
+                    if not message_data["content"]:
+                        continue
                     if receiver_id:
-                        receiver = await find_existed_user_id(
-                            receiver_id, session
-                        )
-                        request = RequestContactObject(
-                            receiver.email,
-                            message_data["content"],
-                            message_data["type"],
-                            "",
-                        )
-                        ensure_future(
-                            send_new_message(
-                                sender_id, request, None, None, session
+                        if receiver and receiver.id != sender_id:
+                            await message_writer.put(
+                                sender_id,
+                                message_data["content"],
+                                message_data["type"],
+                                receiver_id=receiver.id,
                             )
-                        )
-                    else:
-                        request = RequestRoomObject(
-                            topic,
+                    elif await can_post_in_room(sender_id, room.id, session):
+                        await message_writer.put(
+                            sender_id,
                             message_data["content"],
                             message_data["type"],
-                            "",
+                            room_id=room.id,
                         )
-                        ensure_future(
-                            send_new_room_message(
-                                sender_id, request, None, session
-                            )
-                        )
-                    del request
             else:
                 logger.warning(
                     f"Websocket state: {web_socket.application_state}."  # noqa: E501
@@ -244,28 +232,30 @@ async def consumer_handler(
     except Exception as ex:
         message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
         logger.error(message)
-        await connection.close()
         # remove user
         logger.warning("Disconnecting Websocket")
 
 
 async def producer_handler(
-    pub_sub: PubSub, topic: str, web_socket: WebSocket
+    broker: PubSubBroker,
+    topic: str,
+    web_socket: WebSocket,
+    heartbeat_interval: Optional[float] = None,
 ) -> None:
-    await pub_sub.subscribe(topic)
+    if heartbeat_interval is None:
+        heartbeat_interval = settings.WS_HEARTBEAT_INTERVAL
+    queue = await broker.subscribe(topic)
     try:
         while True:
             if web_socket.application_state == WebSocketState.CONNECTED:
-                message = await pub_sub.get_message(
-                    ignore_subscribe_messages=True
-                )
-                if message:
-                    logger.info(
-                        f"PRODUCER SENDING: {json.dumps(message, default=str)}"
-                    )
-                    await web_socket.send_text(
-                        json.dumps(message["data"], default=str)
+                try:
+                    data = await asyncio.wait_for(
+                        queue.get(), timeout=heartbeat_interval
                     )
+                    logger.info(f"PRODUCER SENDING: {data}")
+                except asyncio.TimeoutError:
+                    data = HEARTBEAT_MESSAGE
+                await send_frame(web_socket, data)
             else:
                 logger.warning(
                     f"Websocket state: {web_socket.application_state}."  # noqa: E501
@@ -275,3 +265,5 @@ async def producer_handler(
         message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
         logger.error(message)
         logger.warning("Disconnecting Websocket")
+    finally:
+        await broker.unsubscribe(topic, queue)
@@ -0,0 +1,241 @@
+"""Read replica routing module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from fastapi import (
+    FastAPI,
+)
+import json
+import logging
+import math
+from prometheus_client import (
+    Counter,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+import time
+from typing import (
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.pub_sub_broker import (
+    ControlTopic,
+)
+
+logger = logging.getLogger(__name__)
+
+# the Redis channel of the users who have just written.
+RECENT_WRITES_TOPIC = "recent-writes"
+# the requests with any other method are writes.
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# the session info key of the sessions bound to a replica.
+REPLICA_SESSION = "replica"
+
+DB_READS = Counter(
+    "db_reads_total",
+    "Number of read-only requests by database they were routed to.",
+    labelnames=("target",),
+)
+
+
+class RecentWriters:
+    """
+    A class that remembers the users who have written in the last `window`
+    seconds.
+
+    Their reads are sent to the primary until the replicas have caught up
+    with their own writes. A user is published to the other workers at
+    most twice per window, however often they write, so the other workers
+    open a window half as long again, which covers the unpublished writes.
+    While the writes of other workers may be lost, every read is sent to
+    the primary, see `hold`.
+
+    Args:
+        window (float) : The number of seconds after a write during which the
+        reads of its author are sent to the primary.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._expiries: dict[int, float] = {}
+        self._published: dict[int, float] = {}
+        self._next_purge = 0.0
+        # every read goes to the primary until then.
+        self._held_until = 0.0
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def is_recent(self, user_id: int) -> bool:
+        """
+        Check whether a user has written in the last window.
+
+        Args:
+            user_id (int) : The user id.
+
+        Returns:
+            bool: True if the reads of the user must go to the primary.
+        """
+        now = time.monotonic()
+        if self._held_until > now:
+            return True
+        expiry = self._expiries.get(user_id)
+        return expiry is not None and expiry > now
+
+    def hold(self, duration: float) -> None:
+        """
+        Send the reads of every user to the primary for a given duration,
+        e.g. while the writes of the other workers may be lost.
+
+        Args:
+            duration (float) : The number of seconds, `math.inf` until the
+            next call.
+        """
+        self._held_until = time.monotonic() + duration
+
+    def add(self, user_id: int, window: Optional[float] = None) -> None:
+        """
+        Start or extend the window of a user.
+
+        Args:
+            user_id (int) : The user id.
+            window (Optional[float]) : The window, if not the default one.
+        """
+        now = time.monotonic()
+        expiry = now + (self.window if window is None else window)
+        self._expiries[user_id] = max(
+            expiry, self._expiries.get(user_id, expiry)
+        )
+        if now >= self._next_purge:
+            self._next_purge = now + self.window
+            self._expiries = {
+                key: until
+                for key, until in self._expiries.items()
+                if until > now
+            }
+            self._published = {
+                key: published
+                for key, published in self._published.items()
+                if published + self.window > now
+            }
+
+    def should_publish(self, user_id: int) -> bool:
+        """
+        Check whether the window of a user must be sent to the other workers,
+        i.e. whether they may not know it is open for long enough.
+
+        Args:
+            user_id (int) : The user id.
+
+        Returns:
+            bool: True if the user must be published.
+        """
+        now = time.monotonic()
+        published = self._published.get(user_id)
+        if published is not None and published + self.window / 2 > now:
+            return False
+        self._published[user_id] = now
+        return True
+
+
+recent_writers = RecentWriters(settings.READ_YOUR_WRITES_WINDOW)
+
+
+async def apply_recent_write(data: str) -> None:
+    """
+    Open the window of a user published by a worker.
+
+    Args:
+        data (str) : A serialized user id.
+    """
+    recent_writers.add(json.loads(data), recent_writers.window * 1.5)
+
+
+def _recent_writes_lost() -> None:
+    recent_writers.hold(math.inf)
+
+
+async def _resync_recent_writes() -> None:
+    # the windows opened by the lost events are still open on the primary.
+    recent_writers.hold(recent_writers.window * 1.5)
+
+
+recent_writes = ControlTopic(
+    RECENT_WRITES_TOPIC,
+    apply=apply_recent_write,
+    lost=_recent_writes_lost,
+    resync=_resync_recent_writes,
+)
+
+
+def mark_write(user_id: int) -> None:
+    """
+    Send the reads of a user to the primary, on every worker, until the
+    replicas have caught up with their write.
+
+    Args:
+        user_id (int) : The id of the author of the write.
+    """
+    recent_writers.add(user_id)
+    if recent_writers.should_publish(user_id):
+        recent_writes.publish(json.dumps(user_id))
+
+
+def from_replica(session: AsyncSession) -> bool:
+    """
+    Check whether a session reads from a replica, whose rows may be older
+    than the cached ones and must not be cached.
+
+    Args:
+        session (AsyncSession) : SqlAlchemy session object.
+
+    Returns:
+        bool: True if the session is bound to a replica.
+    """
+    return session.sync_session.info.get(REPLICA_SESSION, False)
+
+
+def use_replica(user_id: Optional[int]) -> bool:
+    """
+    Choose the database of a read-only request.
+
+    Args:
+        user_id (Optional[int]) : The id of the authenticated user, if any.
+
+    Returns:
+        bool: True if the read can be sent to a replica.
+    """
+    # an unknown reader may have just written.
+    replica = user_id is not None and not recent_writers.is_recent(user_id)
+    DB_READS.labels("replica" if replica else "primary").inc()
+    return replica
+
+
+async def init_replica_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts sharing the recent writers between workers.
+
+    Without a replica every read goes to the primary, and nothing is shared.
+    The pub/sub broker must be created first.
+
+    :param app: fastAPI application.
+    """
+    if app.state.db_replica_engine is None:
+        return
+    await app.state.pub_sub_broker.follow(recent_writes)
+
+
+async def close_replica_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops sharing the recent writers, and closes the replica connections.
+
+    :param app: fastAPI application.
+    """
+    if app.state.db_replica_engine is None:
+        return
+    await app.state.pub_sub_broker.unfollow(recent_writes)
+    await app.state.db_replica_engine.dispose()
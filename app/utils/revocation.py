@@ -0,0 +1,309 @@
+"""Revoked access tokens module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import asyncio
+import datetime
+from fastapi import (
+    FastAPI,
+)
+import hashlib
+import json
+import jwt
+import logging
+import math
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+import time
+from typing import (
+    Callable,
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.constants import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+from app.utils.pub_sub_broker import (
+    ControlTopic,
+)
+
+logger = logging.getLogger(__name__)
+
+# the Redis channel of the cross-worker revocation events.
+TOKEN_REVOCATION_TOPIC = "token-revocation"
+
+
+class BloomFilter:
+    """
+    A class that tests whether a string may belong to a set.
+
+    A negative answer is always right, a positive answer is wrong with a
+    probability of `error_rate` once `capacity` strings have been added.
+
+    Args:
+        capacity (int) : The expected number of strings.
+        error_rate (float) : The false positive rate at capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8,
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2),
+        )
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, value: str) -> list[int]:
+        # double hashing derives every index from a single digest.
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            (first + index * second) % self.size
+            for index in range(self.num_hashes)
+        ]
+
+    def add(self, value: str) -> None:
+        """
+        Add a string to the filter.
+
+        Args:
+            value (str) : A string.
+        """
+        for index in self._indexes(value):
+            self._bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(value)
+        )
+
+
+class RevocationList:
+    """
+    A class that keeps the revoked access tokens of a worker in memory.
+
+    Most tokens are not revoked, and a Bloom filter answers for them
+    without touching the exact set of revoked tokens. Tokens are dropped
+    once their `exp` claim has passed, since an expired token is rejected
+    anyway, and the filter is rebuilt from the remaining tokens when it
+    fills up.
+
+    The list is only trusted once `loaded`. It is not while revocation
+    events may be lost, and every check reads the database instead.
+
+    Args:
+        capacity (int) : The expected number of revoked tokens.
+        error_rate (float) : The false positive rate of the filter.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.loaded = False
+        # the number of times revocation events may have been lost.
+        self.losses = 0
+        self._filter = BloomFilter(capacity, error_rate)
+        self._revoked: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, token: str, expires_at: float) -> None:
+        """
+        Revoke a token until a given time.
+
+        Args:
+            token (str) : An access token.
+            expires_at (float) : The `exp` claim of the token.
+        """
+        if expires_at <= time.time():
+            return
+        if len(self._revoked) >= self.capacity:
+            self._rebuild()
+        self._revoked[token] = expires_at
+        self._filter.add(token)
+
+    def is_revoked(self, token: str) -> bool:
+        """
+        Check whether a token has been revoked.
+
+        Args:
+            token (str) : An access token.
+
+        Returns:
+            bool: True if the token has been revoked.
+        """
+        if token not in self._filter:
+            return False
+        expires_at = self._revoked.get(token)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._revoked[token]
+            return False
+        return True
+
+    def _rebuild(self) -> None:
+        now = time.time()
+        self._revoked = {
+            token: expires_at
+            for token, expires_at in self._revoked.items()
+            if expires_at > now
+        }
+        while len(self._revoked) >= self.capacity // 2:
+            self.capacity *= 2
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        for token in self._revoked:
+            self._filter.add(token)
+
+
+def token_expiration(token: str) -> float:
+    """
+    Read the `exp` claim of a token without verifying it.
+
+    Args:
+        token (str) : An access token.
+
+    Returns:
+        float: The expiration timestamp of the token.
+    """
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+        return float(payload["exp"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError):
+        return time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+revocation_list = RevocationList(
+    settings.REVOCATION_CAPACITY, settings.REVOCATION_ERROR_RATE
+)
+
+# the worker's session factory, set once the revocation list is loaded.
+_session_factory: Optional[Callable[[], AsyncSession]] = None
+
+
+def revoke_token(token: str) -> None:
+    """
+    Revoke a token on every worker.
+
+    Args:
+        token (str) : An access token.
+    """
+    expires_at = token_expiration(token)
+    revocation_list.add(token, expires_at)
+    revocations.publish(json.dumps({"token": token, "exp": expires_at}))
+
+
+async def load_revoked_tokens(
+    session_factory: Callable[[], AsyncSession]
+) -> None:
+    """
+    Add the revoked tokens that are not expired yet from the database.
+
+    Args:
+        session_factory (Callable[[], AsyncSession]) : A session factory.
+    """
+    from app.auth.crud import (  # noqa: WPS433
+        get_black_listed_tokens,
+    )
+
+    since = datetime.datetime.utcnow() - datetime.timedelta(
+        minutes=ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    session = session_factory()
+    try:
+        tokens = await get_black_listed_tokens(since, session)
+    finally:
+        await session.close()
+    for token in tokens:
+        revocation_list.add(token, token_expiration(token))
+
+
+async def _apply_revocation(data: str) -> None:
+    event = json.loads(data)
+    revocation_list.add(event["token"], event["exp"])
+
+
+def _revocations_lost() -> None:
+    # the database is checked until the list is reloaded.
+    revocation_list.loaded = False
+    revocation_list.losses += 1
+
+
+async def _resync_revocations() -> None:
+    if _session_factory is None:
+        return
+    losses = revocation_list.losses
+    await load_revoked_tokens(_session_factory)
+    # events lost again while loading are reloaded by the next resync.
+    revocation_list.loaded = losses == revocation_list.losses
+
+
+revocations = ControlTopic(
+    TOKEN_REVOCATION_TOPIC,
+    apply=_apply_revocation,
+    lost=_revocations_lost,
+    resync=_resync_revocations,
+)
+
+
+async def _reload_revocations(
+    session_factory: Callable[[], AsyncSession], interval: float
+) -> None:
+    # a revocation whose event was never published is still loaded.
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_revoked_tokens(session_factory)
+        except Exception as ex:  # pylint: disable=W0703
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+            logger.error(message)
+
+
+async def init_revocation_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Loads the revoked tokens that are not expired yet, and follows the
+    revocations of the other workers.
+
+    The list is reloaded from the database every
+    `REVOCATION_RELOAD_INTERVAL` seconds, and whenever the pub/sub broker
+    reconnects. The pub/sub broker and the database engine must be created
+    first.
+
+    :param app: fastAPI application.
+    """
+    global _session_factory  # pylint: disable=W0603
+    session_factory = app.state.db_autocommit_session_factory
+    # follow first, so no revocation is missed while loading.
+    await app.state.pub_sub_broker.follow(revocations)
+    losses = revocation_list.losses
+    await load_revoked_tokens(session_factory)
+    revocation_list.loaded = losses == revocation_list.losses
+    _session_factory = session_factory
+    app.state.revocation_task = asyncio.create_task(
+        _reload_revocations(
+            session_factory, settings.REVOCATION_RELOAD_INTERVAL
+        )
+    )
+    logger.info(f"Loaded {len(revocation_list)} revoked tokens.")
+
+
+async def close_revocation_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops following the revocations of the other workers.
+
+    :param app: fastAPI application.
+    """
+    global _session_factory  # pylint: disable=W0603
+    _session_factory = None
+    revocation_list.loaded = False
+    app.state.revocation_task.cancel()
+    await app.state.pub_sub_broker.unfollow(revocations)
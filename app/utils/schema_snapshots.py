@@ -0,0 +1,296 @@
+"""
+Frozen schema snapshots module.
+
+A released migration must never change, so the migrations that create
+tables or indexes build them from the snapshots below, as they were when
+the migration was released, instead of from the models, which keep
+changing. A new snapshot is added with the migration that needs it.
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+from sqlalchemy import (
+    BIGINT,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.mysql import (
+    TEXT,
+)
+from typing import (
+    Any,
+)
+
+from app.utils.full_text_search import (
+    Fulltext,
+)
+
+# the configs of the ROWSTORE tables.
+ROWSTORE = {"mysql_engine": "InnoDB", "prefixes": ["ROWSTORE", "REFERENCE"]}
+
+# the `ix_` indexes of the tables, by table and index name.
+VERSION_1_INDEXES = {
+    "users": {
+        "ix_users_first_name": ("first_name",),
+        "ix_users_last_name": ("last_name",),
+        "ix_users_email": ("email",),
+        "ix_users_password": ("password",),
+        "ix_users_user_status": ("user_status",),
+    },
+    "rooms": {
+        "ix_rooms_room_name": ("room_name",),
+    },
+    "access_tokens": {
+        "ix_access_tokens_user": ("user",),
+        "ix_access_tokens_token": ("token",),
+    },
+    "contacts": {
+        "ix_contacts_user": ("user",),
+        "ix_contacts_contact": ("contact",),
+    },
+    "room_members": {
+        "ix_room_members_room_member": ("room", "member"),
+        "ix_room_members_room": ("room",),
+        "ix_room_members_member": ("member",),
+        "ix_room_members_banned": ("banned",),
+        "ix_room_members_admin": ("admin",),
+    },
+    "messages": {
+        "ix_messages_sender_receiver_id": ("sender", "receiver", "id"),
+        "ix_messages_room_id": ("room", "id"),
+        "ix_messages_sender": ("sender",),
+        "ix_messages_receiver": ("receiver",),
+        "ix_messages_room": ("room",),
+        "ix_messages_content": ("content",),
+        "ix_messages_status": ("status",),
+        "ix_messages_message_type": ("message_type",),
+    },
+    "message_search": {
+        "ix_message_search_sender": ("sender",),
+        "ix_message_search_receiver": ("receiver",),
+        "ix_message_search_room": ("room",),
+    },
+    "chat_summaries": {
+        "ix_chat_summaries_owner": ("owner",),
+    },
+}
+
+VERSION_2_INDEXES = {
+    "users": {
+        "ix_users_first_name": ("first_name",),
+        "ix_users_email": ("email",),
+    },
+    "rooms": {
+        "ix_rooms_room_name": ("room_name",),
+    },
+    "access_tokens": {
+        "ix_access_tokens_user": ("user",),
+        "ix_access_tokens_token_status": ("token", "token_status"),
+        "ix_access_tokens_status_creation_date": (
+            "token_status",
+            "creation_date",
+        ),
+    },
+    "contacts": {
+        "ix_contacts_user_contact": ("user", "contact"),
+        "ix_contacts_contact": ("contact",),
+    },
+    "room_members": {
+        "ix_room_members_room_member": ("room", "member", "admin"),
+        "ix_room_members_member_banned": ("member", "banned"),
+    },
+    "messages": {
+        "ix_messages_sender_receiver_id": ("sender", "receiver", "id"),
+        "ix_messages_room_id": ("room", "id"),
+        "ix_messages_receiver_status": ("receiver", "status"),
+    },
+    "message_search": {
+        "ix_message_search_sender": ("sender",),
+        "ix_message_search_receiver": ("receiver",),
+        "ix_message_search_room": ("room",),
+    },
+}
+
+VERSION_5_INDEXES = {
+    **VERSION_2_INDEXES,
+    "messages_archive": {
+        "ix_messages_archive_sender_receiver_id": ("sender", "receiver", "id"),
+        "ix_messages_archive_room_id": ("room", "id"),
+    },
+}
+
+
+def _table(metadata: MetaData, name: str, *args: Any, **kwargs: Any) -> Table:
+    # the columns of `CommonMixin` and `TimestampMixin`.
+    return Table(
+        name,
+        metadata,
+        Column("id", BIGINT, primary_key=True, autoincrement=True),
+        Column("creation_date", DateTime),
+        Column("modified_date", DateTime),
+        *args,
+        **kwargs,
+    )
+
+
+def _version_1_tables(metadata: MetaData) -> None:
+    _table(
+        metadata,
+        "users",
+        Column("first_name", String(20)),
+        Column("last_name", String(20)),
+        Column("email", String(50)),
+        Column("password", String(120)),
+        Column("phone_number", String(20), nullable=True),
+        Column("bio", String(60), nullable=True),
+        Column("profile_picture", String(220), nullable=True),
+        Column("chat_status", String(20), nullable=True),
+        Column("user_status", Integer, nullable=True),
+        Column("user_role", String(20), nullable=True),
+        Fulltext("first_name, last_name, email"),
+    )
+    _table(
+        metadata,
+        "rooms",
+        Column("room_name", String(20)),
+        Column("description", String(60)),
+        Column("invite_link", String(220)),
+        Column("link_expire_date", DateTime),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "access_tokens",
+        Column("user", ForeignKey("users.id")),
+        Column("token", String(220)),
+        Column("token_status", Integer, nullable=True),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "contacts",
+        Column("user", ForeignKey("users.id")),
+        Column("contact", ForeignKey("users.id")),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "room_members",
+        Column("room", ForeignKey("rooms.id")),
+        Column("member", ForeignKey("users.id")),
+        Column("banned", Integer),
+        Column("admin", Integer),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "messages",
+        Column("sender", ForeignKey("users.id")),
+        Column("receiver", ForeignKey("users.id")),
+        Column("room", ForeignKey("rooms.id")),
+        Column("content", String(1024)),
+        Column("status", Integer),
+        Column("message_type", String(10)),
+        Column("media", String(220), nullable=True),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "message_search",
+        Column("sender", ForeignKey("users.id")),
+        Column("receiver", ForeignKey("users.id")),
+        Column("room", ForeignKey("rooms.id")),
+        Column("content", TEXT(charset="utf8mb4")),
+        Fulltext("content"),
+    )
+    _table(
+        metadata,
+        "chat_summaries",
+        Column("owner", ForeignKey("users.id")),
+        Column("peer", ForeignKey("users.id")),
+        Column("last_message_id", BIGINT),
+        Column("last_content", String(1024)),
+        Column("last_message_time", DateTime),
+        Column("nb_unread", Integer),
+        UniqueConstraint("owner", "peer", name="uq_chat_summaries_owner_peer"),
+        **ROWSTORE,
+    )
+    _table(
+        metadata,
+        "media_blobs",
+        Column("digest", String(64)),
+        Column("size", BIGINT),
+        Column("ref_count", Integer),
+        Column("stored", Integer),
+        UniqueConstraint("digest", name="uq_media_blobs_digest"),
+        **ROWSTORE,
+    )
+
+
+def _messages_archive_table(metadata: MetaData) -> None:
+    _table(
+        metadata,
+        "messages_archive",
+        Column("sender", ForeignKey("users.id")),
+        Column("receiver", ForeignKey("users.id")),
+        Column("room", ForeignKey("rooms.id")),
+        Column("content", TEXT(charset="utf8mb4")),
+        Column("status", Integer),
+        Column("message_type", String(10)),
+        Column("media", String(220), nullable=True),
+    )
+
+
+def _add_indexes(
+    metadata: MetaData, indexes: dict[str, dict[str, tuple[str, ...]]]
+) -> MetaData:
+    for table_name, table_indexes in indexes.items():
+        table = metadata.tables[table_name]
+        for name, columns in table_indexes.items():
+            Index(name, *(table.c[column] for column in columns))
+    return metadata
+
+
+def version_1() -> MetaData:
+    """
+    The tables of schema version 1, with their single-column indexes.
+
+    Returns:
+        MetaData: A new metadata of the tables.
+    """
+    metadata = MetaData()
+    _version_1_tables(metadata)
+    return _add_indexes(metadata, VERSION_1_INDEXES)
+
+
+def version_2() -> MetaData:
+    """
+    The tables of schema version 2, with the composite indexes of the
+    queries.
+
+    Returns:
+        MetaData: A new metadata of the tables.
+    """
+    metadata = MetaData()
+    _version_1_tables(metadata)
+    return _add_indexes(metadata, VERSION_2_INDEXES)
+
+
+def version_5() -> MetaData:
+    """
+    The tables of schema version 5, with the messages archive.
+
+    Returns:
+        MetaData: A new metadata of the tables.
+    """
+    metadata = MetaData()
+    _version_1_tables(metadata)
+    _messages_archive_table(metadata)
+    return _add_indexes(metadata, VERSION_5_INDEXES)
@@ -0,0 +1,116 @@
+"""Precompiled SQL statements registry module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import re
+from sqlalchemy import (
+    bindparam,
+    text,
+)
+from sqlalchemy.sql.elements import (
+    TextClause,
+)
+from sqlalchemy.sql.selectable import (
+    TextualSelect,
+)
+from sqlalchemy.types import (
+    TypeEngine,
+)
+from typing import (
+    Optional,
+    Union,
+)
+
+Statement = Union[TextClause, TextualSelect]
+
+# every statement of the CRUD modules, by name.
+STATEMENTS: dict[str, Statement] = {}
+# the arguments of every statement, to derive their archive statements.
+_DEFINITIONS: dict[str, tuple[str, dict, dict]] = {}
+
+
+def statement(
+    name: str,
+    query: str,
+    params: Optional[dict[str, type[TypeEngine]]] = None,
+    columns: Optional[dict[str, type[TypeEngine]]] = None,
+) -> Statement:
+    """
+    Build and register a raw SQL statement once, at import time.
+
+    A `text(query)` built on every call parses its bind parameters again,
+    and has to be looked up in the compiled cache of the engine by a new
+    key. A registered statement is parsed once, and compiled once per
+    engine. The type of every bind parameter must be declared, and the
+    types of the result columns can be, which are then matched by name.
+
+    Args:
+        name (str) : The unique name of the statement, e.g. `users.find`.
+        query (str) : The SQL query, with `:name` bind parameters.
+        params (Optional[dict[str, type[TypeEngine]]]) : The type of every bind parameter.
+        columns (Optional[dict[str, type[TypeEngine]]]) : The type of some result columns.
+
+    Returns:
+        Statement: The statement to pass to `session.execute`.
+    """
+    if name in STATEMENTS:
+        raise ValueError(f"The statement `{name}` is already registered.")
+    clause = text(query)
+    params = params or {}
+    # pylint: disable=W0212
+    if set(params) != set(clause._bindparams):
+        raise ValueError(
+            f"The parameters of `{name}` must be typed exactly:"
+            f" {sorted(clause._bindparams)}."
+        )
+    clause = clause.bindparams(
+        *[bindparam(key, type_=type_) for key, type_ in params.items()]
+    )
+    if columns:
+        clause = clause.columns(**columns)
+    STATEMENTS[name] = clause
+    _DEFINITIONS[name] = (query, params, columns or {})
+    return clause
+
+
+def archive_statement(name: str) -> Statement:
+    """
+    Build and register the copy of a statement on the `messages_archive`
+    table instead of the `messages` table.
+
+    The archive is read as `messages`, so the rest of the query, e.g. the
+    qualified columns and the joins, is unchanged.
+
+    Args:
+        name (str) : The name of a registered statement.
+
+    Returns:
+        Statement: The archive statement, named `<name>_archive`.
+    """
+    query, params, columns = _DEFINITIONS[name]
+    query = re.sub(
+        r"\bFROM(\s+)messages\b", r"FROM\1messages_archive AS messages", query
+    )
+    query = re.sub(
+        r"\bUPDATE(\s+)messages\b", r"UPDATE\1messages_archive", query
+    )
+    return statement(f"{name}_archive", query, params, columns)
+
+
+def like_prefix(search: str) -> str:
+    """
+    Build the LIKE pattern of a prefix search.
+
+    A `LIKE 'prefix%'` predicate is a range scan on the index of its column,
+    unlike `INSTR` or a leading wildcard, which evaluate every row. The
+    wildcards of the search are escaped with the default escape character.
+
+    Args:
+        search (str) : The prefix to look for.
+
+    Returns:
+        str: The pattern to bind to the `LIKE` predicate.
+    """
+    for char in ("\\", "%", "_"):
+        search = search.replace(char, f"\\{char}")
+    return f"{search}%"
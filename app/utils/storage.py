@@ -0,0 +1,603 @@
+"""Media storage module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411,C0415,E0401
+from abc import (
+    ABC,
+    abstractmethod,
+)
+import asyncio
+import datetime
+from fastapi import (
+    FastAPI,
+)
+import hashlib
+import json
+import os
+from pathlib import (
+    Path,
+)
+import shutil
+import tempfile
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Optional,
+    Union,
+)
+
+from app.config import (
+    settings,
+)
+
+# the buckets of the server, i.e. Deta drives or S3 buckets.
+SENT_IMAGES_BUCKET = "sent-images"
+PROFILE_IMAGES_BUCKET = "profile-images"
+
+
+class FileInfo:  # pylint: disable=R0903
+    """
+    A class that holds the metadata of a stored file.
+
+    Args:
+        size (int) : The size in bytes of the file.
+        etag (str) : A quoted strong entity tag that changes with the content.
+        last_modified (datetime) : The time the file was written, if known.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        etag: str,
+        last_modified: Optional[datetime.datetime] = None,
+    ):
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+async def slice_chunks(
+    chunks: AsyncIterator[bytes], offset: int, length: Optional[int]
+) -> AsyncIterator[bytes]:
+    """
+    Skip the first bytes of a stream of chunks and stop after a length.
+
+    Args:
+        chunks (AsyncIterator[bytes]) : The chunks of a file.
+        offset (int) : The number of bytes to skip.
+        length (Optional[int]) : The number of bytes to yield, None for all.
+
+    Returns:
+        AsyncIterator[bytes]: The chunks of the range.
+    """
+    async for chunk in chunks:
+        if offset >= len(chunk):
+            offset -= len(chunk)
+            continue
+        chunk = chunk[offset:]
+        offset = 0
+        if length is not None:
+            chunk = chunk[:length]
+            length -= len(chunk)
+        if chunk:
+            yield chunk
+        if length == 0:
+            break
+
+
+class Storage(ABC):
+    """
+    An abstract base class for the async media storage drivers.
+
+    Files are addressed by name, e.g. `/chat/images/user/1/image_x.png`,
+    and read back, whole or by range, as an async iterator of chunks so a
+    large image is never loaded in memory at once.
+
+    Args:
+        bucket (str) : The bucket of the files.
+        chunk_size (int) : The number of bytes read at once.
+    """
+
+    def __init__(self, bucket: str, chunk_size: int):
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+
+    @abstractmethod
+    async def put(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        """
+        Store a file, replacing any file of the same name.
+
+        Args:
+            name (str) : The file name.
+            data (Union[bytes, BinaryIO]) : The content or a file object.
+
+        Returns:
+            FileInfo: The metadata of the stored content, even if it has
+            been replaced since.
+        """
+
+    @abstractmethod
+    async def get(
+        self, name: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        """
+        Read a file, or a range of it.
+
+        Args:
+            name (str) : The file name.
+            offset (int) : The first byte to read.
+            length (Optional[int]) : The number of bytes to read, None for all.
+
+        Returns:
+            Optional[AsyncIterator[bytes]]: The chunks of the file, or None
+            if it does not exist.
+        """
+
+    @abstractmethod
+    async def stat(self, name: str) -> Optional[FileInfo]:
+        """
+        Read the metadata of a file.
+
+        Args:
+            name (str) : The file name.
+
+        Returns:
+            Optional[FileInfo]: The metadata, or None if it does not exist.
+        """
+
+    @abstractmethod
+    async def delete(self, name: str) -> None:
+        """
+        Delete a file, if it exists.
+
+        Args:
+            name (str) : The file name.
+        """
+
+    async def close(self) -> None:
+        """
+        Release the resources of the driver.
+        """
+
+
+class LocalStorage(Storage):
+    """
+    A class that stores files in a local directory.
+
+    A file is stored under the digest of its name, in two levels of
+    sharded directories, so no directory grows past a few thousand entries
+    and a name can't escape the root. Files are written to a temporary
+    file first and renamed, so a reader never sees a partial file. The
+    blocking calls run in the default thread pool.
+
+    Args:
+        root (Path) : The directory of the bucket.
+        chunk_size (int) : The number of bytes read at once.
+    """
+
+    def __init__(self, root: Union[str, Path], chunk_size: int):
+        self.root = Path(root)
+        super().__init__(self.root.name, chunk_size)
+
+    def path(self, name: str) -> Path:
+        """
+        Get the path of a file.
+
+        Args:
+            name (str) : The file name.
+
+        Returns:
+            Path: The sharded path of the file.
+        """
+        digest = hashlib.sha1(name.lstrip("/").encode()).hexdigest()
+        return (
+            self.root
+            / digest[:2]
+            / digest[2:4]
+            / (digest + Path(name).suffix.lower())
+        )
+
+    @staticmethod
+    def _info(stat: os.stat_result) -> FileInfo:
+        # files are replaced by a rename, so a new content has a new mtime.
+        return FileInfo(
+            stat.st_size,
+            f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+            datetime.datetime.fromtimestamp(
+                stat.st_mtime, datetime.timezone.utc
+            ),
+        )
+
+    def _write(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(  # pylint: disable=R1732
+            dir=path.parent, delete=False
+        )
+        try:
+            with file:
+                if isinstance(data, (bytes, bytearray)):
+                    file.write(data)
+                else:
+                    shutil.copyfileobj(data, file)
+            # the rename keeps the mtime of the written file.
+            info = self._info(os.stat(file.name))
+            os.replace(file.name, path)
+            return info
+        except BaseException:
+            os.unlink(file.name)
+            raise
+
+    def _open(self, name: str, offset: int) -> Optional[BinaryIO]:
+        try:
+            file = open(self.path(name), "rb")  # pylint: disable=R1732
+        except FileNotFoundError:
+            return None
+        file.seek(offset)
+        return file
+
+    def _stat(self, name: str) -> Optional[FileInfo]:
+        try:
+            stat = self.path(name).stat()
+        except FileNotFoundError:
+            return None
+        return self._info(stat)
+
+    def _unlink(self, name: str) -> None:
+        self.path(name).unlink(missing_ok=True)
+
+    async def put(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._write, name, data
+        )
+
+    async def get(
+        self, name: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, self._open, name, offset)
+        if file is None:
+            return None
+        return self._read(file, length)
+
+    async def _read(
+        self, file: BinaryIO, length: Optional[int]
+    ) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        try:
+            while length is None or length > 0:
+                size = (
+                    self.chunk_size
+                    if length is None
+                    else min(self.chunk_size, length)
+                )
+                chunk = await loop.run_in_executor(None, file.read, size)
+                if not chunk:
+                    break
+                if length is not None:
+                    length -= len(chunk)
+                yield chunk
+        finally:
+            file.close()
+
+    async def stat(self, name: str) -> Optional[FileInfo]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._stat, name
+        )
+
+    async def delete(self, name: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._unlink, name
+        )
+
+
+class S3Storage(Storage):
+    """
+    A class that stores files in an S3 compatible bucket, e.g. AWS S3 or
+    MinIO, through `aiobotocore`, which is only installed with the `s3`
+    extra.
+
+    Args:
+        bucket (str) : The bucket name.
+        chunk_size (int) : The number of bytes read at once.
+        endpoint_url (str) : The S3 endpoint, None for AWS.
+        access_key_id (str) : The access key id.
+        secret_access_key (str) : The secret access key.
+        region (str) : The bucket region.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        bucket: str,
+        chunk_size: int,
+        endpoint_url: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        region: Optional[str] = None,
+    ):
+        super().__init__(bucket, chunk_size)
+        self.endpoint_url = endpoint_url
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self._client_context: Any = None
+        self._client: Any = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def key(name: str) -> str:
+        """
+        Get the object key of a file.
+
+        Args:
+            name (str) : The file name.
+
+        Returns:
+            str: The object key.
+        """
+        return name.lstrip("/")
+
+    async def _get_client(self) -> Any:
+        async with self._lock:
+            if self._client is None:
+                from aiobotocore.session import (  # noqa: WPS433
+                    get_session,
+                )
+
+                self._client_context = get_session().create_client(
+                    "s3",
+                    endpoint_url=self.endpoint_url,
+                    aws_access_key_id=self.access_key_id,
+                    aws_secret_access_key=self.secret_access_key,
+                    region_name=self.region,
+                )
+                self._client = await self._client_context.__aenter__()
+        return self._client
+
+    async def put(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        client = await self._get_client()
+        if not isinstance(data, (bytes, bytearray)):
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, data.read
+            )
+        response = await client.put_object(
+            Bucket=self.bucket, Key=self.key(name), Body=data
+        )
+        return FileInfo(len(data), response["ETag"])
+
+    async def get(
+        self, name: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        client = await self._get_client()
+        kwargs = {"Bucket": self.bucket, "Key": self.key(name)}
+        if length is not None:
+            kwargs["Range"] = f"bytes={offset}-{offset + length - 1}"
+        elif offset:
+            kwargs["Range"] = f"bytes={offset}-"
+        try:
+            response = await client.get_object(**kwargs)
+        except client.exceptions.NoSuchKey:
+            return None
+        return self._read(response["Body"])
+
+    async def stat(self, name: str) -> Optional[FileInfo]:
+        client = await self._get_client()
+        try:
+            response = await client.head_object(
+                Bucket=self.bucket, Key=self.key(name)
+            )
+        except client.exceptions.ClientError as ex:
+            if ex.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return FileInfo(
+            response["ContentLength"],
+            response["ETag"],
+            response["LastModified"],
+        )
+
+    async def _read(self, body: Any) -> AsyncIterator[bytes]:
+        try:
+            while chunk := await body.read(self.chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, name: str) -> None:
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    async def close(self) -> None:
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self._client = None
+
+
+class DetaStorage(Storage):
+    """
+    A class that stores files in a Deta drive. The blocking calls of the
+    Deta SDK run in the default thread pool.
+
+    Deta drives have no metadata, so every file is written with a small
+    sidecar that holds its size and entity tag, and `stat` reads it instead
+    of downloading the file.
+
+    Args:
+        bucket (str) : The drive name.
+        chunk_size (int) : The number of bytes read at once.
+        project_key (str) : The Deta project key.
+    """
+
+    def __init__(self, bucket: str, chunk_size: int, project_key: str):
+        from deta import (  # noqa: WPS433
+            Deta,
+        )
+
+        super().__init__(bucket, chunk_size)
+        self.drive = Deta(project_key).Drive(bucket)
+
+    @staticmethod
+    def meta_name(name: str) -> str:
+        """
+        Get the name of the metadata sidecar of a file.
+
+        Args:
+            name (str) : The file name.
+
+        Returns:
+            str: The sidecar name.
+        """
+        return f"{name}.meta.json"
+
+    def _describe(self, data: Union[bytes, BinaryIO]) -> FileInfo:
+        digest = hashlib.sha256()
+        if isinstance(data, bytes):
+            digest.update(data)
+            size = len(data)
+        else:
+            data.seek(0)
+            size = 0
+            while chunk := data.read(self.chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+            data.seek(0)
+        return FileInfo(size, f'"{digest.hexdigest()}"')
+
+    def _write_info(self, name: str, info: FileInfo) -> None:
+        meta = json.dumps({"size": info.size, "etag": info.etag})
+        self.drive.put(self.meta_name(name), meta.encode())
+
+    async def put(self, name: str, data: Union[bytes, BinaryIO]) -> FileInfo:
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(None, self._describe, data)
+        # without a sidecar, a stat hashes the file, it is never stale.
+        await loop.run_in_executor(
+            None, self.drive.delete, self.meta_name(name)
+        )
+        await loop.run_in_executor(None, self.drive.put, name, data)
+        await loop.run_in_executor(None, self._write_info, name, info)
+        return info
+
+    async def get(
+        self, name: str, offset: int = 0, length: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        body = await asyncio.get_running_loop().run_in_executor(
+            None, self.drive.get, name
+        )
+        if body is None:
+            return None
+        # Deta drives can't read a range, the skipped bytes are downloaded.
+        if offset or length is not None:
+            return slice_chunks(self._read(body), offset, length)
+        return self._read(body)
+
+    async def stat(self, name: str) -> Optional[FileInfo]:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(
+            None, self.drive.get, self.meta_name(name)
+        )
+        if body is not None:
+            try:
+                meta = json.loads(
+                    b"".join([c async for c in self._read(body)])
+                )
+                return FileInfo(meta["size"], meta["etag"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        # a file written before its sidecar is hashed once.
+        chunks = await self.get(name)
+        if chunks is None:
+            return None
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+        info = FileInfo(size, f'"{digest.hexdigest()}"')
+        await loop.run_in_executor(None, self._write_info, name, info)
+        return info
+
+    async def _read(self, body: Any) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        chunks = body.iter_chunks(self.chunk_size)
+        try:
+            while chunk := await loop.run_in_executor(None, next, chunks, b""):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, name: str) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.drive.delete, name)
+        await loop.run_in_executor(
+            None, self.drive.delete, self.meta_name(name)
+        )
+
+
+# the storage of every bucket, shared by the routers of a worker.
+_storages: dict[str, Storage] = {}
+
+
+def get_storage(bucket: str) -> Storage:
+    """
+    Get the storage of a bucket, using the driver set by `STORAGE_BACKEND`.
+
+    The files of a remote storage are cached on the local disk when
+    `MEDIA_CACHE_ENABLED` is set.
+
+    Args:
+        bucket (str) : The bucket name.
+
+    Returns:
+        Storage: The storage of the bucket.
+    """
+    storage = _storages.get(bucket)
+    if storage is not None:
+        return storage
+    backend = settings.STORAGE_BACKEND.lower()
+    if backend == "local":
+        storage = LocalStorage(
+            settings.STORAGE_ROOT / bucket, settings.STORAGE_CHUNK_SIZE
+        )
+    elif backend == "s3":
+        storage = S3Storage(
+            bucket,
+            settings.STORAGE_CHUNK_SIZE,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+        )
+    elif backend == "deta":
+        storage = DetaStorage(
+            bucket, settings.STORAGE_CHUNK_SIZE, settings.DETA_PROJECT_KEY
+        )
+    else:
+        raise ValueError(f"Unknown storage backend `{backend}`.")
+    if settings.MEDIA_CACHE_ENABLED and backend != "local":
+        from app.utils.media_cache import (  # noqa: WPS433
+            CACHES,
+            CachedStorage,
+        )
+
+        storage = CACHES[bucket] = CachedStorage(
+            storage,
+            settings.MEDIA_CACHE_DIR,
+            settings.MEDIA_CACHE_MAX_BYTES,
+            settings.MEDIA_CACHE_MAX_FILE_SIZE,
+            settings.MEDIA_CACHE_REVALIDATE_AFTER,
+        )
+    _storages[bucket] = storage
+    return storage
+
+
+async def close_storage_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the storage drivers of the worker.
+
+    :param app: fastAPI application.
+    """
+    for storage in _storages.values():
+        await storage.close()
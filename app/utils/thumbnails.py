@@ -0,0 +1,270 @@
+"""Resized image variants module."""
+
+# conflict between isort and pylint
+# pylint: disable=C0411,C0415,E0401
+import asyncio
+from concurrent.futures import (
+    ProcessPoolExecutor,
+)
+from enum import Enum
+from fastapi import (
+    FastAPI,
+)
+import hashlib
+import io
+import logging
+from typing import (
+    Optional,
+)
+
+from app.config import (
+    settings,
+)
+from app.utils.storage import (
+    Storage,
+)
+
+logger = logging.getLogger(__name__)
+
+# variants are WebP, which keeps the alpha channel of avatars.
+VARIANT_MEDIA_TYPE = "image/webp"
+
+
+class ImageVariant(str, Enum):
+    """
+    Enum class to define the resized variants of an image.
+
+    Args:
+        THUMB (str) : A square bounded thumbnail, e.g. for the chat list.
+        PREVIEW (str) : A larger preview, e.g. for a conversation.
+    """
+
+    THUMB = "thumb"
+    PREVIEW = "preview"
+
+
+# the leading bytes of the image formats that are resized.
+IMAGE_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"BM",
+)
+
+VARIANT_SIZES = {
+    ImageVariant.THUMB: settings.THUMBNAIL_SIZE,
+    ImageVariant.PREVIEW: settings.PREVIEW_SIZE,
+}
+
+
+def is_image(data: bytes) -> bool:
+    """
+    Check whether some bytes start like an image that can be resized.
+
+    Args:
+        data (bytes) : The file content.
+
+    Returns:
+        bool: True for a PNG, JPEG, GIF, BMP or WebP image.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return True
+    return data.startswith(IMAGE_SIGNATURES)
+
+
+def variant_name(
+    name: str, variant: ImageVariant, version: Optional[str] = None
+) -> str:
+    """
+    Get the file name of a variant, stored next to its original.
+
+    The variants of an image replaced in place are named after the entity
+    tag of the original they were rendered from, so the variants of a
+    replaced image are never served for the new one.
+
+    Args:
+        name (str) : The file name of the original image.
+        variant (ImageVariant) : The variant.
+        version (Optional[str]) : The entity tag of a replaceable original.
+
+    Returns:
+        str: The file name of the variant.
+    """
+    stem = name.rsplit(".", 1)[0] if "." in name.rsplit("/", 1)[-1] else name
+    if version is None:
+        return f"{stem}_{variant.value}.webp"
+    digest = hashlib.sha1(version.encode()).hexdigest()[:16]
+    return f"{stem}_{variant.value}_{digest}.webp"
+
+
+def render_variants(data: bytes, sizes: dict[str, int]) -> dict[str, bytes]:
+    """
+    Resize an image to every size. Runs in a worker process.
+
+    Images are never upscaled, and keep their aspect ratio and orientation.
+
+    Args:
+        data (bytes) : The original image.
+        sizes (dict[str, int]) : The bounding box size of every variant.
+
+    Returns:
+        dict[str, bytes]: The WebP image of every variant.
+    """
+    from PIL import (  # noqa: WPS433
+        Image,
+        ImageOps,
+    )
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        variants = {}
+        for variant, size in sizes.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            resized.save(output, "WEBP", quality=80, method=4)
+            variants[variant] = output.getvalue()
+    return variants
+
+
+class ThumbnailGenerator:
+    """
+    A class that renders the resized variants of the uploaded images in a
+    pool of processes, and stores them next to their original.
+
+    Rendering is CPU bound, so it never runs in the worker process, and it
+    is done in the background since the original can be served meanwhile.
+    At most `max_pending` images wait for the pool, the others are skipped
+    and only served in full size. It requires Pillow, without which no
+    variant is rendered.
+
+    Args:
+        max_workers (int) : The number of processes.
+        max_pending (int) : The maximum number of images waiting to be rendered.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: set[asyncio.Task] = set()
+        try:
+            import PIL  # noqa: F401,WPS433
+        except ImportError:
+            logger.warning("Pillow is not installed, no thumbnails.")
+            self.enabled = False
+        else:
+            self.enabled = True
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers)
+        return self._executor
+
+    async def generate(
+        self,
+        storage: Storage,
+        name: str,
+        data: bytes,
+        version: Optional[str] = None,
+    ) -> None:
+        """
+        Render and store the variants of an image.
+
+        Args:
+            storage (Storage) : The storage of the image.
+            name (str) : The file name of the original image.
+            data (bytes) : The original image.
+            version (Optional[str]) : The entity tag of a replaceable original.
+        """
+        sizes = {
+            variant.value: size for variant, size in VARIANT_SIZES.items()
+        }
+        variants = await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), render_variants, data, sizes
+        )
+        for variant, image in variants.items():
+            await storage.put(
+                variant_name(name, ImageVariant(variant), version), image
+            )
+
+    async def delete(
+        self, storage: Storage, name: str, version: Optional[str] = None
+    ) -> None:
+        """
+        Delete the variants of an image, e.g. once it has been replaced.
+
+        Args:
+            storage (Storage) : The storage of the image.
+            name (str) : The file name of the original image.
+            version (Optional[str]) : The entity tag of a replaceable original.
+        """
+        for variant in ImageVariant:
+            await storage.delete(variant_name(name, variant, version))
+
+    async def _generate(
+        self,
+        storage: Storage,
+        name: str,
+        data: bytes,
+        version: Optional[str],
+    ) -> None:
+        try:
+            await self.generate(storage, name, data, version)
+        except Exception as ex:  # pylint: disable=W0703
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args!r}"  # noqa: E501
+            logger.error(message)
+
+    def submit(
+        self,
+        storage: Storage,
+        name: str,
+        data: bytes,
+        version: Optional[str] = None,
+    ) -> None:
+        """
+        Render and store the variants of an image in the background.
+
+        Args:
+            storage (Storage) : The storage of the image.
+            name (str) : The file name of the original image.
+            data (bytes) : The original image.
+            version (Optional[str]) : The entity tag of a replaceable original.
+        """
+        if not self.enabled or len(self._tasks) >= self.max_pending:
+            return
+        # a file that is not an image is never decoded.
+        if not is_image(data):
+            return
+        task = asyncio.create_task(
+            self._generate(storage, name, data, version)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """
+        Wait for the pending images and release the pool.
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+thumbnail_generator = ThumbnailGenerator(
+    settings.THUMBNAIL_WORKERS, settings.THUMBNAIL_MAX_PENDING
+)
+
+
+async def close_thumbnails_app(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Renders the pending variants and releases the worker's process pool.
+
+    :param app: fastAPI application.
+    """
+    await thumbnail_generator.close()
@@ -11,9 +11,6 @@ from sqlalchemy.ext.asyncio import (
     AsyncSession,
 )
 
-from app.config import (
-    settings,
-)
 from app.utils.dependencies import (
     get_db_autocommit_session_socket,
 )
@@ -39,19 +36,20 @@ async def websocket_room_endpoint(
         # add user
         # the user on the
         await websocket.accept()
-        conn = await settings.redis_conn()
-        pubsub = conn.pubsub()
+        broker = websocket.app.state.pub_sub_broker
 
         consumer_task = consumer_handler(
-            connection=conn,
+            broker=broker,
             topic=room_name,
             web_socket=websocket,
             sender_id=sender_id,
             receiver_id=None,
             session=session,
+            chatgpt_relay=websocket.app.state.chatgpt_relay,
+            message_writer=websocket.app.state.message_writer,
         )
         producer_task = producer_handler(
-            pub_sub=pubsub, topic=room_name, web_socket=websocket
+            broker=broker, topic=room_name, web_socket=websocket
         )
         done, pending = await asyncio.wait(
             [consumer_task, producer_task],
@@ -67,9 +65,6 @@ async def websocket_room_endpoint(
         logger.error(message)
         logger.warning("Disconnecting Websocket")
         await websocket.close()
-        if conn:
-            await conn.close()
-            del conn
 
 
 @router.websocket("/ws/chat/{sender_id}/{receiver_id}")
@@ -82,18 +77,19 @@ async def websocket_contact_chat_endpoint(
     try:
         sorted_chat = sorted([sender_id, receiver_id])
         await websocket.accept()
-        conn = await settings.redis_conn()
-        pubsub = conn.pubsub()
+        broker = websocket.app.state.pub_sub_broker
         consumer_task = consumer_handler(
-            connection=conn,
+            broker=broker,
             topic="_".join(map(lambda val: str(val), sorted_chat)),
             web_socket=websocket,
             sender_id=sender_id,
             receiver_id=receiver_id,
             session=session,
+            chatgpt_relay=websocket.app.state.chatgpt_relay,
+            message_writer=websocket.app.state.message_writer,
         )
         producer_task = producer_handler(
-            pub_sub=pubsub,
+            broker=broker,
             topic="_".join(map(lambda val: str(val), sorted_chat)),
             web_socket=websocket,
         )
@@ -111,6 +107,3 @@ async def websocket_contact_chat_endpoint(
         logger.error(message)
         logger.warning("Disconnecting Websocket")
         await websocket.close()
-        if conn:
-            await conn.close()
-            del conn
@@ -0,0 +1,118 @@
+"""
+Measure the CPU cost of idle web sockets.
+
+Every simulated socket runs the real `producer_handler` on a topic where
+nothing is published, and the script reports the CPU time the process
+burnt per 1k idle sockets.
+
+Usage:
+    python -m benchmarks.idle_sockets --sockets 1000 --duration 10
+    python -m benchmarks.idle_sockets --sockets 1000 --redis
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import argparse
+import asyncio
+from starlette.websockets import (
+    WebSocketState,
+)
+import time
+
+from app.config import (
+    settings,
+)
+from app.utils.pub_sub_handlers import (
+    producer_handler,
+)
+
+
+class IdleWebSocket:
+    """
+    A web socket stand-in that counts the frames it is sent.
+    """
+
+    def __init__(self):
+        self.application_state = WebSocketState.CONNECTED
+        self.sent_frames = 0
+
+    async def send_text(self, data: str) -> None:
+        self.sent_frames += 1
+
+
+class InMemoryBroker:
+    """
+    A broker stand-in that never receives a message.
+    """
+
+    async def subscribe(self, topic: str) -> asyncio.Queue:
+        return asyncio.Queue()
+
+    async def unsubscribe(self, topic: str, queue: asyncio.Queue) -> None:
+        return None
+
+
+async def run(sockets: int, duration: float, use_redis: bool) -> None:
+    if use_redis:
+        from aioredis import (
+            Redis,
+        )
+
+        from app.utils.pub_sub_broker import (
+            PubSubBroker,
+        )
+
+        broker = PubSubBroker(
+            Redis(connection_pool=settings.redis_pool()),
+            settings.WS_QUEUE_SIZE,
+            settings.PUB_SUB_READ_TIMEOUT,
+        )
+        broker.start()
+    else:
+        broker = InMemoryBroker()
+    web_sockets = [IdleWebSocket() for _ in range(sockets)]
+    tasks = [
+        asyncio.create_task(
+            producer_handler(broker, f"idle_{index}", web_socket)
+        )
+        for index, web_socket in enumerate(web_sockets)
+    ]
+    # let every socket subscribe before measuring.
+    await asyncio.sleep(1.0)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if use_redis:
+        await broker.close()
+
+    per_1k = cpu_time / (sockets / 1000)
+    print(f"idle sockets:            {sockets}")
+    print(f"wall time:               {wall_time:.2f}s")
+    print(f"cpu time:                {cpu_time:.4f}s")
+    print(f"cpu per 1k sockets:      {per_1k:.4f}s")
+    print(f"cpu % per 1k sockets:    {100 * per_1k / wall_time:.3f}%")
+    print(
+        f"heartbeat frames sent:   {sum(w.sent_frames for w in web_sockets)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--redis",
+        action="store_true",
+        help="subscribe through a real PubSubBroker instead of in memory.",
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.sockets, args.duration, args.redis))
+
+
+if __name__ == "__main__":
+    main()
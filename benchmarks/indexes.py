@@ -0,0 +1,194 @@
+"""
+Compare the old and the new index sets of the hot tables.
+
+The `messages` and `room_members` tables are created on an in-memory
+SQLite database with the single-column indexes of every column like
+before, or with the composite indexes of the queries. `--messages`
+messages are inserted in batches like the message writer does, then the
+hot query shapes are timed. The query plans differ from SingleStore's,
+but the cost of maintaining every index on insert is the same.
+
+Usage:
+    python -m benchmarks.indexes --messages 200000
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import argparse
+import random
+from sqlalchemy import (
+    create_engine,
+    text,
+)
+import statistics
+import time
+
+TABLES = (
+    """
+    CREATE TABLE messages (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      sender INTEGER,
+      receiver INTEGER,
+      room INTEGER,
+      content VARCHAR(1024),
+      status INTEGER,
+      message_type VARCHAR(10),
+      media VARCHAR(220),
+      creation_date DATETIME
+    )
+    """,
+    """
+    CREATE TABLE room_members (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      room INTEGER,
+      member INTEGER,
+      banned INTEGER,
+      admin INTEGER
+    )
+    """,
+)
+
+INDEXES = {
+    "before": (
+        "messages (sender)",
+        "messages (receiver)",
+        "messages (room)",
+        "messages (content)",
+        "messages (status)",
+        "messages (message_type)",
+        "messages (sender, receiver, id)",
+        "messages (room, id)",
+        "room_members (room)",
+        "room_members (member)",
+        "room_members (banned)",
+        "room_members (admin)",
+        "room_members (room, member)",
+    ),
+    "after": (
+        "messages (sender, receiver, id)",
+        "messages (room, id)",
+        "messages (receiver, status)",
+        "room_members (room, member, admin)",
+        "room_members (member, banned)",
+    ),
+}
+
+QUERIES = {
+    "conversation page": """
+        SELECT * FROM (
+          SELECT * FROM (
+            SELECT id, content FROM messages
+            WHERE sender = :user AND receiver = :peer AND id < :cursor
+            ORDER BY id DESC LIMIT 50
+          )
+          UNION ALL
+          SELECT * FROM (
+            SELECT id, content FROM messages
+            WHERE sender = :peer AND receiver = :user AND id < :cursor
+            ORDER BY id DESC LIMIT 50
+          )
+        ) ORDER BY id DESC LIMIT 50
+    """,
+    "room page": """
+        SELECT messages.id, messages.content, room_members.admin
+        FROM messages
+        LEFT JOIN room_members
+        ON room_members.room = messages.room
+        AND room_members.member = messages.sender
+        WHERE messages.room = :room AND messages.id < :cursor
+        ORDER BY messages.id DESC LIMIT 50
+    """,
+    "unread messages": """
+        SELECT COUNT(*) FROM messages
+        WHERE receiver = :user AND status = 1
+    """,
+    "rooms of a member": """
+        SELECT room FROM room_members
+        WHERE member = :user AND banned = 0
+    """,
+}
+
+
+def run(messages: int, users: int, rooms: int, queries: int) -> None:
+    rng = random.Random(42)
+    for name, indexes in INDEXES.items():
+        engine = create_engine("sqlite://", future=True)
+        with engine.begin() as conn:
+            for table in TABLES:
+                conn.execute(text(table))
+            for number, index in enumerate(indexes):
+                conn.execute(text(f"CREATE INDEX ix_{number} ON {index}"))
+            conn.execute(
+                text(
+                    "INSERT INTO room_members (room, member, banned, admin)"
+                    " VALUES (:room, :member, 0, :admin)"
+                ),
+                [
+                    {"room": room, "member": member, "admin": member == 0}
+                    for room in range(rooms)
+                    for member in rng.sample(range(users), 20)
+                ],
+            )
+
+        rows = []
+        for _ in range(messages):
+            sender = rng.randrange(users)
+            direct = rng.random() < 0.8
+            rows.append(
+                {
+                    "sender": sender,
+                    "receiver": rng.randrange(users) if direct else None,
+                    "room": None if direct else rng.randrange(rooms),
+                    "content": f"message {rng.getrandbits(64):x}",
+                    "status": rng.randrange(2),
+                    "message_type": "text",
+                    "media": "",
+                    "creation_date": "2024-01-01 00:00:00",
+                }
+            )
+        insert = text(
+            "INSERT INTO messages (sender, receiver, room, content, status,"
+            " message_type, media, creation_date) VALUES (:sender,"
+            " :receiver, :room, :content, :status, :message_type, :media,"
+            " :creation_date)"
+        )
+        start = time.perf_counter()
+        for offset in range(0, messages, 100):
+            with engine.begin() as conn:
+                conn.execute(insert, rows[offset : offset + 100])
+        elapsed = time.perf_counter() - start
+
+        print(f"indexes:                 {name}")
+        print(f"inserts per second:      {messages / elapsed:.0f}")
+        with engine.connect() as conn:
+            for label, query in QUERIES.items():
+                timings = []
+                for _ in range(queries):
+                    values = {
+                        "user": rng.randrange(users),
+                        "peer": rng.randrange(users),
+                        "room": rng.randrange(rooms),
+                        "cursor": messages,
+                    }
+                    start = time.perf_counter()
+                    conn.execute(text(query), values).fetchall()
+                    timings.append(time.perf_counter() - start)
+                print(
+                    f"{label + ' p50:':<25}"
+                    f"{statistics.median(timings) * 1e3:.3f}ms"
+                )
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.messages, args.users, args.rooms, args.queries)
+
+
+if __name__ == "__main__":
+    main()
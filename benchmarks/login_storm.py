@@ -0,0 +1,115 @@
+"""
+Measure the socket latency of a worker during a login storm.
+
+A ticker stands in for the web sockets of the worker: it wakes up every
+`--interval` seconds and records how late it is, which is the delay any
+socket frame would see. Meanwhile `--logins` concurrent logins verify a
+bcrypt password, either inline on the event loop like before, or through
+the bounded `PasswordHasher` pool.
+
+Usage:
+    python -m benchmarks.login_storm --logins 50
+    python -m benchmarks.login_storm --logins 50 --inline
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.utils.crypt_util import (
+    PasswordHasher,
+    PasswordHasherBusy,
+    get_password_hash,
+    verify_password,
+)
+
+
+async def tick(interval: float, lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(  # pylint: disable=R0913
+    logins: int,
+    inline: bool,
+    workers: int,
+    max_pending: int,
+    pool: str,
+    interval: float,
+) -> None:
+    hashed_password = get_password_hash("password")
+    hasher = PasswordHasher(workers, max_pending, pool)
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(tick(interval, lags, stop))
+    await asyncio.sleep(0.5)
+    idle_lags, lags[:] = list(lags), []
+
+    async def login() -> bool:
+        if inline:
+            return verify_password("password", hashed_password)
+        return await hasher.verify("password", hashed_password)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(login() for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    hasher.close()
+
+    rejected = sum(isinstance(r, PasswordHasherBusy) for r in results)
+    lags.sort()
+    print(f"mode:                    {'inline' if inline else pool}")
+    print(f"logins:                  {logins}")
+    print(f"rejected logins:         {rejected}")
+    print(f"storm duration:          {elapsed:.2f}s")
+    print(
+        f"idle lag p50:            {statistics.median(idle_lags) * 1e3:.2f}ms"
+    )  # noqa: E501
+    if lags:
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        print(
+            f"storm lag p50:           {statistics.median(lags) * 1e3:.2f}ms"
+        )  # noqa: E501
+        print(f"storm lag p99:           {p99 * 1e3:.2f}ms")
+        print(f"storm lag max:           {lags[-1] * 1e3:.2f}ms")
+    else:
+        print("storm lag:               the loop never woke up")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument(
+        "--inline",
+        action="store_true",
+        help="verify the passwords on the event loop like before.",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument(
+        "--pool", choices=("thread", "process"), default="thread"
+    )
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(
+        run(
+            args.logins,
+            args.inline,
+            args.workers,
+            args.max_pending,
+            args.pool,
+            args.interval,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measure the cost of a raw SQL query built on every call.
+
+The same lookup is executed `--queries` times on an in-memory SQLite
+database, either with a `text(query)` built on every call like before, or
+with a statement registered once like the CRUD modules do. Only the
+statement overhead differs, the query itself is the same.
+
+Usage:
+    python -m benchmarks.statements --queries 20000
+"""
+
+# conflict between isort and pylint
+# pylint: disable=C0411
+import argparse
+from sqlalchemy import (
+    create_engine,
+    text,
+)
+from sqlalchemy.types import (
+    Integer,
+    String,
+)
+import time
+
+from app.utils.statements import (
+    statement,
+)
+
+QUERY = """
+    SELECT id, email, first_name
+    FROM users
+    WHERE email = :email AND user_status = 1
+"""
+
+FIND_USER = statement(
+    "benchmarks.find_user",
+    QUERY,
+    params={"email": String},
+    columns={"id": Integer},
+)
+
+
+def run(queries: int) -> None:
+    engine = create_engine("sqlite://", future=True)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT,"
+                " first_name TEXT, user_status INTEGER)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO users (email, first_name, user_status)"
+                " VALUES (:email, 'user', 1)"
+            ),
+            [{"email": f"user{i}@example.com"} for i in range(100)],
+        )
+
+    with engine.connect() as connection:
+        timings = {}
+        for mode in ("text", "statement"):
+            start = time.perf_counter()
+            for i in range(queries):
+                query = text(QUERY) if mode == "text" else FIND_USER
+                connection.execute(
+                    query, {"email": f"user{i % 100}@example.com"}
+                ).first()
+            timings[mode] = time.perf_counter() - start
+    engine.dispose()
+
+    print(f"queries:                 {queries}")
+    for mode, elapsed in timings.items():
+        print(
+            f"{mode + ' per query:':<25}{elapsed / queries * 1e6:.1f}us"
+        )  # noqa: E501
+    print(
+        f"speedup:                 {timings['text'] / timings['statement']:.2f}x"
+    )  # noqa: E501
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+    run(args.queries)
+
+
+if __name__ == "__main__":
+    main()
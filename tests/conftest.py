@@ -57,7 +57,11 @@ async def _engine() -> AsyncGenerator[AsyncEngine, None]:
         AccessTokens,
     )
     from app.chats.models import (  # noqa: WPS433
+        ChatSummaries,
+        MediaBlobs,
         Messages,
+        MessagesArchive,
+        MessageSearch,
     )
     from app.contacts.models import (  # noqa: WPS433
         Contacts,
@@ -188,6 +192,8 @@ async def fastapi_app(
     chat_app.state.db_engine = _engine
     chat_app.state.db_transactional_session_factory = dbsession_factory
     chat_app.state.db_autocommit_session_factory = dbsession_factory
+    chat_app.state.db_replica_engine = None
+    chat_app.state.db_replica_session_factory = None
     async with _engine.connect() as conn:  # noqa: WPS440
         await conn.execute(text("USE test;"))
     return chat_app  # noqa: WPS331
@@ -0,0 +1,148 @@
+import pytest
+
+import json
+from prometheus_client import (
+    REGISTRY,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    create_async_engine,
+)
+import time
+
+from app.utils.cache import (
+    CACHE_INVALIDATION_TOPIC,
+    TTLCache,
+    apply_invalidation,
+    disable_caches,
+    enable_caches,
+    invalidate_room_member,
+    invalidate_user,
+    invalidations,
+    room_members_cache,
+    users_cache,
+)
+
+ENGINE = create_async_engine("mysql+aiomysql://test@localhost/test")
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_cache_expires_and_invalidates() -> None:
+    cache = TTLCache("test_ttl", maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    cache.set("none", None)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get("none") is None
+    cache.ttl = 60
+    cache.set("b", 2)
+    cache.invalidate("b")
+    assert cache.get("b") is None
+    assert len(cache) == 0
+
+
+def test_cache_counts_hits_and_misses() -> None:
+    cache = TTLCache("test_metrics", maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    labels = {"cache": "test_metrics"}
+    assert REGISTRY.get_sample_value("cache_hits_total", labels) == 1
+    assert REGISTRY.get_sample_value("cache_misses_total", labels) == 1
+
+
+def test_cache_skips_values_read_before_an_invalidation() -> None:
+    cache = TTLCache("test_epoch", maxsize=10, ttl=60)
+    epoch = cache.epoch
+    cache.invalidate("a")
+    cache.set("a", "old row", epoch)
+    assert cache.get("a") is None
+    cache.set("a", "new row", cache.epoch)
+    assert cache.get("a") == "new row"
+    epoch = cache.epoch
+    cache.clear()
+    cache.set("a", "old row", epoch)
+    assert cache.get("a") is None
+
+
+def test_disabled_cache() -> None:
+    cache = TTLCache("test_disabled", maxsize=10, ttl=60, enabled=False)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+class RecordingBroker:
+    def __init__(self) -> None:
+        self.published: list[tuple[str, str]] = []
+
+    def send(self, topic: str, message: str) -> None:
+        self.published.append((topic, message))
+
+
+@pytest.mark.anyio
+async def test_invalidation_is_published_and_applied(monkeypatch) -> None:
+    broker = RecordingBroker()
+    monkeypatch.setattr(invalidations, "broker", broker)
+    room_members_cache.set((1, 2), {"admin": 1})
+    session = AsyncSession(
+        ENGINE.execution_options(isolation_level="AUTOCOMMIT")
+    )
+
+    # an autocommit write is already committed.
+    invalidate_room_member(1, 2, session)
+    assert room_members_cache.get((1, 2)) is None
+    [(topic, message)] = broker.published
+    assert topic == CACHE_INVALIDATION_TOPIC
+    assert json.loads(message) == {"cache": "room_members", "key": [1, 2]}
+
+    # another worker evicts the same key from the published event.
+    room_members_cache.set((1, 2), {"admin": 1})
+    await apply_invalidation(message)
+    assert room_members_cache.get((1, 2)) is None
+
+
+@pytest.mark.anyio
+async def test_invalidation_waits_for_the_commit(monkeypatch) -> None:
+    broker = RecordingBroker()
+    monkeypatch.setattr(invalidations, "broker", broker)
+    users_cache.set("user@example.com", {"user_status": 1})
+
+    rolled_back = AsyncSession(ENGINE)
+    invalidate_user("User@example.com", rolled_back)
+    rolled_back.sync_session.dispatch.after_rollback(rolled_back.sync_session)
+    assert users_cache.get("user@example.com") is not None
+
+    committed = AsyncSession(ENGINE)
+    invalidate_user("user@example.com", committed)
+    # a concurrent request reads the row before the commit.
+    assert users_cache.get("user@example.com") is not None
+    committed.sync_session.dispatch.after_commit(committed.sync_session)
+    assert users_cache.get("user@example.com") is None
+    assert [json.loads(m) for _, m in broker.published] == [
+        {"cache": "users", "key": "user@example.com"}
+    ]
+    assert committed.sync_session.info == {}
+
+
+@pytest.mark.anyio
+async def test_caches_are_disabled_while_events_are_lost() -> None:
+    users_cache.set("user@example.com", {"user_status": 1})
+    disable_caches()
+    assert users_cache.get("user@example.com") is None
+    users_cache.set("user@example.com", {"user_status": 1})
+    assert users_cache.get("user@example.com") is None
+    await enable_caches()
+    users_cache.set("user@example.com", {"user_status": 1})
+    assert users_cache.get("user@example.com") is not None
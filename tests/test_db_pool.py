@@ -0,0 +1,60 @@
+import pytest
+
+from prometheus_client import (
+    REGISTRY,
+)
+from sqlalchemy import (
+    exc,
+)
+from sqlalchemy.util import (
+    greenlet_spawn,
+)
+
+from app.utils.db_pool import (
+    InstrumentedPool,
+    instrument_pool,
+)
+
+
+class FakeConnection:
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name, {"pool": "test_pool"}) or 0
+
+
+@pytest.mark.anyio
+async def test_pool_exports_usage_and_churn() -> None:
+    pool = InstrumentedPool(
+        FakeConnection,
+        pool_size=1,
+        max_overflow=1,
+        timeout=0.01,
+        logging_name="test_pool",
+    )
+    instrument_pool(pool)
+    checkouts = sample("db_pool_checkout_seconds_count")
+
+    first = await greenlet_spawn(pool.connect)
+    second = await greenlet_spawn(pool.connect)
+    assert sample("db_pool_checked_out") == 2
+    assert sample("db_pool_overflow") == 1
+    assert sample("db_pool_connections_opened_total") == 2
+
+    with pytest.raises(exc.TimeoutError):
+        await greenlet_spawn(pool.connect)
+    assert sample("db_pool_timeouts_total") == 1
+    assert sample("db_pool_waiting") == 0
+    assert sample("db_pool_checkout_seconds_count") == checkouts + 3
+
+    await greenlet_spawn(second.close)
+    await greenlet_spawn(first.close)
+    # the overflow connection is closed on checkin.
+    assert sample("db_pool_checked_out") == 0
+    assert sample("db_pool_overflow") == 0
+    assert sample("db_pool_connections_closed_total") == 1
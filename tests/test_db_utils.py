@@ -0,0 +1,67 @@
+from sqlalchemy import (
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    Table,
+    create_engine,
+    inspect,
+)
+
+from app.utils.db_utils import (
+    sync_indexes,
+)
+
+
+def messages_table(metadata: MetaData, **indexes: tuple[str, ...]) -> Table:
+    table = Table(
+        "messages",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("sender", Integer),
+        Column("receiver", Integer),
+        Column("status", Integer),
+    )
+    for name, columns in indexes.items():
+        Index(name, *(table.c[column] for column in columns))
+    return table
+
+
+def test_sync_indexes_matches_the_models() -> None:
+    engine = create_engine("sqlite://", future=True)
+    before = MetaData()
+    messages_table(
+        before,
+        ix_messages_sender=("sender",),
+        ix_messages_status=("status",),
+        ix_messages_receiver_id=("receiver", "id"),
+    )
+    before.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX uq_messages_id ON messages (id)"
+        )
+
+    after = MetaData()
+    messages_table(
+        after,
+        ix_messages_sender_receiver_id=("sender", "receiver", "id"),
+        ix_messages_receiver_id=("receiver",),
+    )
+    with engine.begin() as conn:
+        statements = sync_indexes(conn, after)
+    # the new index is created before the old ones are dropped.
+    assert statements[0].startswith(
+        "CREATE INDEX ix_messages_sender_receiver_id"
+    )
+    indexes = {
+        index["name"]: index["column_names"]
+        for index in inspect(engine).get_indexes("messages")
+    }
+    assert indexes == {
+        "ix_messages_sender_receiver_id": ["sender", "receiver", "id"],
+        "ix_messages_receiver_id": ["receiver"],
+        "uq_messages_id": ["id"],
+    }
+    with engine.begin() as conn:
+        assert sync_indexes(conn, after) == []
@@ -0,0 +1,153 @@
+import pytest
+
+import asyncio
+import os
+
+from app.utils.media_cache import (
+    CACHES,
+    CachedStorage,
+    distrust_caches,
+    trust_caches,
+)
+from app.utils.storage import (
+    LocalStorage,
+)
+
+
+class SlowStorage(LocalStorage):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.fetches = 0
+
+    async def get(self, name, offset=0, length=None):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        return await super().get(name, offset, length)
+
+
+async def read(storage, name, offset=0, length=None) -> bytes:
+    chunks = await storage.get(name, offset, length)
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_fetch(tmp_path) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 10000, 10000)
+    image = os.urandom(1000)
+    await backend.put("user/1/profile.png", image)
+
+    results = await asyncio.gather(
+        *[read(cache, "user/1/profile.png") for _ in range(10)]
+    )
+
+    assert results == [image] * 10
+    assert backend.fetches == 1
+    assert await read(cache, "user/1/profile.png", 10, 20) == image[10:30]
+    info = await cache.stat("user/1/profile.png")
+    assert info.etag == (await backend.stat("user/1/profile.png")).etag
+    assert backend.fetches == 1
+    assert await cache.get("user/2/profile.png") is None
+
+
+@pytest.mark.anyio
+async def test_least_recently_used_files_are_evicted(tmp_path) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 2500, 2000)
+    for index in range(4):
+        await backend.put(f"{index}.png", bytes([index]) * 1000)
+
+    for index in (0, 1, 0, 2):
+        await read(cache, f"{index}.png")
+
+    assert cache.size == 2000
+    assert not cache.path("1.png").exists()
+    await read(cache, "0.png")
+    assert backend.fetches == 3
+    # files larger than the limit are read through.
+    await backend.put("large.png", b"x" * 3000)
+    assert await read(cache, "large.png") == b"x" * 3000
+    assert len(cache) == 2
+
+
+@pytest.mark.anyio
+async def test_writes_invalidate_and_workers_share_files(tmp_path) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 10000, 10000)
+    sibling = CachedStorage(backend, tmp_path / "cache", 10000, 10000)
+    await backend.put("user/1/profile.png", b"old")
+
+    assert await read(cache, "user/1/profile.png") == b"old"
+    assert await read(sibling, "user/1/profile.png") == b"old"
+    assert backend.fetches == 1
+
+    await cache.put("user/1/profile.png", b"new")
+    assert await read(cache, "user/1/profile.png") == b"new"
+    assert backend.fetches == 2
+
+
+@pytest.mark.anyio
+async def test_replaceable_files_are_revalidated(tmp_path) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 10000, 10000, 60)
+    blob = "/chat/images/blobs/" + "a" * 64 + ".png"
+    await backend.put("user/1/profile.png", b"old")
+    await backend.put(blob, b"blob")
+    assert await read(cache, "user/1/profile.png") == b"old"
+    assert await read(cache, blob) == b"blob"
+
+    # replaced by another node, whose invalidation event was lost.
+    await backend.put("user/1/profile.png", b"new!")
+    assert await read(cache, "user/1/profile.png") == b"old"
+    cache.revalidate_after = 0
+    assert await read(cache, "user/1/profile.png") == b"new!"
+    assert backend.fetches == 3
+    # content addressed images are never checked.
+    await backend.put(blob, b"blob")
+    assert await read(cache, blob) == b"blob"
+    assert backend.fetches == 3
+
+
+@pytest.mark.anyio
+async def test_lost_invalidations_revalidate_every_read(
+    tmp_path, monkeypatch
+) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 10000, 10000, 60)
+    monkeypatch.setitem(CACHES, "test", cache)
+    await backend.put("user/1/profile.png", b"old")
+    assert await read(cache, "user/1/profile.png") == b"old"
+
+    distrust_caches()
+    await backend.put("user/1/profile.png", b"new!")
+    assert await read(cache, "user/1/profile.png") == b"new!"
+    await trust_caches()
+    assert cache.trusted
+    assert await read(cache, "user/1/profile.png") == b"new!"
+    assert backend.fetches == 2
+
+
+@pytest.mark.anyio
+async def test_scans_bound_the_directory_of_the_node(tmp_path) -> None:
+    backend = SlowStorage(tmp_path / "remote", chunk_size=100)
+    cache = CachedStorage(backend, tmp_path / "cache", 2500, 2000)
+    sibling = CachedStorage(backend, tmp_path / "cache", 2500, 2000)
+    for index in range(4):
+        await backend.put(f"{index}.png", bytes([index]) * 1000)
+
+    # each worker stays within the budget, the directory does not.
+    await read(cache, "0.png")
+    await read(cache, "1.png")
+    await read(sibling, "2.png")
+    await read(sibling, "3.png")
+    os.utime(cache.path("0.png"), (0, 0))
+    os.utime(cache.path("1.png"), (1, 1))
+
+    # a restarted worker rebuilds its entries from the directory.
+    restarted = CachedStorage(backend, tmp_path / "cache", 2500, 2000)
+    await restarted.scan()
+    assert restarted.size == 2000
+    assert not cache.path("0.png").exists()
+    assert not cache.path("1.png").exists()
+    assert await read(restarted, "3.png") == bytes([3]) * 1000
+    assert backend.fetches == 4
@@ -0,0 +1,203 @@
+import pytest
+
+from fastapi import (
+    Request,
+)
+import os
+
+from app.utils.media_response import (
+    IMMUTABLE_CACHE_CONTROL,
+    PENDING_VARIANT_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    media_response,
+    parse_range,
+)
+from app.utils.storage import (
+    LocalStorage,
+)
+from app.utils.thumbnails import (
+    ImageVariant,
+)
+
+
+def make_request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+async def body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    async def stat(self, name):
+        self.calls += 1
+        return await super().stat(name)
+
+    async def get(self, name, offset=0, length=None):
+        self.calls += 1
+        return await super().get(name, offset, length)
+
+
+@pytest.mark.anyio
+async def test_known_etag_is_revalidated_without_storage(tmp_path) -> None:
+    storage = CountingStorage(tmp_path, chunk_size=4096)
+
+    response = await media_response(
+        make_request(if_none_match='"abc"'),
+        storage,
+        "missing.png",
+        IMMUTABLE_CACHE_CONTROL,
+        etag='"abc"',
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"abc"'
+    assert "immutable" in response.headers["cache-control"]
+    assert storage.calls == 0
+
+
+@pytest.mark.anyio
+async def test_pending_variants_are_never_cached(tmp_path) -> None:
+    storage = CountingStorage(tmp_path, chunk_size=4096)
+    await storage.put("image.png", b"original")
+
+    # the original is sent until the variant is rendered.
+    for headers in ({}, {"if_none_match": '"abc"'}):
+        response = await media_response(
+            make_request(**headers),
+            storage,
+            "image.png",
+            IMMUTABLE_CACHE_CONTROL,
+            etag='"abc"',
+            variant=ImageVariant.THUMB,
+        )
+        assert response.headers["etag"] == '"abc"'
+        assert (
+            response.headers["cache-control"] == PENDING_VARIANT_CACHE_CONTROL
+        )
+        assert "immutable" not in response.headers["cache-control"]
+    assert response.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_profile_images_are_revalidated(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    image = os.urandom(1000)
+    await storage.put("user/1/profile.png", image)
+
+    response = await media_response(
+        make_request(),
+        storage,
+        "user/1/profile.png",
+        REVALIDATE_CACHE_CONTROL,
+    )
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert response.headers["content-length"] == "1000"
+    assert await body(response) == image
+
+    etag = response.headers["etag"]
+    response = await media_response(
+        make_request(if_none_match=etag),
+        storage,
+        "user/1/profile.png",
+        REVALIDATE_CACHE_CONTROL,
+    )
+    assert response.status_code == 304
+
+    response = await media_response(
+        make_request(if_modified_since=response.headers["last-modified"]),
+        storage,
+        "user/1/profile.png",
+        REVALIDATE_CACHE_CONTROL,
+    )
+    assert response.status_code == 304
+
+    # a new picture has a new tag.
+    await storage.put("user/1/profile.png", os.urandom(1000))
+    response = await media_response(
+        make_request(if_none_match=etag),
+        storage,
+        "user/1/profile.png",
+        REVALIDATE_CACHE_CONTROL,
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.anyio
+async def test_ranges(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=7)
+    image = os.urandom(100)
+    await storage.put("image.png", image)
+
+    response = await media_response(
+        make_request(range="bytes=10-29"),
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-29/100"
+    assert await body(response) == image[10:30]
+
+    response = await media_response(
+        make_request(range="bytes=-10"),
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+    )
+    assert await body(response) == image[-10:]
+
+    response = await media_response(
+        make_request(range="bytes=100-"),
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100"
+
+    # a stale If-Range sends the whole file.
+    response = await media_response(
+        make_request(range="bytes=0-9", if_range='"stale"'),
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+    )
+    assert response.status_code == 200
+    assert await body(response) == image
+
+    # If-Range only matches a strong entity tag.
+    etag = response.headers["etag"]
+    for if_range, status_code in ((etag, 206), (f"W/{etag}", 200)):
+        response = await media_response(
+            make_request(range="bytes=0-9", if_range=if_range),
+            storage,
+            "image.png",
+            IMMUTABLE_CACHE_CONTROL,
+        )
+        assert response.status_code == status_code
+
+
+def test_parse_range() -> None:
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9,20-29", 100) is None
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-200", 100) == (0, 99)
+    with pytest.raises(ValueError):
+        parse_range("bytes=20-10", 100)
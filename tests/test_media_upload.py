@@ -0,0 +1,105 @@
+import pytest
+
+import base64
+from fastapi import (
+    UploadFile,
+)
+import hashlib
+import io
+import os
+
+from app.utils.media_upload import (
+    InvalidMedia,
+    MediaTooLarge,
+    MediaUploader,
+    blob_name,
+    media_storage_name,
+    media_url,
+    read_upload,
+)
+from app.utils.storage import (
+    LocalStorage,
+)
+
+
+@pytest.mark.anyio
+async def test_upload_decodes_in_chunks(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    uploader = MediaUploader(
+        storage, max_size=1024 * 1024, max_concurrency=2, chunk_size=10
+    )
+    image = os.urandom(100000)
+
+    blob = await uploader.decode(base64.b64encode(image).decode())
+    try:
+        name = await uploader.upload(blob)
+    finally:
+        blob.close()
+
+    assert blob.digest == hashlib.sha256(image).hexdigest()
+    assert blob.size == len(image)
+    assert name == blob_name(blob.digest)
+    assert b"".join([chunk async for chunk in await storage.get(name)]) == (
+        image
+    )
+
+
+@pytest.mark.anyio
+async def test_upload_decodes_line_wrapped_base64(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    uploader = MediaUploader(
+        storage, max_size=10000, max_concurrency=1, chunk_size=10
+    )
+    image = os.urandom(10000)
+
+    # 76 characters per line, and groups of 4 across the chunks.
+    blob = await uploader.decode(base64.encodebytes(image).decode())
+    try:
+        assert blob.digest == hashlib.sha256(image).hexdigest()
+        assert blob.size == len(image)
+    finally:
+        blob.close()
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_large_and_invalid_images(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    uploader = MediaUploader(
+        storage, max_size=10, max_concurrency=1, chunk_size=64
+    )
+
+    with pytest.raises(MediaTooLarge):
+        await uploader.decode(base64.b64encode(b"x" * 11).decode())
+    with pytest.raises(MediaTooLarge):
+        await uploader.decode_bytes(b"x" * 11)
+    with pytest.raises(InvalidMedia):
+        await uploader.decode("abc")
+    with pytest.raises(InvalidMedia):
+        await uploader.decode("")
+    with pytest.raises(InvalidMedia):
+        await uploader.decode("\n")
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.anyio
+async def test_uploaded_files_are_read_up_to_the_maximum_size() -> None:
+    image = os.urandom(1000)
+    upload = UploadFile("profile.png", file=io.BytesIO(image))
+    assert await read_upload(upload, 1000, chunk_size=64) == image
+    upload = UploadFile("profile.png", file=io.BytesIO(image))
+    with pytest.raises(MediaTooLarge):
+        await read_upload(upload, 999, chunk_size=64)
+
+
+def test_media_urls_resolve_to_shared_blobs() -> None:
+    digest = hashlib.sha256(b"image").hexdigest()
+
+    assert media_storage_name(media_url("user", 1, digest)) == blob_name(
+        digest
+    )
+    assert media_storage_name(media_url("room", 2, digest)) == blob_name(
+        digest
+    )
+    # images uploaded before content addressing keep their own name.
+    legacy = "/chat/images/user/1/image_0b5e7a3c.png"
+    assert media_storage_name(legacy) == legacy
@@ -0,0 +1,190 @@
+import pytest
+
+from aioredis.exceptions import (
+    LockNotOwnedError,
+)
+import datetime
+from types import (
+    SimpleNamespace,
+)
+
+from app.utils.message_archive import (
+    COPY_MESSAGES_TO_ARCHIVE,
+    DELETE_ARCHIVED_MESSAGES,
+    GET_HOT_FLOOR,
+    GET_OLDEST_MESSAGES,
+    MessageArchiver,
+    read_history,
+)
+
+HOT = object()
+ARCHIVE = object()
+
+
+class FakeResult:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+
+    def scalar(self):
+        return self.rows
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class FakeSession:
+    """
+    The `messages` table and its archive, as lists of ids.
+    """
+
+    def __init__(self, hot, archive) -> None:
+        self.hot = hot
+        self.archive = archive
+        self.queries = []
+        self.committed = False
+
+    async def execute(self, statement, values=None):
+        if statement is GET_HOT_FLOOR:
+            return FakeResult(min(self.hot, default=None))
+        self.queries.append(statement)
+        ids = self.hot if statement is HOT else self.archive
+        if values["after"]:
+            ids = sorted(i for i in ids if i > values["cursor_id"])
+        else:
+            ids = sorted(
+                (i for i in ids if i < values["cursor_id"]), reverse=True
+            )
+        return FakeResult(
+            [SimpleNamespace(id=i) for i in ids[: values["limit"]]]
+        )
+
+
+async def page(session, cursor_id, after, limit=3):
+    values = {"cursor_id": cursor_id, "limit": limit, "after": after}
+    rows = await read_history(HOT, ARCHIVE, values, after, session)
+    return [row.id for row in rows]
+
+
+@pytest.mark.anyio
+async def test_recent_pages_never_read_the_archive() -> None:
+    session = FakeSession(hot=[5, 6, 7, 8], archive=[1, 2, 3, 4])
+    assert await page(session, 100, after=False) == [8, 7, 6]
+    assert await page(session, 6, after=True) == [7, 8]
+    assert session.queries == [HOT, HOT]
+    # a page that the hot table can't fill is completed from the archive.
+    assert await page(session, 7, after=False) == [6, 5, 4]
+    assert session.queries == [HOT, HOT, HOT, ARCHIVE]
+
+
+@pytest.mark.anyio
+async def test_old_pages_never_read_the_hot_table() -> None:
+    session = FakeSession(hot=[5, 6, 7, 8], archive=[1, 2, 3, 4])
+    assert await page(session, 5, after=False) == [4, 3, 2]
+    assert await page(session, 1, after=True, limit=2) == [2, 3]
+    assert session.queries == [ARCHIVE, ARCHIVE]
+
+
+@pytest.mark.anyio
+async def test_pages_across_the_tiers_are_completed() -> None:
+    session = FakeSession(hot=[5, 6, 7, 8], archive=[1, 2, 3, 4])
+    assert await page(session, 7, after=False) == [6, 5, 4]
+    assert await page(session, 2, after=True) == [3, 4, 5]
+    # a message moved between the two reads is in both tables.
+    session = FakeSession(hot=[4, 5, 6], archive=[1, 2, 3, 4])
+    assert await page(session, 6, after=False, limit=4) == [5, 4, 3, 2]
+
+
+class FakeLock:
+    def __init__(self, acquired, renewals=None) -> None:
+        self.acquired = acquired
+        self.released = False
+        # the number of renewals before the lock expires, if it does.
+        self.renewals = renewals
+        self.renewed = 0
+
+    async def acquire(self, blocking=True):
+        return self.acquired
+
+    async def reacquire(self):
+        if self.renewals is not None and self.renewed >= self.renewals:
+            raise LockNotOwnedError(
+                "Cannot reacquire a lock that's no longer owned"
+            )
+        self.renewed += 1
+
+    async def release(self):
+        self.released = True
+
+
+class FakeRedis:
+    def __init__(self, acquired=True, renewals=None) -> None:
+        self.lock_ = FakeLock(acquired, renewals)
+
+    def lock(self, name, timeout=None):
+        return self.lock_
+
+
+class FakeArchiveSession:
+    def __init__(self, dates) -> None:
+        self.dates = dates
+        self.moved = []
+
+    async def execute(self, statement, values=None):
+        if statement is GET_OLDEST_MESSAGES:
+            return FakeResult(
+                [
+                    SimpleNamespace(id=i, creation_date=date)
+                    for i, date in sorted(self.dates.items())
+                ][: values["limit"]]
+            )
+        if statement is COPY_MESSAGES_TO_ARCHIVE:
+            self.moved = [i for i in self.dates if i <= values["last_id"]]
+        if statement is DELETE_ARCHIVED_MESSAGES:
+            for i in self.moved:
+                del self.dates[i]
+        return FakeResult([])
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.anyio
+async def test_archiver_moves_the_oldest_contiguous_ids() -> None:
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=100)
+    new = datetime.datetime.utcnow()
+    session = FakeArchiveSession(
+        {1: old, 2: old, 3: old, 4: new, 5: old, 6: new}
+    )
+    redis = FakeRedis()
+    archiver = MessageArchiver(lambda: session, redis, 90, 60, 2)
+    assert await archiver.archive() == 3
+    # 5 is old but follows a recent message, it waits for the next run.
+    assert sorted(session.dates) == [4, 5, 6]
+    assert redis.lock_.released
+    # the lock is renewed after every full batch.
+    assert redis.lock_.renewed == 1
+
+
+@pytest.mark.anyio
+async def test_archiver_stops_when_its_lock_expires() -> None:
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=100)
+    session = FakeArchiveSession({i: old for i in range(1, 8)})
+    redis = FakeRedis(renewals=1)
+    archiver = MessageArchiver(lambda: session, redis, 90, 60, 2)
+    assert await archiver.archive() == 4
+    assert sorted(session.dates) == [5, 6, 7]
+
+
+@pytest.mark.anyio
+async def test_archiver_skips_when_another_worker_holds_the_lock() -> None:
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=100)
+    session = FakeArchiveSession({1: old})
+    archiver = MessageArchiver(lambda: session, FakeRedis(False), 90, 60, 2)
+    assert await archiver.archive() == 0
+    assert sorted(session.dates) == [1]
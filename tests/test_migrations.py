@@ -0,0 +1,103 @@
+import pytest
+
+from sqlalchemy.dialects import (
+    mysql,
+)
+from sqlalchemy.exc import (
+    ProgrammingError,
+)
+from sqlalchemy.schema import (
+    CreateIndex,
+    CreateTable,
+)
+
+from app.utils.migrations import (
+    MIGRATIONS,
+    SchemaVersionError,
+    check_schema_version,
+    latest_version,
+    migration,
+)
+from app.utils.mixins import (
+    Base,
+)
+from app.utils.schema_snapshots import (
+    version_1,
+    version_5,
+)
+
+
+class FakeConnection:
+    def __init__(self, version=None) -> None:
+        self.version = version
+
+    async def execute(self, statement):
+        if self.version is None:
+            raise ProgrammingError(str(statement), {}, Exception("1146"))
+        version = self.version
+
+        class Result:
+            def scalar(self):
+                return version
+
+        return Result()
+
+
+def test_migrations_follow_each_other() -> None:
+    assert [m.version for m in MIGRATIONS] == list(
+        range(1, latest_version() + 1)
+    )
+    with pytest.raises(ValueError):
+        migration(latest_version() + 2, "A gap in the versions")(
+            FakeConnection.execute
+        )
+
+
+@pytest.mark.anyio
+async def test_startup_only_checks_the_schema_version() -> None:
+    latest = latest_version()
+    assert await check_schema_version(FakeConnection(latest)) == latest
+    # the old workers of a rolling deploy run on a newer schema.
+    assert await check_schema_version(FakeConnection(latest + 1)) == latest + 1
+    with pytest.raises(SchemaVersionError):
+        await check_schema_version(FakeConnection(latest - 1))
+    with pytest.raises(SchemaVersionError):
+        await check_schema_version(FakeConnection())
+
+
+def ddl(metadata) -> dict[str, str]:
+    dialect = mysql.dialect()
+    return {
+        table.name: "\n".join(
+            [str(CreateTable(table).compile(dialect=dialect))]
+            + sorted(
+                str(CreateIndex(index).compile(dialect=dialect))
+                for index in table.indexes
+            )
+        )
+        for table in metadata.sorted_tables
+    }
+
+
+def test_the_last_snapshot_matches_the_models() -> None:
+    # pylint: disable=W0611
+    from app.auth.models import (  # noqa: F401
+        AccessTokens,
+    )
+    from app.chats.models import (  # noqa: F401
+        ChatSummaries,
+    )
+    from app.contacts.models import (  # noqa: F401
+        Contacts,
+    )
+    from app.rooms.models import (  # noqa: F401
+        Rooms,
+    )
+    from app.users.models import (  # noqa: F401
+        Users,
+    )
+
+    assert ddl(version_5()) == ddl(Base.metadata)
+    # the released snapshots never follow the models.
+    assert "ix_messages_content" in ddl(version_1())["messages"]
+    assert "messages_archive" not in ddl(version_1())
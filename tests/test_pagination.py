@@ -0,0 +1,28 @@
+import pytest
+
+from app.chats.crud import (
+    search_messages,
+)
+from app.utils.pagination import (
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
+
+
+def test_cursors_round_trip() -> None:
+    assert decode_cursor(encode_cursor(42)) == 42
+    cursor = encode_search_cursor(0.1 + 0.2, 42)
+    assert decode_search_cursor(cursor) == (0.1 + 0.2, 42)
+    assert decode_search_cursor(encode_cursor(42)) is None
+    assert decode_search_cursor("invalid") is None
+
+
+@pytest.mark.anyio
+async def test_search_messages_rejects_invalid_input() -> None:
+    # invalid input is rejected before the database is queried.
+    result = await search_messages(1, " +-*() ", None, 10, None)
+    assert result["status_code"] == 400
+    result = await search_messages(1, "hello", "invalid", 10, None)
+    assert result["message"] == "Invalid cursor!"
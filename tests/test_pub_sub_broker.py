@@ -0,0 +1,120 @@
+import pytest
+
+import asyncio
+from types import (
+    SimpleNamespace,
+)
+
+from app.utils.pub_sub_broker import (
+    ControlTopic,
+    PubSubBroker,
+)
+
+
+class FakePubSub:
+    def __init__(self) -> None:
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.failures = 0
+
+    async def subscribe(self, topic: str) -> None:
+        pass
+
+    async def unsubscribe(self, topic: str) -> None:
+        pass
+
+    async def get_message(self, ignore_subscribe_messages, timeout):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Connection reset by peer")
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.pub_sub = FakePubSub()
+        self.failures = 0
+        self.connection_pool = SimpleNamespace(disconnect=self.close)
+
+    def pubsub(self) -> FakePubSub:
+        return self.pub_sub
+
+    async def publish(self, topic: str, message: str) -> int:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Connection reset by peer")
+        await self.pub_sub.messages.put({"channel": topic, "data": message})
+        return 1
+
+    async def close(self) -> None:
+        pass
+
+
+async def wait_for(condition) -> None:
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+@pytest.fixture
+def events() -> list:
+    return []
+
+
+@pytest.fixture
+def control(events: list) -> ControlTopic:
+    async def apply(data: str) -> None:
+        events.append(data)
+
+    async def resync() -> None:
+        events.append("resync")
+
+    return ControlTopic(
+        "control",
+        apply=apply,
+        lost=lambda: events.append("lost"),
+        resync=resync,
+    )
+
+
+@pytest.mark.anyio
+async def test_control_events_are_never_dropped(control, events) -> None:
+    redis = FakeRedis()
+    broker = PubSubBroker(redis, queue_size=1, read_timeout=0.01)
+    await broker.follow(control)
+    # a failed publish is retried in order.
+    redis.failures = 1
+    for i in range(5):
+        control.publish(str(i))
+    broker.start()
+    await wait_for(lambda: len(events) == 5)
+    assert events == ["0", "1", "2", "3", "4"]
+    await broker.unfollow(control)
+    control.publish("5")
+    assert control.broker is None
+    await broker.close()
+
+
+@pytest.mark.anyio
+async def test_control_topics_resync_after_a_reconnection(
+    control, events
+) -> None:
+    redis = FakeRedis()
+    broker = PubSubBroker(redis, queue_size=1, read_timeout=0.01)
+    await broker.follow(control)
+    redis.pub_sub.failures = 2
+    broker.start()
+    await wait_for(lambda: "resync" in events)
+    assert events == ["lost", "resync"]
+    control.publish("0")
+    await wait_for(lambda: len(events) == 3)
+    assert events[-1] == "0"
+    await broker.close()
+    assert control.broker is None
@@ -0,0 +1,33 @@
+import pytest
+
+from types import (
+    SimpleNamespace,
+)
+
+from app.utils import (
+    pub_sub_handlers,
+)
+from app.utils.pub_sub_handlers import (
+    can_post_in_room,
+)
+
+
+@pytest.mark.anyio
+async def test_room_membership_is_checked_for_every_message(
+    monkeypatch,
+) -> None:
+    members = {1: SimpleNamespace(banned=0), 2: SimpleNamespace(banned=1)}
+
+    async def find_existed_user_in_room(user_id, room_id, session):
+        return members.get(user_id)
+
+    monkeypatch.setattr(
+        pub_sub_handlers,
+        "find_existed_user_in_room",
+        find_existed_user_in_room,
+    )
+    assert await can_post_in_room(1, 10, None)
+    assert not await can_post_in_room(2, 10, None)
+    # a member who left since they connected.
+    del members[1]
+    assert not await can_post_in_room(1, 10, None)
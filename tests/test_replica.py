@@ -0,0 +1,112 @@
+import pytest
+
+import math
+import time
+from types import (
+    SimpleNamespace,
+)
+
+from app.utils import (
+    replica as replica_module,
+)
+from app.utils.dependencies import (
+    get_db_read_session,
+)
+from app.utils.replica import (
+    REPLICA_SESSION,
+    RecentWriters,
+    from_replica,
+    mark_write,
+    recent_writers,
+    recent_writes,
+)
+
+
+class FakeSession:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    async def close(self) -> None:
+        pass
+
+
+def fake_request(user_id=None, replica=True):
+    state = SimpleNamespace(
+        db_autocommit_session_factory=lambda: FakeSession("primary"),
+        db_replica_session_factory=(lambda: FakeSession("replica"))
+        if replica
+        else None,
+    )
+    request = SimpleNamespace(
+        app=SimpleNamespace(state=state), state=SimpleNamespace()
+    )
+    if user_id is not None:
+        request.state.user_id = user_id
+    return request
+
+
+async def read_session(request) -> str:
+    sessions = get_db_read_session(request)
+    session = await sessions.__anext__()
+    await sessions.aclose()
+    return session.name
+
+
+def test_recent_writers_expire_and_throttle() -> None:
+    writers = RecentWriters(window=0.05)
+    assert not writers.is_recent(1)
+    writers.add(1)
+    assert writers.is_recent(1)
+    assert writers.should_publish(1)
+    assert not writers.should_publish(1)
+    time.sleep(0.06)
+    assert not writers.is_recent(1)
+    assert writers.should_publish(1)
+    # a longer window is never shortened.
+    writers.add(2, 60)
+    writers.add(2)
+    assert writers.is_recent(2)
+
+
+@pytest.mark.anyio
+async def test_reads_follow_the_writes_of_their_user(monkeypatch) -> None:
+    published = []
+
+    class FakeBroker:
+        def send(self, topic, data) -> None:
+            published.append((topic, data))
+
+    monkeypatch.setattr(recent_writes, "broker", FakeBroker())
+    assert await read_session(fake_request(101)) == "replica"
+    # an unknown reader may have just written.
+    assert await read_session(fake_request()) == "primary"
+    assert await read_session(fake_request(101, replica=False)) == "primary"
+
+    mark_write(101)
+    mark_write(101)
+    assert await read_session(fake_request(101)) == "primary"
+    assert await read_session(fake_request(102)) == "replica"
+    assert published == [(replica_module.RECENT_WRITES_TOPIC, "101")]
+
+    recent_writers.add(103, 0)
+    assert await read_session(fake_request(103)) == "replica"
+
+
+def test_lost_writes_hold_every_read_on_the_primary() -> None:
+    writers = RecentWriters(window=0.05)
+    writers.hold(math.inf)
+    assert writers.is_recent(1)
+    # the windows of the lost writes are closed once resynced.
+    writers.hold(0.05)
+    assert writers.is_recent(1)
+    time.sleep(0.06)
+    assert not writers.is_recent(1)
+
+
+def test_replica_sessions_are_marked() -> None:
+    primary = SimpleNamespace(sync_session=SimpleNamespace(info={}))
+    replica = SimpleNamespace(
+        sync_session=SimpleNamespace(info={REPLICA_SESSION: True})
+    )
+    assert not from_replica(primary)
+    assert from_replica(replica)
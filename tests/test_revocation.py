@@ -0,0 +1,79 @@
+import pytest
+
+import jwt
+import time
+
+from app.auth import (
+    crud,
+)
+from app.utils import (
+    revocation,
+)
+from app.utils.revocation import (
+    BloomFilter,
+    RevocationList,
+    revocation_list,
+    revocations,
+    token_expiration,
+)
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    tokens = [f"token-{index}" for index in range(1000)]
+    for token in tokens:
+        bloom.add(token)
+    assert all(token in bloom for token in tokens)
+    false_positives = sum(f"other-{index}" in bloom for index in range(10000))
+    assert false_positives < 300
+
+
+def test_revocation_list_expires_tokens() -> None:
+    revocation_list = RevocationList(capacity=10, error_rate=0.01)
+    revocation_list.add("revoked", time.time() + 60)
+    revocation_list.add("expired", time.time() - 1)
+    assert revocation_list.is_revoked("revoked")
+    assert not revocation_list.is_revoked("expired")
+    assert not revocation_list.is_revoked("active")
+    assert len(revocation_list) == 1
+
+
+def test_revocation_list_grows_past_capacity() -> None:
+    revocation_list = RevocationList(capacity=4, error_rate=0.01)
+    for index in range(20):
+        revocation_list.add(f"token-{index}", time.time() + 60)
+    assert revocation_list.capacity >= 20
+    assert all(
+        revocation_list.is_revoked(f"token-{index}") for index in range(20)
+    )
+
+
+def test_token_expiration_reads_exp_claim() -> None:
+    token = jwt.encode({"sub": "test", "exp": 2000000000}, "secret")
+    assert token_expiration(token) == 2000000000
+
+
+class FakeSession:
+    async def close(self) -> None:
+        pass
+
+
+@pytest.mark.anyio
+async def test_lost_revocations_are_checked_in_the_database(
+    monkeypatch,
+) -> None:
+    token = jwt.encode({"sub": "test", "exp": time.time() + 60}, "secret")
+
+    async def get_black_listed_tokens(since, session):
+        return [token]
+
+    monkeypatch.setattr(
+        crud, "get_black_listed_tokens", get_black_listed_tokens
+    )
+    monkeypatch.setattr(revocation, "_session_factory", FakeSession)
+    monkeypatch.setattr(revocation_list, "loaded", True)
+    revocations.lost()
+    assert not revocation_list.loaded
+    await revocations.resync()
+    assert revocation_list.loaded
+    assert revocation_list.is_revoked(token)
@@ -0,0 +1,99 @@
+import pytest
+
+from sqlalchemy.dialects import (
+    mysql,
+)
+from sqlalchemy.types import (
+    Integer,
+    String,
+)
+
+from app.auth import (  # noqa: F401
+    crud as auth_crud,
+)
+from app.chats import (
+    crud as chats_crud,
+)
+from app.contacts import (  # noqa: F401
+    crud as contacts_crud,
+)
+from app.rooms import (  # noqa: F401
+    crud as rooms_crud,
+)
+from app.users import (  # noqa: F401
+    crud as users_crud,
+)
+from app.utils.statements import (
+    STATEMENTS,
+    archive_statement,
+    like_prefix,
+    statement,
+)
+
+
+def test_statement_parameters_must_be_typed() -> None:
+    query = "SELECT * FROM users WHERE id = :id AND email = :email"
+    with pytest.raises(ValueError):
+        statement("tests.untyped", query, params={"id": Integer})
+    with pytest.raises(ValueError):
+        statement(
+            "tests.unknown",
+            query,
+            params={"id": Integer, "email": String, "name": String},
+        )
+    clause = statement(
+        "tests.typed",
+        query,
+        params={"id": Integer, "email": String},
+        columns={"id": Integer},
+    )
+    assert STATEMENTS["tests.typed"] is clause
+    assert isinstance(clause.selected_columns.id.type, Integer)
+    with pytest.raises(ValueError):
+        statement(
+            "tests.typed", query, params={"id": Integer, "email": String}
+        )
+
+
+def test_crud_statements_compile() -> None:
+    modules = {name.split(".")[0] for name in STATEMENTS}
+    assert {"auth", "chats", "contacts", "rooms", "users"} <= modules
+    dialect = mysql.dialect()
+    for name, clause in STATEMENTS.items():
+        compiled = clause.compile(dialect=dialect)
+        assert "%s" in compiled.string or not compiled.params, name
+
+
+def test_batch_statements_are_registered_once_per_size() -> None:
+    statement = chats_crud.insert_messages_statement(3)
+    assert chats_crud.insert_messages_statement(3) is statement
+    assert chats_crud.insert_messages_statement(2) is not statement
+    assert len(statement.compile(dialect=mysql.dialect()).params) == 21
+    summaries = chats_crud.update_chat_summaries_statement(2)
+    assert chats_crud.update_chat_summaries_statement(2) is summaries
+
+
+def test_like_prefix_escapes_wildcards() -> None:
+    assert like_prefix("nerds") == "nerds%"
+    assert like_prefix("50%_off\\") == "50\\%\\_off\\\\%"
+
+
+def test_archive_statements_read_the_archive_as_messages() -> None:
+    history = str(STATEMENTS["rooms.get_room_conversations_after_archive"])
+    assert "FROM\n            messages_archive AS messages\n" in history
+    assert "messages.room = :room_id" in history
+    delete = str(STATEMENTS["chats.delete_chat_messages_archive"])
+    assert "UPDATE\n          messages_archive\n" in delete
+    statement(
+        "tests.messages",
+        "SELECT id FROM messages WHERE sender = :sender_id",
+        params={"sender_id": Integer},
+        columns={"id": Integer},
+    )
+    archive = archive_statement("tests.messages")
+    assert STATEMENTS["tests.messages_archive"] is archive
+    assert str(archive) == (
+        "SELECT id FROM messages_archive AS messages"
+        " WHERE sender = :sender_id"
+    )
+    assert isinstance(archive.selected_columns.id.type, Integer)
@@ -0,0 +1,156 @@
+import pytest
+
+import io
+import os
+import uuid
+
+from app.utils.storage import (
+    DetaStorage,
+    LocalStorage,
+    S3Storage,
+    Storage,
+    slice_chunks,
+)
+
+
+async def read(storage: Storage, name: str) -> bytes:
+    chunks = await storage.get(name)
+    assert chunks is not None
+    return b"".join([chunk async for chunk in chunks])
+
+
+class FakeBody:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def iter_chunks(self, size: int):
+        for start in range(0, len(self.data), size):
+            yield self.data[start : start + size]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDrive:
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.downloads: list[str] = []
+
+    def put(self, name, data):
+        self.files[name] = data if isinstance(data, bytes) else data.read()
+
+    def get(self, name):
+        if name not in self.files:
+            return None
+        self.downloads.append(name)
+        return FakeBody(self.files[name])
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+
+@pytest.mark.anyio
+async def test_deta_storage_stat_reads_the_sidecar() -> None:
+    # the Deta SDK is not needed with a fake drive.
+    storage = DetaStorage.__new__(DetaStorage)
+    Storage.__init__(storage, "sent-images", 1000)
+    storage.drive = drive = FakeDrive()
+    image = os.urandom(10000)
+
+    await storage.put("image.png", io.BytesIO(image))
+    info = await storage.stat("image.png")
+    assert info.size == len(image)
+    assert drive.downloads == ["image.png.meta.json"]
+    assert await read(storage, "image.png") == image
+
+    # a file written before its sidecar is hashed once.
+    drive.files["old.png"] = image
+    drive.downloads.clear()
+    assert (await storage.stat("old.png")).etag == info.etag
+    assert (await storage.stat("old.png")).etag == info.etag
+    assert drive.downloads.count("old.png") == 1
+
+    await storage.delete("image.png")
+    assert await storage.stat("image.png") is None
+    assert drive.files.keys() == {"old.png", "old.png.meta.json"}
+
+
+@pytest.mark.anyio
+async def test_local_storage_round_trip(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=1000)
+    image = os.urandom(10000)
+
+    await storage.put("/chat/images/user/1/image.png", image)
+    await storage.put("/chat/images/user/2/image.png", io.BytesIO(b"x"))
+
+    assert await read(storage, "/chat/images/user/1/image.png") == image
+    assert await read(storage, "/chat/images/user/2/image.png") == b"x"
+    assert await storage.get("/chat/images/user/3/image.png") is None
+    await storage.delete("/chat/images/user/1/image.png")
+    await storage.delete("/chat/images/user/1/image.png")
+    assert await storage.get("/chat/images/user/1/image.png") is None
+
+
+def test_local_storage_shards_file_names(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=1000)
+
+    path = storage.path("../../outside.png")
+
+    assert tmp_path in path.parents
+    assert path.parent.parent.parent == tmp_path
+    assert path.suffix == ".png"
+    assert storage.path("/user/1/profile.png") == storage.path(
+        "user/1/profile.png"
+    )
+
+
+def test_drivers_must_implement_every_operation() -> None:
+    class ReadOnlyStorage(Storage):
+        async def get(self, name, offset=0, length=None):
+            return None
+
+        async def stat(self, name):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyStorage("bucket", 4096)
+
+
+@pytest.mark.anyio
+async def test_slice_chunks() -> None:
+    async def chunks():
+        for index in range(0, 100, 7):
+            yield bytes(range(index, min(index + 7, 100)))
+
+    sliced = [chunk async for chunk in slice_chunks(chunks(), 10, 20)]
+
+    assert b"".join(sliced) == bytes(range(10, 30))
+    assert b"".join(
+        [chunk async for chunk in slice_chunks(chunks(), 95, None)]
+    ) == bytes(range(95, 100))
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(
+    not os.getenv("S3_ENDPOINT_URL"),
+    reason="An S3 compatible server, e.g. MinIO, is required.",
+)
+async def test_s3_storage_round_trip() -> None:
+    pytest.importorskip("aiobotocore")
+    storage = S3Storage(
+        os.getenv("S3_TEST_BUCKET", "test-images"),
+        chunk_size=1000,
+        endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+        access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
+        secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+        region=os.getenv("S3_REGION", "us-east-1"),
+    )
+    name = f"/chat/images/user/1/image_{uuid.uuid4()}.png"
+    image = os.urandom(10000)
+    try:
+        await storage.put(name, image)
+        assert await read(storage, name) == image
+        await storage.delete(name)
+        assert await storage.get(name) is None
+    finally:
+        await storage.close()
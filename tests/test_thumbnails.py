@@ -0,0 +1,148 @@
+import pytest
+
+from fastapi import (
+    Request,
+)
+import io
+
+from app.utils.media_response import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    media_response,
+)
+from app.utils.storage import (
+    LocalStorage,
+)
+from app.utils.thumbnails import (
+    VARIANT_MEDIA_TYPE,
+    ImageVariant,
+    ThumbnailGenerator,
+    is_image,
+    render_variants,
+    variant_name,
+)
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_image(width: int, height: int, mode: str = "RGBA") -> bytes:
+    output = io.BytesIO()
+    Image.new(mode, (width, height), "red").save(output, "PNG")
+    return output.getvalue()
+
+
+def test_variant_names() -> None:
+    assert (
+        variant_name("user/1/profile.png", ImageVariant.THUMB)
+        == "user/1/profile_thumb.webp"
+    )
+    assert (
+        variant_name("/chat/images/blobs/ab.png", ImageVariant.PREVIEW)
+        == "/chat/images/blobs/ab_preview.webp"
+    )
+    versioned = variant_name("user/1/profile.png", ImageVariant.THUMB, '"a"')
+    assert versioned.startswith("user/1/profile_thumb_")
+    assert versioned != variant_name(
+        "user/1/profile.png", ImageVariant.THUMB, '"b"'
+    )
+
+
+def test_render_variants_keeps_the_aspect_ratio() -> None:
+    variants = render_variants(
+        make_image(1000, 500), {"thumb": 100, "preview": 2000}
+    )
+
+    with Image.open(io.BytesIO(variants["thumb"])) as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (100, 50)
+    # images are never upscaled.
+    with Image.open(io.BytesIO(variants["preview"])) as preview:
+        assert preview.size == (1000, 500)
+
+
+@pytest.mark.anyio
+async def test_only_images_are_resized(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    generator = ThumbnailGenerator(max_workers=1, max_pending=1)
+    assert is_image(make_image(8, 8))
+    assert not is_image(b"<html></html>")
+    try:
+        generator.submit(storage, "page.png", b"<html></html>")
+        assert not generator._tasks
+    finally:
+        await generator.close()
+
+
+@pytest.mark.anyio
+async def test_variants_are_served_once_rendered(tmp_path) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    generator = ThumbnailGenerator(max_workers=1, max_pending=1)
+    image = make_image(800, 800, "P")
+    await storage.put("image.png", image)
+    request = Request({"type": "http", "headers": []})
+
+    response = await media_response(
+        request,
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+        etag='"abc"',
+        variant=ImageVariant.THUMB,
+    )
+    assert response.media_type == "image/png"
+    assert response.headers["etag"] == '"abc"'
+
+    try:
+        await generator.generate(storage, "image.png", image)
+    finally:
+        await generator.close()
+    response = await media_response(
+        request,
+        storage,
+        "image.png",
+        IMMUTABLE_CACHE_CONTROL,
+        etag='"abc"',
+        variant=ImageVariant.THUMB,
+    )
+    assert response.media_type == VARIANT_MEDIA_TYPE
+    assert response.headers["etag"] == '"abc-thumb"'
+    assert int(response.headers["content-length"]) < len(image)
+
+    await generator.delete(storage, "image.png")
+    assert (
+        await storage.stat(variant_name("image.png", ImageVariant.THUMB))
+        is None
+    )
+
+
+@pytest.mark.anyio
+async def test_variants_of_a_replaced_image_are_never_served(
+    tmp_path,
+) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    generator = ThumbnailGenerator(max_workers=1, max_pending=2)
+    name = "user/1/profile.png"
+    old_image = make_image(800, 800)
+    new_image = make_image(600, 600)
+    old = await storage.put(name, old_image)
+    new = await storage.put(name, new_image)
+    request = Request({"type": "http", "headers": []})
+
+    try:
+        # the render of the replaced image finishes last.
+        await generator.generate(storage, name, new_image, new.etag)
+        await generator.generate(storage, name, old_image, old.etag)
+    finally:
+        await generator.close()
+    response = await media_response(
+        request,
+        storage,
+        name,
+        REVALIDATE_CACHE_CONTROL,
+        variant=ImageVariant.THUMB,
+    )
+    assert response.media_type == VARIANT_MEDIA_TYPE
+    thumb = await storage.stat(
+        variant_name(name, ImageVariant.THUMB, new.etag)
+    )
+    assert response.headers["etag"] == thumb.etag
@@ -0,0 +1,121 @@
+import pytest
+
+import asyncio
+import json
+import openai
+from typing import (
+    AsyncGenerator,
+)
+
+from app.utils.chatgpt_relay import (
+    ChatGPTRelay,
+)
+
+TOKENS = ["Hel", "lo", " the", "re", ", how", " can", " I", " help", "?"]
+
+
+def completion_chunk(delta: dict, finish_reason=None) -> bytes:
+    chunk = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-3.5-turbo",
+        "choices": [
+            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        ],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+async def handle_completion(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    headers = await reader.readuntil(b"\r\n\r\n")
+    for line in headers.decode().split("\r\n"):
+        if line.lower().startswith("content-length:"):
+            await reader.readexactly(int(line.split(":")[1]))
+    writer.write(
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: text/event-stream\r\n"
+        b"Connection: close\r\n\r\n"
+    )
+    writer.write(completion_chunk({"role": "assistant"}))
+    for token in TOKENS:
+        writer.write(completion_chunk({"content": token}))
+        await writer.drain()
+        await asyncio.sleep(0.01)
+    writer.write(completion_chunk({}, "stop"))
+    writer.write(b"data: [DONE]\n\n")
+    await writer.drain()
+    writer.close()
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.frames = []
+
+    async def publish(self, topic: str, message: str) -> int:
+        self.frames.append(json.loads(message))
+        return 1
+
+
+@pytest.fixture
+async def completion_server(anyio_backend) -> AsyncGenerator[str, None]:
+    server = await asyncio.start_server(handle_completion, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    openai.api_key = "test"
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.anyio
+async def test_relay_publishes_deltas_and_final_answer(
+    completion_server: str,
+) -> None:
+    relay = ChatGPTRelay(
+        max_concurrency=1,
+        max_pending=0,
+        chunk_size=8,
+        flush_interval=60,
+        model="gpt-3.5-turbo",
+        api_base=completion_server,
+    )
+    broker = RecordingBroker()
+    await relay.relay(broker, "1_2", {"type": "chatgpt"}, "Hi!")
+
+    assert broker.frames[0]["content"] == "start"
+    deltas = [
+        f["content"] for f in broker.frames if f.get("stream") == "delta"
+    ]
+    assert "".join(deltas) == "".join(TOKENS)
+    # tokens are coalesced into chunks of at least 8 characters.
+    assert len(deltas) < len(TOKENS)
+    assert broker.frames[-1]["stream"] == "end"
+    assert broker.frames[-1]["content"] == "".join(TOKENS)
+    assert broker.frames[-1]["user"]["email"] == "chatgpt@brave-chat.net"
+
+
+@pytest.mark.anyio
+async def test_relay_rejects_completions_over_the_limit(
+    completion_server: str,
+) -> None:
+    relay = ChatGPTRelay(
+        max_concurrency=1,
+        max_pending=0,
+        chunk_size=8,
+        flush_interval=60,
+        model="gpt-3.5-turbo",
+        api_base=completion_server,
+    )
+    broker = RecordingBroker()
+    await asyncio.gather(
+        relay.relay(broker, "1_2", {"type": "chatgpt"}, "Hi!"),
+        relay.relay(broker, "1_2", {"type": "chatgpt"}, "Hi again!"),
+    )
+
+    errors = [f for f in broker.frames if f.get("stream") == "error"]
+    assert len(errors) == 1
+    assert len([f for f in broker.frames if f.get("stream") == "end"]) == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from fastapi import (
+    FastAPI,
+)
+from httpx import (
+    AsyncClient,
+)
+import json
+from starlette.status import (
+    HTTP_200_OK,
+)
+
+
+async def login(client: AsyncClient, email: str) -> str:
+    response = await client.post(
+        url="/api/v1/auth/login",
+        data={
+            "username": email,
+            "password": "test",
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    dict_response = json.loads(response.content.decode())
+    return dict_response["access_token"]
+
+
+async def get_chat_list(client: AsyncClient, token: str) -> dict:
+    response = await client.get(
+        "/api/v1/contacts/chat/search",
+        params={"search": ""},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    return json.loads(response.content.decode())
+
+
+@pytest.mark.anyio
+async def test_get_chat_list_summary(
+    fastapi_app: FastAPI, client: AsyncClient, token: str
+) -> None:
+    receiver_token = await login(client, "test1@example.com")
+    # start from a read conversation.
+    await client.get(
+        "/api/v1/conversation",
+        params={"receiver": "test@example.com"},
+        headers={"Authorization": f"Bearer {receiver_token}"},
+    )
+    for content in ("hello", "there"):
+        await client.post(
+            url="/api/v1/message",
+            json={
+                "receiver": "test1@example.com",
+                "content": content,
+                "message_type": "text",
+                "media": "",
+            },
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token}",
+            },
+        )
+
+    dict_response = await get_chat_list(client, receiver_token)
+    assert dict_response["status_code"] == HTTP_200_OK
+    assert dict_response["result"][0]["first_name"] == "ChatGPT"
+    contact = dict_response["result"][1]
+    assert contact["email"] == "test@example.com"
+    assert contact["content"] == "there"
+    assert contact["nb_unread_message"] == 2
+    assert contact["nb_total_unread_message"] == 2
+
+    await client.get(
+        "/api/v1/conversation",
+        params={"receiver": "test@example.com"},
+        headers={"Authorization": f"Bearer {receiver_token}"},
+    )
+    dict_response = await get_chat_list(client, receiver_token)
+    assert dict_response["result"][1]["nb_unread_message"] == 0
@@ -0,0 +1,75 @@
+import pytest
+
+from fastapi import (
+    FastAPI,
+)
+from httpx import (
+    AsyncClient,
+)
+import json
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+)
+
+
+async def send_message(client: AsyncClient, token: str, content: str) -> None:
+    await client.post(
+        url="/api/v1/message",
+        json={
+            "receiver": "test1@example.com",
+            "content": content,
+            "message_type": "text",
+            "media": "",
+        },
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+
+@pytest.mark.anyio
+async def test_get_conversation_pages(
+    fastapi_app: FastAPI, client: AsyncClient, token: str
+) -> None:
+    for content in ("first", "second", "third"):
+        await send_message(client, token, content)
+
+    response = await client.get(
+        "/api/v1/conversation",
+        params={"receiver": "test1@example.com", "limit": 2},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    dict_response = json.loads(response.content.decode())
+    assert dict_response["status_code"] == HTTP_200_OK
+    assert [m["content"] for m in dict_response["result"]] == [
+        "second",
+        "third",
+    ]
+    assert dict_response["next_cursor"]
+
+    response = await client.get(
+        "/api/v1/conversation",
+        params={
+            "receiver": "test1@example.com",
+            "limit": 2,
+            "before": dict_response["next_cursor"],
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    dict_response = json.loads(response.content.decode())
+    assert dict_response["result"][-1]["content"] == "first"
+
+
+@pytest.mark.anyio
+async def test_get_conversation_invalid_cursor(
+    fastapi_app: FastAPI, client: AsyncClient, token: str
+) -> None:
+    response = await client.get(
+        "/api/v1/conversation",
+        params={"receiver": "test1@example.com", "before": "invalid"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    dict_response = json.loads(response.content.decode())
+    assert dict_response["status_code"] == HTTP_400_BAD_REQUEST
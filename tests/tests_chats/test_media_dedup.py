@@ -0,0 +1,54 @@
+import pytest
+
+import os
+from sqlalchemy import (
+    text,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+
+from app.chats import (
+    crud as chats_crud,
+)
+from app.utils.storage import (
+    LocalStorage,
+)
+
+
+@pytest.mark.anyio
+async def test_upload_media_stores_an_image_once(
+    dbsession_factory: AsyncSession, monkeypatch, tmp_path
+) -> None:
+    storage = LocalStorage(tmp_path, chunk_size=4096)
+    monkeypatch.setattr(chats_crud.media_uploader, "storage", storage)
+    uploads = []
+    put = storage.put
+
+    async def recording_put(name, data):
+        uploads.append(name)
+        return await put(name, data)
+
+    monkeypatch.setattr(storage, "put", recording_put)
+    image = os.urandom(1000)
+
+    async with dbsession_factory() as session:
+        digests = [
+            await chats_crud.upload_media(
+                await chats_crud.media_uploader.decode_bytes(image), session
+            )
+            for _ in range(3)
+        ]
+        await session.commit()
+        result = await session.execute(
+            text(
+                "SELECT ref_count, stored FROM media_blobs"
+                " WHERE digest = :digest"
+            ),
+            {"digest": digests[0]},
+        )
+        blob = result.fetchone()
+
+    assert len(set(digests)) == 1
+    assert len(uploads) == 1
+    assert (blob.ref_count, blob.stored) == (3, 1)
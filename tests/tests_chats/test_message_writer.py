@@ -0,0 +1,58 @@
+import pytest
+
+from sqlalchemy import (
+    text,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+)
+
+from app.utils.message_writer import (
+    MessageWriter,
+)
+
+
+@pytest.mark.anyio
+async def test_message_writer_batches_and_drains(
+    dbsession_factory: AsyncSession,
+) -> None:
+    async with dbsession_factory() as session:
+        result = await session.execute(
+            text("SELECT id FROM users ORDER BY id")
+        )
+        sender_id, receiver_id = [row.id for row in result.fetchall()][:2]
+
+    writer = MessageWriter(
+        session_factory=dbsession_factory,
+        batch_size=2,
+        flush_interval=60,
+        max_pending=10,
+        max_retries=0,
+        retry_delay=0,
+    )
+    writer.start()
+    for index in range(5):
+        await writer.put(
+            sender_id, f"batched {index}", "text", receiver_id=receiver_id
+        )
+    # the last message is written by the drain and not by the timer.
+    await writer.close()
+
+    async with dbsession_factory() as session:
+        result = await session.execute(
+            text(
+                "SELECT content FROM messages"
+                " WHERE content LIKE 'batched %' ORDER BY id"
+            )
+        )
+        assert [row.content for row in result.fetchall()] == [
+            f"batched {index}" for index in range(5)
+        ]
+        result = await session.execute(
+            text(
+                "SELECT last_content FROM chat_summaries"
+                " WHERE owner = :owner AND peer = :peer"
+            ),
+            {"owner": receiver_id, "peer": sender_id},
+        )
+        assert result.fetchone().last_content == "batched 4"
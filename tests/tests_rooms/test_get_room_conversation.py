@@ -0,0 +1,132 @@
+import pytest
+
+from fastapi import (
+    FastAPI,
+)
+from httpx import (
+    AsyncClient,
+)
+import json
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+)
+
+from app.utils.pagination import (
+    encode_cursor,
+)
+
+ROOM = "paged-room"
+
+
+async def login(client: AsyncClient, email: str) -> str:
+    response = await client.post(
+        url="/api/v1/auth/login",
+        data={"username": email, "password": "test"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    return json.loads(response.content.decode())["access_token"]
+
+
+async def send_room_message(
+    client: AsyncClient, token: str, content: str
+) -> None:
+    await client.post(
+        url="/api/v1/room/message",
+        json={
+            "room": ROOM,
+            "content": content,
+            "message_type": "text",
+            "media": "",
+        },
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+
+async def get_page(client: AsyncClient, token: str, **params) -> dict:
+    response = await client.get(
+        "/api/v1/room/conversation",
+        params={"room": ROOM, **params},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    return json.loads(response.content.decode())
+
+
+@pytest.fixture
+async def room_tokens(
+    fastapi_app: FastAPI, client: AsyncClient, token: str
+) -> tuple[str, str]:
+    """
+    A room created by `test@example.com`, its admin, and joined by
+    `test1@example.com`, with four messages.
+
+    :return: the tokens of the admin and of the member.
+    """
+    member_token = await login(client, "test1@example.com")
+    for user_token, join in ((token, 0), (member_token, 1)):
+        await client.post(
+            url="/api/v1/room",
+            json={"join": join, "room_name": ROOM, "description": "paged"},
+            headers={"Authorization": f"Bearer {user_token}"},
+        )
+    existing = await get_page(client, token, limit=1)
+    if not existing["result"]:
+        for content in ("first", "second", "third"):
+            await send_room_message(client, token, content)
+        await send_room_message(client, member_token, "fourth")
+    return token, member_token
+
+
+@pytest.mark.anyio
+async def test_get_room_conversation_pages(
+    client: AsyncClient, room_tokens: tuple[str, str]
+) -> None:
+    admin_token, _ = room_tokens
+    page = await get_page(client, admin_token, limit=2)
+    assert page["status_code"] == HTTP_200_OK
+    assert [m["content"] for m in page["result"]] == ["third", "fourth"]
+    assert page["next_cursor"]
+
+    older = await get_page(
+        client, admin_token, limit=2, before=page["next_cursor"]
+    )
+    assert [m["content"] for m in older["result"]] == ["first", "second"]
+    assert older["next_cursor"] is None
+
+    newer = await get_page(
+        client,
+        admin_token,
+        limit=2,
+        after=encode_cursor(older["result"][0]["msg_id"]),
+    )
+    assert [m["content"] for m in newer["result"]] == ["second", "third"]
+    assert newer["next_cursor"] == encode_cursor(newer["result"][-1]["msg_id"])
+
+
+@pytest.mark.anyio
+async def test_get_room_conversation_admin_flags(
+    client: AsyncClient, room_tokens: tuple[str, str]
+) -> None:
+    # every viewer gets the admin flag of each sender.
+    for viewer_token, types in zip(
+        room_tokens, (["sent", "received"], ["received", "sent"])
+    ):
+        page = await get_page(client, viewer_token, limit=2)
+        assert [m["content"] for m in page["result"]] == ["third", "fourth"]
+        assert [bool(m["admin"]) for m in page["result"]] == [True, False]
+        assert [m["type"] for m in page["result"]] == types
+
+
+@pytest.mark.anyio
+async def test_get_room_conversation_invalid_cursor(
+    client: AsyncClient, room_tokens: tuple[str, str]
+) -> None:
+    admin_token, _ = room_tokens
+    page = await get_page(client, admin_token, before="invalid")
+    assert page["status_code"] == HTTP_400_BAD_REQUEST
+    cursor = encode_cursor(1)
+    page = await get_page(client, admin_token, before=cursor, after=cursor)
+    assert page["status_code"] == HTTP_400_BAD_REQUEST